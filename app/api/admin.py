@@ -1,12 +1,31 @@
 # app/api/admin.py
 
-from fastapi import APIRouter
+import json
+import time
+from contextlib import contextmanager
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.api import recommend
 from app.services.schema import init_schema
-from app.services.indexer import index_srt
-from scripts import bulk_index
+from app.core.db import get_connection
+from app.services.indexer import index_srt, delete_episode
+from app.services.idf import recompute_df
+from app.services.index_state import bump_generation
+from app.services import fuzzy, item_cf, jobs, search_engine, show_vectors, suggest
 
 router = APIRouter(prefix="/admin")
 
+@contextmanager
+def _index_write():
+    """Écriture d'index à l'unité : 409 pendant une réindexation (cf. jobs.index_write)."""
+    try:
+        with jobs.index_write():
+            yield
+    except jobs.JobConflict as e:
+        raise HTTPException(status_code=409, detail=f"une réindexation est en cours (job {e})")
+
+
 # Route pour initialiser la base (création des tables)
 @router.post("/init-db")
 def admin_init_db():
@@ -15,17 +34,147 @@ def admin_init_db():
 
 # Route pour indexer un épisode (insertion des données unigrams/bigrams)
 @router.post("/index-srt")
-def admin_index_srt(file: str, show: str, season: int, ep: int):
-    result = index_srt(file, show, season, ep)
+def admin_index_srt(file: str, show: str, season: int, ep: int, replace: bool = True):
+    with _index_write():
+        result = index_srt(file, show, season, ep, replace=replace)
     return {"status": "ok", "indexed": result}
 
 
+# Route pour retirer un épisode de l'index (token_df ajusté)
+@router.delete("/episode")
+def admin_delete_episode(file: str):
+    with _index_write():
+        result = delete_episode(file)
+    return {"status": "ok", **result}
+
+
+# Route pour recalculer DF/IDF de zéro (normalement inutile : maintenu par l'indexeur)
+@router.post("/recompute-idf")
+def admin_recompute_idf():
+    with _index_write(), get_connection() as conn, conn.cursor() as cur:
+        n = recompute_df(cur)
+        bump_generation(cur)
+        conn.commit()
+    return {"status": "ok", "tokens": n}
+
+
 # Route pour réindexer toute la base (tous les sous-titres déjà présents)
-@router.post("/reindex")
-def admin_reindex():
+@router.post("/reindex", status_code=202)
+def admin_reindex(incremental: bool = False, workers: int | None = None, writers: int | None = None):
     """
-    Réindexe tous les sous-titres déjà importés dans la base.
+    Lance la réindexation en tâche de fond et renvoie tout de suite l'id du job.
     Utile après une mise à jour ou correction des noms de séries.
+    incremental=true : ne retraite que les fichiers nouveaux/modifiés et retire les disparus.
+    Suivi : GET /admin/jobs/{id} (ou /stream), annulation / reprise via /cancel et /resume.
     """
-    count = bulk_index.run_all()
-    return {"status": "ok", "episodes_indexed": count}
+    params = {"incremental": incremental, "workers": workers, "writers": writers}
+    try:
+        job = jobs.start_reindex(params)
+    except jobs.JobConflict as e:
+        raise HTTPException(status_code=409, detail=f"une réindexation est déjà en cours (job {e})")
+    return {"status": "accepted", "job": job.snapshot()}
+
+
+# ==================== Suivi des tâches de fond ====================
+
+def _job_or_404(job_id: str) -> jobs.Job:
+    try:
+        return jobs.get_job(job_id)
+    except jobs.JobNotFound:
+        raise HTTPException(status_code=404, detail="job inconnu")
+
+
+@router.get("/jobs")
+def admin_list_jobs():
+    return {"jobs": [j.snapshot() for j in jobs.list_jobs()]}
+
+
+@router.get("/jobs/{job_id}")
+def admin_get_job(job_id: str):
+    return _job_or_404(job_id).snapshot()
+
+
+@router.get("/jobs/{job_id}/stream")
+def admin_stream_job(job_id: str, interval: float = 1.0):
+    """Progression en continu (Server-Sent Events) jusqu'à la fin du job."""
+    job = _job_or_404(job_id)
+    interval = min(max(interval, 0.2), 10.0)
+
+    def events():
+        while True:
+            snap = job.snapshot()
+            yield f"data: {json.dumps(snap)}\n\n"
+            if snap["status"] not in jobs.ACTIVE:
+                break
+            time.sleep(interval)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.post("/jobs/{job_id}/cancel")
+def admin_cancel_job(job_id: str):
+    _job_or_404(job_id)
+    return jobs.cancel_job(job_id).snapshot()
+
+
+@router.post("/jobs/{job_id}/resume", status_code=202)
+def admin_resume_job(job_id: str):
+    _job_or_404(job_id)
+    try:
+        job = jobs.resume_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except jobs.JobConflict as e:
+        raise HTTPException(status_code=409, detail=f"une réindexation est déjà en cours (job {e})")
+    return {"status": "accepted", "job": job.snapshot()}
+
+
+# ==================== Moteur de recherche en mémoire ====================
+
+@router.get("/search-engine")
+def admin_search_engine_status():
+    """État de l'index en mémoire (SEARCH_ENGINE=memory) : génération, taille, dernier chargement."""
+    return search_engine.status()
+
+
+@router.post("/search-engine/rebuild", status_code=202)
+def admin_search_engine_rebuild():
+    """Reconstruit le snapshot depuis Postgres (en tâche de fond)."""
+    if not search_engine.enabled():
+        raise HTTPException(status_code=400, detail="moteur en mémoire désactivé (SEARCH_ENGINE=memory)")
+    started = search_engine.refresh_async(force=True)
+    return {"status": "accepted" if started else "already-running", **search_engine.status()}
+
+
+@router.get("/fuzzy")
+def admin_fuzzy_status():
+    """État de l'index de correction des fautes de frappe (génération, nb de mots, dernière construction)."""
+    return fuzzy.status()
+
+
+@router.get("/suggest")
+def admin_suggest_status():
+    """État de l'index d'autocomplétion (génération, nb de mots et de séries, dernière construction)."""
+    return suggest.status()
+
+
+@router.get("/recommend")
+def admin_recommend_status():
+    """État de la matrice série x token de /user/recommend (NumPy présent, génération, taille)."""
+    return show_vectors.status()
+
+
+@router.get("/item-cf")
+def admin_item_cf_status():
+    """État du modèle de filtrage collaboratif (utilisateurs, séries, paires, mises à jour incrémentales)."""
+    return item_cf.status()
+
+
+@router.post("/precompute-recommendations")
+def admin_precompute_recommendations():
+    """Recalcule user_recommendations pour tous les utilisateurs (réglages par défaut) ; renvoie utilisateurs/s."""
+    try:
+        summary = recommend.precompute_recommendations()
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", **summary}
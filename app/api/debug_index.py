@@ -15,16 +15,17 @@ def get_unigrams(episode_id: int, top: int = 20):
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT token, freq
-                FROM unigram_counts
-                WHERE episode_id = %s
-                ORDER BY freq DESC
+                SELECT t.text AS token, u.freq
+                FROM unigram_counts u
+                JOIN tokens t ON t.id = u.token_id
+                WHERE u.episode_id = %s
+                ORDER BY u.freq DESC
                 LIMIT %s;
             """, (episode_id, top))
             rows = cur.fetchall()
     if not rows:
         raise HTTPException(status_code=404, detail="Aucun unigram trouvé pour cet épisode")
-    return {"episode_id": episode_id, "unigrams": [{"token": t, "freq": f} for t, f in rows]}
+    return {"episode_id": episode_id, "unigrams": [{"token": r["token"], "freq": r["freq"]} for r in rows]}
 
 
 @router.get("/bigrams")
@@ -36,10 +37,12 @@ def get_bigrams(episode_id: int, top: int = 20):
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT token1, token2, freq
-                FROM bigram_counts
-                WHERE episode_id = %s
-                ORDER BY freq DESC
+                SELECT t1.text AS token1, t2.text AS token2, b.freq
+                FROM bigram_counts b
+                JOIN tokens t1 ON t1.id = b.token1_id
+                JOIN tokens t2 ON t2.id = b.token2_id
+                WHERE b.episode_id = %s
+                ORDER BY b.freq DESC
                 LIMIT %s;
             """, (episode_id, top))
             rows = cur.fetchall()
@@ -47,7 +50,7 @@ def get_bigrams(episode_id: int, top: int = 20):
         raise HTTPException(status_code=404, detail="Aucun bigram trouvé pour cet épisode")
     return {
         "episode_id": episode_id,
-        "bigrams": [{"tokens": f"{t1} {t2}", "freq": f} for t1, t2, f in rows],
+        "bigrams": [{"tokens": f"{r['token1']} {r['token2']}", "freq": r["freq"]} for r in rows],
     }
 
 @router.get("/posters-check")
@@ -1,15 +1,23 @@
 # app/api/recommend.py
-from fastapi import APIRouter, Body, HTTPException
-from app.core.db import get_connection
+from fastapi import APIRouter, Body, HTTPException, Query
+from app.core.config import RECO_BATCH_MAX_AGE_S, RECO_CACHE_SIZE, RECO_CACHE_TTL_S
+from app.core.db import execute_prepared, get_connection, pooled_connection
+from app.services import item_cf, reco_batch, show_vectors
+from app.services.cache import TTLCache
+from app.services.index_state import current_generation
+import threading
 import time
 
 router = APIRouter(prefix="/user", tags=["Recommandations"])
 
-# ==================== Réglages globaux (fixes) ====================
+# ==================== Réglages par défaut (surchargeables par requête) ====================
 RECO_LIMIT = 10          # nb de séries renvoyées
 RECO_TOP_TOKENS = 4      # nb de tokens conservés par série "aimée"
 RECO_MIN_RATING = 3      # note min pour considérer une série "appréciée"
 IDF_MIN, IDF_MAX = 1.0, 2.8  # fenêtre IDF pour éviter stop-words et noms propres
+RECO_CF_WEIGHT = 0.3     # part du filtrage collaboratif (item_cf) dans le score final, 0 = TF-IDF seul
+RECO_BLEND_POOL = 50     # candidats de chaque score avant mélange
+RECO_BATCH_TOP = RECO_BLEND_POOL  # recommandations précalculées par utilisateur (user_recommendations)
 
 
 # ==================== Noter / mettre à jour une note ====================
@@ -52,11 +60,12 @@ def rate_series(
             INSERT INTO user_ratings (user_id, show_name, rating)
             VALUES (%s, %s, %s)
             ON CONFLICT (user_id, show_name)
-            DO UPDATE SET rating = EXCLUDED.rating;
+            DO UPDATE SET rating = EXCLUDED.rating, updated_at = NOW();
             """,
             (user_id, show_key, rating),
         )
         conn.commit()
+    item_cf.record_rating(user_id, show_key, rating)
 
     return {"message": f"{show_name} = {rating}/5 pour {user_id}"}
 
@@ -77,76 +86,143 @@ def list_ratings(user_id: str):
 
 
 # ==================== Recommandations automatiques ====================
-@router.get("/recommend/{user_id}")
-def recommend_series(user_id: str):
-    """
-    Recommande des séries à partir des meilleurs tokens (TF-IDF) des séries bien notées par l'utilisateur.
-    Paramètres techniques fixés dans le code (voir constantes en haut).
-    """
-    t0 = time.perf_counter()
 
-    # SQL "tout-en-un" : séries likées → top tokens par série → scoring des autres séries
-    sql = """
-    WITH liked AS (
-      SELECT show_name, rating
-      FROM user_ratings
-      WHERE user_id = %s AND rating >= %s
-    ),
-
-    -- Meilleurs tokens par série aimée (TF-IDF = SUM(freq)*idf), filtrés (regex + IDF)
-    per_fav AS (
-      SELECT
-        e.show_name,
-        u.token,
-        SUM(u.freq * t.idf) AS tfidf,
-        ROW_NUMBER() OVER (
-          PARTITION BY e.show_name
-          ORDER BY SUM(u.freq * t.idf) DESC
-        ) AS rk
-      FROM episodes e
-      JOIN unigram_counts u ON u.episode_id = e.id
-      JOIN token_df t       ON t.token      = u.token
-      WHERE e.show_name IN (SELECT show_name FROM liked)
-        AND u.token ~ '^[a-z]{4,}$'
-        AND t.idf BETWEEN %s AND %s
-      GROUP BY e.show_name, u.token
-    ),
-
-    fav_tokens AS (
-      SELECT DISTINCT token
-      FROM per_fav
-      WHERE rk <= %s                -- RECO_TOP_TOKENS par série
-    ),
-
-    -- Score pour chaque série candidate (somme TF-IDF sur les tokens retenus)
-    cand AS (
-      SELECT
-        e.show_name,
-        SUM(u.freq * t.idf) AS score
-      FROM episodes e
-      JOIN unigram_counts u ON u.episode_id = e.id
-      JOIN token_df t       ON t.token      = u.token
-      JOIN fav_tokens ft    ON ft.token     = u.token
-      GROUP BY e.show_name
+# Même score que ShowVectors.recommend (cosinus sur les vecteurs TF-IDF normalisés L2),
+# quand NumPy est absent ou la matrice pas encore construite.
+# $1 = user, $2 = note min, $3/$4 = fenêtre IDF, $5 = tokens par série aimée, $6 = limite
+RECO_SQL = """
+WITH liked AS (
+  SELECT show_name, (rating - $2 + 1)::float8 AS w
+  FROM user_ratings
+  WHERE user_id = $1 AND rating >= $2
+),
+
+-- TF-IDF par série, calculé à la lecture (non stocké, cf. show_tokens.py)
+st AS (
+  SELECT s.show_name, s.token_id, s.freq * t.idf AS tfidf, t.idf
+  FROM show_token_counts s
+  JOIN token_df t ON t.token_id = s.token_id
+  WHERE t.idf > 0
+),
+
+norms AS (
+  SELECT show_name, SQRT(SUM(tfidf * tfidf)) AS norm
+  FROM st
+  GROUP BY show_name
+),
+
+-- Meilleurs tokens par série aimée, filtrés (regex + IDF), pondérés par la note
+per_fav AS (
+  SELECT
+    s.token_id,
+    s.tfidf / n.norm * l.w AS u,
+    ROW_NUMBER() OVER (
+      PARTITION BY s.show_name
+      ORDER BY s.tfidf DESC, s.token_id
+    ) AS rk
+  FROM st s
+  JOIN liked l    ON l.show_name = s.show_name
+  JOIN norms n    ON n.show_name = s.show_name
+  JOIN tokens k   ON k.id = s.token_id
+  WHERE k.text ~ '^[a-z]{4,}$'
+    AND s.idf BETWEEN $3 AND $4
+),
+
+profile AS (
+  SELECT token_id, SUM(u) AS u
+  FROM per_fav
+  WHERE rk <= $5
+  GROUP BY token_id
+),
+
+cand AS (
+  SELECT s.show_name, SUM(s.tfidf * p.u) / MAX(n.norm) AS score
+  FROM st s
+  JOIN profile p ON p.token_id = s.token_id
+  JOIN norms n   ON n.show_name = s.show_name
+  GROUP BY s.show_name
+)
+
+SELECT c.show_name, c.score
+FROM cand c
+WHERE c.show_name NOT IN (SELECT show_name FROM liked)
+ORDER BY c.score DESC, c.show_name
+LIMIT $6
+"""
+
+# Recommandations précalculées, si plus récentes que les notes de l'utilisateur
+# $1 = user, $2 = limite, $3 = génération courante, $4 = âge max (s)
+PRECOMPUTED_SQL = """
+SELECT r.show_name, r.score, r.content, r.cf
+FROM user_recommendations r
+WHERE r.user_id = $1
+  AND r.rank <= $2
+  AND r.generation = $3
+  AND r.computed_at > NOW() - make_interval(secs => $4)
+  AND r.computed_at >= (
+    SELECT COALESCE(MAX(u.updated_at), '-infinity') FROM user_ratings u WHERE u.user_id = $1
+  )
+ORDER BY r.rank
+"""
+
+
+# ==================== Cache des recommandations ====================
+# Clé = (utilisateur, version de ses notes, réglages) ; vidé à chaque génération d'index.
+# Version = (nb de lignes, MAX(updated_at)) de ses notes, relue en base à chaque requête :
+# un /user/rate servi par n'importe quel worker change la clé, les entrées de l'ancienne
+# version ne sont plus lues. Seule la partie TF-IDF (candidats avant mélange) est en cache :
+# le filtrage collaboratif, qui bouge quand d'autres utilisateurs notent, est mélangé à
+# chaque requête (en mémoire, cf. _blend).
+
+# $1 = user
+RATINGS_VERSION_SQL = """
+SELECT COUNT(*) AS n, MAX(updated_at) AS last
+FROM user_ratings
+WHERE user_id = $1
+"""
+
+reco_cache = TTLCache(RECO_CACHE_SIZE, RECO_CACHE_TTL_S)
+_stats_lock = threading.Lock()
+_computed = 0                    # recommandations calculées (misses)
+_compute_ms = 0.0                # temps total de ces calculs
+_saved_ms = 0.0                  # temps de calcul évité par les hits
+
+
+def ratings_version(user_id: str) -> tuple:
+    """Version des notes de l'utilisateur en base (change à chaque /user/rate, quel que soit le worker)."""
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "user_ratings_version", RATINGS_VERSION_SQL, (user_id,))
+        row = cur.fetchone()
+    return row["n"], row["last"]
+
+
+def precompute_recommendations() -> dict:
+    """Précalcul de user_recommendations pour tous les utilisateurs, avec les réglages par défaut."""
+    return reco_batch.precompute_all(
+        RECO_BATCH_TOP, RECO_BLEND_POOL, RECO_TOP_TOKENS, RECO_MIN_RATING, IDF_MIN, IDF_MAX, RECO_CF_WEIGHT
     )
 
-    SELECT c.show_name, c.score
-    FROM cand c
-    WHERE c.show_name NOT IN (SELECT show_name FROM liked)
-    ORDER BY c.score DESC
-    LIMIT %s;
-    """
 
-    # Requêtes
-    with get_connection() as conn, conn.cursor() as cur:
-        # Résultats (séries recommandées)
-        cur.execute(
-            sql,
-            (user_id, RECO_MIN_RATING, IDF_MIN, IDF_MAX, RECO_TOP_TOKENS, RECO_LIMIT),
-        )
-        rows = cur.fetchall()
+def _batch_eligible(limit: int, top_tokens: int, min_rating: int, idf_min: float, idf_max: float, cf_weight: float) -> bool:
+    """user_recommendations n'est calculée qu'avec les réglages par défaut."""
+    return limit <= RECO_BATCH_TOP and (top_tokens, min_rating, idf_min, idf_max, cf_weight) == (
+        RECO_TOP_TOKENS, RECO_MIN_RATING, IDF_MIN, IDF_MAX, RECO_CF_WEIGHT
+    )
+
 
-        # Pour info, on renvoie aussi les séries likées utilisées
+def _compute(
+    user_id: str, limit: int, top_tokens: int, min_rating: int, idf_min: float, idf_max: float, cf_weight: float,
+    batch_generation: int | None = None,
+) -> dict:
+    """
+    Séries aimées + recommandations TF-IDF avant mélange (RECO_BLEND_POOL candidats si
+    cf_weight > 0) : {engine, generation, liked_series, results}. Précalcul : résultats
+    déjà mélangés, et cf (mélange fait ou non).
+    batch_generation : génération courante si user_recommendations peut servir la requête.
+    """
+    pool = max(limit, RECO_BLEND_POOL) if cf_weight > 0 else limit
+    with pooled_connection() as conn, conn.cursor() as cur:
+        # Séries likées (renvoyées pour info, et profil du moteur vectoriel)
         cur.execute(
             """
             SELECT show_name, rating
@@ -154,20 +230,138 @@ def recommend_series(user_id: str):
             WHERE user_id = %s AND rating >= %s
             ORDER BY rating DESC, show_name;
             """,
-            (user_id, RECO_MIN_RATING),
+            (user_id, min_rating),
         )
         liked_series = cur.fetchall()
 
+        if batch_generation is not None:
+            execute_prepared(
+                cur, "recommend_precomputed", PRECOMPUTED_SQL,
+                (user_id, limit, batch_generation, RECO_BATCH_MAX_AGE_S),
+            )
+            stored = cur.fetchall()
+            if stored:
+                blended = stored[0]["cf"] is not None
+                return {
+                    "engine": "batch",
+                    "generation": batch_generation,
+                    "cf": blended,
+                    "liked_series": liked_series,
+                    "results": [r if blended else {"show_name": r["show_name"], "score": r["score"]} for r in stored],
+                }
+
+        vectors = show_vectors.get_index()
+        if vectors is None:
+            execute_prepared(
+                cur, "recommend_series", RECO_SQL,
+                (user_id, min_rating, idf_min, idf_max, top_tokens, pool),
+            )
+            rows = cur.fetchall()
+
+    if vectors is not None:
+        liked = [(r["show_name"], show_vectors.rating_weight(r["rating"], min_rating)) for r in liked_series]
+        rows = vectors.recommend(liked, pool, top_tokens, idf_min, idf_max)
+
+    return {
+        "engine": "vector" if vectors is not None else "sql",
+        "generation": vectors.generation if vectors is not None else None,
+        "liked_series": liked_series,
+        "results": rows,  # [{show_name, score}, ...]
+    }
+
+
+def _blend(entry: dict, user_id: str, limit: int, cf_weight: float) -> tuple[list[dict], bool]:
+    """(résultats, mélange fait) d'une entrée calculée ou en cache, avec le modèle collaboratif courant."""
+    if entry["engine"] == "batch":
+        return entry["results"], entry["cf"]
+    cf_model = item_cf.get_model() if cf_weight > 0 else None
+    if cf_model is None:
+        return entry["results"][:limit], False
+    liked_names = {r["show_name"] for r in entry["liked_series"]}
+    cf = cf_model.recommend(user_id, max(limit, RECO_BLEND_POOL))
+    return item_cf.blend(entry["results"], cf, cf_weight, liked_names, limit), True
+
+
+@router.get("/recommend/{user_id}")
+def recommend_series(
+    user_id: str,
+    limit: int = Query(RECO_LIMIT, ge=1, le=100, description="Nb de séries renvoyées"),
+    top_tokens: int = Query(RECO_TOP_TOKENS, ge=1, le=200, description="Tokens conservés par série aimée"),
+    min_rating: int = Query(RECO_MIN_RATING, ge=1, le=5, description="Note min d'une série aimée"),
+    idf_min: float = Query(IDF_MIN, ge=0.0, description="IDF min des tokens du profil"),
+    idf_max: float = Query(IDF_MAX, ge=0.0, description="IDF max des tokens du profil"),
+    cf_weight: float = Query(RECO_CF_WEIGHT, ge=0.0, le=1.0, description="Part du filtrage collaboratif"),
+):
+    """
+    Recommande les séries les plus proches (cosinus TF-IDF) des séries bien notées par l'utilisateur.
+    Profil = meilleurs tokens de chaque série aimée, pondérés par la note ; valeurs par défaut
+    des réglages : constantes en haut du module.
+    Matrice série x token en mémoire (show_vectors) ; en SQL sur show_token_counts sinon.
+    Mélangé (cf_weight) avec le filtrage collaboratif item-item (item_cf, en mémoire).
+    Réglages par défaut : servi depuis user_recommendations (précalcul) quand elle est fraîche.
+    Partie TF-IDF en cache tant que les notes de l'utilisateur et l'index ne changent pas.
+    """
+    global _computed, _compute_ms, _saved_ms
+    if idf_min > idf_max:
+        raise HTTPException(status_code=400, detail="idf_min doit être inférieur ou égal à idf_max.")
+    t0 = time.perf_counter()
+
+    params = (limit, top_tokens, min_rating, idf_min, idf_max, cf_weight)
+    cache_key = None
+    generation = None
+    entry = None
+    if reco_cache.enabled:
+        generation = current_generation()
+        reco_cache.sync(generation)
+        cache_key = (user_id, ratings_version(user_id), params)
+        entry = reco_cache.get(cache_key)
+
+    if entry is None:
+        batch_generation = None
+        if _batch_eligible(*params):
+            batch_generation = generation if generation is not None else current_generation()
+        entry = _compute(user_id, *params, batch_generation=batch_generation)
+        entry["compute_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        # matrice en retard d'une génération : résultat servi mais pas mis en cache
+        if entry["engine"] != "vector" or entry["generation"] == generation:
+            reco_cache.put(cache_key, entry, generation)
+        with _stats_lock:
+            _computed += 1
+            _compute_ms += entry["compute_ms"]
+        cached = False
+    else:
+        with _stats_lock:
+            _saved_ms += entry["compute_ms"]
+        cached = True
+    results, blended = _blend(entry, user_id, limit, cf_weight)
+
     elapsed = round((time.perf_counter() - t0) * 1000, 2)
     return {
         "user_id": user_id,
         "params": {
-            "limit": RECO_LIMIT,
-            "top_tokens_per_fav": RECO_TOP_TOKENS,
-            "liked_min_rating": RECO_MIN_RATING,
-            "idf_window": [IDF_MIN, IDF_MAX],
+            "limit": limit,
+            "top_tokens_per_fav": top_tokens,
+            "liked_min_rating": min_rating,
+            "idf_window": [idf_min, idf_max],
+            "cf_weight": cf_weight,
         },
-        "liked_series": liked_series,
+        "engine": entry["engine"],
+        "cf": blended,
+        "cached": cached,
+        "compute_ms": entry["compute_ms"],
+        "liked_series": entry["liked_series"],
         "time_ms": elapsed,
-        "results": rows,  # [{show_name, score}, ...]
+        "results": results,
     }
+
+
+@router.get("/cache-stats")
+def recommend_cache_stats():
+    """Compteurs du cache de recommandations : hits, calculs, temps de calcul évité."""
+    with _stats_lock:
+        return {
+            **reco_cache.stats(),
+            "computed": _computed,
+            "avg_compute_ms": round(_compute_ms / _computed, 2) if _computed else 0.0,
+            "saved_ms": round(_saved_ms, 2),
+        }
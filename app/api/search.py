@@ -1,179 +1,642 @@
+import secrets
 import time
-from fastapi import APIRouter, Query
-from app.core.db import get_connection
-from app.services.normalize import normalize_line
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+from app.core.config import (
+    DB_POOL_SIZE, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_S, SEARCH_CURSOR_SIZE, SEARCH_CURSOR_TTL_S,
+)
+from app.core.db import execute_prepared, pooled_connection
+from app.services import fuzzy, search_engine, suggest
+from app.services.cache import TTLCache
+from app.services.index_state import current_generation
+from app.services.positions import decode_positions
+from app.services.ranking import (
+    BIGRAM_WEIGHT, TOP_SERIES, EpisodeFilter, apply_bigram_boost, expand_variants,
+    merge_candidates, parse_query, proximity_bonus, query_bigrams, rerank, score_positions,
+)
+from app.services.snippets import page_snippets
 
 router = APIRouter(prefix="/search", tags=["Search"])
 
 CANDIDATE_POOL = 100  # on récupère plus d'épisodes pour un meilleur rerank par série
-LIMIT = 6            # limite finale affichée
+LIMIT = 6            # taille d'une page de résultats
 
-# ---------- Requêtes SQL de base (AND et OR) ----------
+# Classement par requête normalisée (tokens après variantes), vidé à chaque nouvelle génération
+result_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_S)
+# Curseurs de pagination -> classement complet d'une recherche (indépendant de la génération)
+cursor_store = TTLCache(SEARCH_CURSOR_SIZE, SEARCH_CURSOR_TTL_S)
 
-def _query_and(cur, tokens, limit):
-    placeholders = ",".join(["%s"] * len(tokens))
-    sql = f"""
-    WITH q(tok) AS (SELECT UNNEST(ARRAY[{placeholders}]))
+# ---------- Plan en un seul aller-retour (requête préparée) ----------
+# $1 = mots de la requête (texte), $2 = taille du pool de candidats, $3 = OR seul (variantes).
+# Traduction mot -> id, candidats AND (strict) puis OR en complément, et boost bigrammes
+# des mots consécutifs de la requête : une seule instruction, plan réutilisé par Postgres.
+# Avec filtres (série, saison, épisodes : $4...), les épisodes retenus sont lus d'abord
+# (index idx_episodes_show_season_ep) et seules leurs lignes (episode_id, token_id) sont lues.
+_CANDIDATES_TEMPLATE = """
+WITH w AS (
+    SELECT w.pos, k.id AS tok                -- NULL si mot inconnu (l'AND ne peut alors pas matcher)
+    FROM UNNEST($1::text[]) WITH ORDINALITY AS w(text, pos)
+    LEFT JOIN tokens k ON k.text = w.text
+),
+{episodes}agg AS (
     SELECT
-        e.id, e.show_name, e.season, e.episode, e.file_path,
-        COUNT(DISTINCT u.token) AS matched_terms,
+        u.episode_id,
+        COUNT(DISTINCT u.token_id) AS matched_terms,
         SUM(u.freq * COALESCE(t.idf, 0.0)) AS tfidf
-    FROM unigram_counts u
-    JOIN q            ON q.tok = u.token
-    LEFT JOIN token_df t ON t.token = u.token
-    JOIN episodes e   ON e.id = u.episode_id
-    GROUP BY e.id, e.show_name, e.season, e.episode, e.file_path
-    HAVING COUNT(DISTINCT u.token) = (SELECT COUNT(*) FROM q)  -- AND strict
-    ORDER BY tfidf DESC
-    LIMIT {limit};
+    FROM {postings}
+    LEFT JOIN token_df t ON t.token_id = u.token_id
+    GROUP BY u.episode_id
+),
+and_rows AS (                                 -- AND strict
+    SELECT * FROM agg
+    WHERE NOT $3 AND matched_terms = (SELECT COUNT(*) FROM w)
+    ORDER BY tfidf DESC, episode_id
+    LIMIT $2
+),
+or_rows AS (                                  -- OR large, pour compléter le pool
+    SELECT * FROM agg
+    ORDER BY matched_terms DESC, tfidf DESC, episode_id
+    LIMIT GREATEST($2 - (SELECT COUNT(*) FROM and_rows), 0)
+),
+cand AS (
+    SELECT 0 AS grp, 'AND' AS match_type, * FROM and_rows
+    UNION ALL
+    SELECT 1, 'OR', * FROM or_rows o
+    WHERE NOT EXISTS (SELECT 1 FROM and_rows a WHERE a.episode_id = o.episode_id)
+),
+pairs AS (                                    -- bigrammes de la requête (mots consécutifs connus)
+    SELECT DISTINCT a.tok AS t1, b.tok AS t2
+    FROM w a JOIN w b ON b.pos = a.pos + 1
+    WHERE a.tok IS NOT NULL AND b.tok IS NOT NULL
+),
+boosts AS (
+    SELECT bc.episode_id, SUM(bc.freq) AS bgfreq
+    FROM bigram_counts bc
+    JOIN pairs p ON p.t1 = bc.token1_id AND p.t2 = bc.token2_id
+    WHERE bc.episode_id IN (SELECT episode_id FROM cand)
+    GROUP BY bc.episode_id
+)
+SELECT
+    e.id, e.show_name, e.season, e.episode, e.file_path,
+    c.matched_terms, c.tfidf, c.match_type, b.bgfreq
+FROM cand c
+JOIN episodes e    ON e.id = c.episode_id
+LEFT JOIN boosts b ON b.episode_id = c.episode_id
+ORDER BY c.grp, c.matched_terms DESC, c.tfidf DESC, e.id
+"""
+CANDIDATES_SQL = _CANDIDATES_TEMPLATE.format(
+    episodes="",
+    postings="""unigram_counts u
+    JOIN w               ON w.tok = u.token_id""",
+)
+
+
+def _filter_clause(flt, first):
     """
-    cur.execute(sql, tokens)
+    Filtre -> (suffixe du nom de requête préparée, condition sur `episodes e`, paramètres
+    numérotés à partir de $first). Une requête préparée par combinaison de filtres :
+    la condition reste indexable dans le plan générique.
+    """
+    name, conds, params = "", [], []
+    if flt.show is not None:
+        name += "s"
+        conds.append(f"e.show_name = ${first + len(params)}::text")
+        params.append(flt.show)
+    if flt.season is not None:
+        name += "n"
+        conds.append(f"e.season = ${first + len(params)}::int")
+        params.append(flt.season)
+    if flt.episode_range is not None:
+        name += "e"
+        n = first + len(params)
+        conds.append(f"e.episode BETWEEN ${n}::int AND ${n + 1}::int")
+        params.extend(flt.episode_range)
+    return name, " AND ".join(conds), params
+
+
+def _candidates_statement(flt):
+    """(nom, SQL, paramètres de filtre) de la requête des candidats, filtrée ou non."""
+    if flt is None or not flt.active:
+        return "search_candidates", CANDIDATES_SQL, []
+    name, cond, params = _filter_clause(flt, 4)
+    sql = _CANDIDATES_TEMPLATE.format(
+        episodes=f"eps AS (SELECT e.id FROM episodes e WHERE {cond}),\n",
+        postings="""eps
+    JOIN w               ON w.tok IS NOT NULL
+    JOIN unigram_counts u ON u.episode_id = eps.id AND u.token_id = w.tok""",
+    )
+    return f"search_candidates_{name}", sql, params
+
+
+# Requête OR seule (référence de scripts/bench_search.py) ; $1 = id des mots, $2 = limite
+QUERY_OR_SQL = """
+WITH q(tok) AS (SELECT UNNEST($1::int[]))
+SELECT
+    e.id, e.show_name, e.season, e.episode, e.file_path,
+    COUNT(DISTINCT u.token_id) AS matched_terms,
+    SUM(u.freq * COALESCE(t.idf, 0.0)) AS tfidf
+FROM unigram_counts u
+JOIN q            ON q.tok = u.token_id
+LEFT JOIN token_df t ON t.token_id = u.token_id
+JOIN episodes e   ON e.id = u.episode_id
+GROUP BY e.id, e.show_name, e.season, e.episode, e.file_path
+ORDER BY matched_terms DESC, tfidf DESC, e.id
+LIMIT $2
+"""
+
+
+def _query_or(cur, tokens, limit):
+    # tokens = id des mots de la requête (None si inconnu)
+    execute_prepared(cur, "search_or", QUERY_OR_SQL, (tokens, limit))
     rows = cur.fetchall()
     for r in rows:
         r["score"] = float(r["tfidf"])
-        r["match_type"] = "AND"
+        r["match_type"] = "OR"
     return rows
 
-def _query_or(cur, tokens, limit):
-    placeholders = ",".join(["%s"] * len(tokens))
-    sql = f"""
-    WITH q(tok) AS (SELECT UNNEST(ARRAY[{placeholders}]))
-    SELECT
-        e.id, e.show_name, e.season, e.episode, e.file_path,
-        COUNT(DISTINCT u.token) AS matched_terms,
-        SUM(u.freq * COALESCE(t.idf, 0.0)) AS tfidf
-    FROM unigram_counts u
-    JOIN q            ON q.tok = u.token
-    LEFT JOIN token_df t ON t.token = u.token
-    JOIN episodes e   ON e.id = u.episode_id
-    GROUP BY e.id, e.show_name, e.season, e.episode, e.file_path
-    HAVING COUNT(DISTINCT u.token) >= 1                        -- OR large
-    ORDER BY matched_terms DESC, tfidf DESC
-    LIMIT {limit};
-    """
-    cur.execute(sql, tokens)
-    rows = cur.fetchall()
+
+def _split_boosts(rows):
+    """Colonne bgfreq des lignes candidates -> dict des boosts (episode_id -> occurrences)."""
+    boosts = {}
     for r in rows:
         r["score"] = float(r["tfidf"])
-        r["match_type"] = "OR"
+        bgfreq = r.pop("bgfreq")
+        if bgfreq:
+            boosts[r["id"]] = bgfreq
+    return boosts
+
+
+def _sql_candidates(tokens, use_variant_or, pool=CANDIDATE_POOL, flt=None):
+    """Candidats (AND prioritaire puis OR) + boosts bigrammes, calculés par Postgres en une requête."""
+    name, sql, filter_params = _candidates_statement(flt)
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_prepared(cur, name, sql, (tokens, pool, use_variant_or, *filter_params))
+        rows = cur.fetchall()
+    return rows, _split_boosts(rows)
+
+
+# ---------- Phrases exactes (entre guillemets) : index positionnel ----------
+# $1 = mots de la requête ; $2, $3 = paires de mots consécutifs des phrases ; $4 = nb de paires.
+# Pré-filtre : épisodes contenant tous les bigrammes des phrases (index bigram_counts),
+# puis positions de tous les mots de la requête ; la phrase exacte est vérifiée en Python.
+# Filtres éventuels ($5...) : même condition sur les épisodes que pour les candidats.
+_PHRASE_TEMPLATE = """
+WITH w AS (
+    SELECT DISTINCT w.text, k.id, COALESCE(t.idf, 0.0) AS idf
+    FROM UNNEST($1::text[]) AS w(text)
+    JOIN tokens k        ON k.text = w.text
+    LEFT JOIN token_df t ON t.token_id = k.id
+),
+pairs AS (
+    SELECT DISTINCT k1.id AS t1, k2.id AS t2
+    FROM UNNEST($2::text[], $3::text[]) AS q(a, b)
+    JOIN tokens k1 ON k1.text = q.a
+    JOIN tokens k2 ON k2.text = q.b
+),
+eps AS (
+    SELECT b.episode_id
+    FROM bigram_counts b
+    JOIN pairs p ON p.t1 = b.token1_id AND p.t2 = b.token2_id
+    {where}GROUP BY b.episode_id
+    HAVING COUNT(*) = $4
+)
+SELECT
+    e.id, e.show_name, e.season, e.episode, e.file_path,
+    w.text, w.idf, p.positions
+FROM eps
+JOIN episodes e        ON e.id = eps.episode_id
+JOIN token_positions p ON p.episode_id = eps.episode_id
+                      AND p.token_id = ANY(ARRAY(SELECT id FROM w))   -- clé primaire complète
+JOIN w                 ON w.id = p.token_id
+"""
+PHRASE_SQL = _PHRASE_TEMPLATE.format(where="")
+
+
+def _phrase_candidates(tokens, phrases, pool=CANDIDATE_POOL, flt=None):
+    """
+    Candidats d'une requête à phrases : épisodes où chaque phrase apparaît telle quelle,
+    score TF-IDF + occurrences des phrases, puis bonus de proximité sur le pool retenu.
+    """
+    pairs = sorted({pair for phrase in phrases for pair in zip(phrase, phrase[1:])})
+    firsts, seconds = [a for a, _ in pairs], [b for _, b in pairs]
+    name, sql, filter_params = "search_phrases", PHRASE_SQL, []
+    if flt is not None and flt.active:
+        suffix, cond, filter_params = _filter_clause(flt, 5)
+        name = f"search_phrases_{suffix}"
+        sql = _PHRASE_TEMPLATE.format(
+            where=f"WHERE b.episode_id IN (SELECT e.id FROM episodes e WHERE {cond})\n    "
+        )
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_prepared(cur, name, sql, (tokens, firsts, seconds, len(pairs), *filter_params))
+        fetched = cur.fetchall()
+
+    episodes, positions, idf = {}, {}, {}
+    for r in fetched:
+        ep = r["id"]
+        if ep not in episodes:
+            episodes[ep] = {k: r[k] for k in ("id", "show_name", "season", "episode", "file_path")}
+            positions[ep] = {}
+        positions[ep][r["text"]] = decode_positions(r["positions"])
+        idf[r["text"]] = r["idf"]
+
+    rows = []
+    for ep, row in episodes.items():
+        scored = score_positions(tokens, phrases, positions[ep], idf)
+        if scored is not None:
+            rows.append({**row, **scored})
+
+    # même ordre que le SQL (AND puis couverture puis score), proximité sur le pool seulement
+    rows.sort(key=lambda r: (r["match_type"] != "AND", -r["matched_terms"], -r["score"], r["id"]))
+    rows = rows[:pool]
+    distinct = list(dict.fromkeys(tokens))
+    for r in rows:
+        r["score"] += proximity_bonus([positions[r["id"]].get(t, []) for t in distinct])
     return rows
 
+
+def _memory_candidates(engine, tokens, use_variant_or, pool=CANDIDATE_POOL, flt=None):
+    """Même chose avec l'index en mémoire (aucun aller-retour vers Postgres)."""
+    rows_and, rows_or = engine.candidates(tokens, use_variant_or, pool, flt=flt)
+    rows = merge_candidates(rows_and, rows_or)
+    bigrams = query_bigrams(tokens)
+    boosts = engine.bigram_boosts([r["id"] for r in rows], bigrams) if bigrams and rows else {}
+    return rows, boosts
+
+
+def _prepare_query(q):
+    """Texte de la requête -> (tokens, phrases, corrections, OR seul ?)."""
+    tokens, phrases = parse_query(q)
+    if not tokens:
+        return tokens, phrases, {}, False
+
+    # Fautes de frappe : mot inconnu -> mot connu le plus proche (ex: vampyre -> vampire)
+    tokens, corrections = fuzzy.correct_tokens(tokens)
+    if corrections:
+        phrases = [[corrections.get(t, t) for t in phrase] for phrase in phrases]
+
+    # Variantes singulier/pluriel auto si UN seul mot (ex: vampire <-> vampires)
+    tokens, use_variant_or = expand_variants(tokens)
+    return tokens, phrases, corrections, use_variant_or
+
+
+def _candidates(tokens, use_variant_or, phrases, pool=CANDIDATE_POOL, engine=None, flt=None):
+    """
+    Candidats (AND prioritaire puis OR) + boosts bigrammes : index en mémoire si fourni,
+    sinon SQL ; phrases : positions lues dans Postgres, quel que soit le moteur.
+    flt (EpisodeFilter) : restreint les candidats dès leur récupération (pool complet).
+    """
+    if phrases:
+        return _phrase_candidates(tokens, phrases, pool, flt), {}
+    if engine is not None:
+        return _memory_candidates(engine, tokens, use_variant_or, pool, flt)
+    return _sql_candidates(tokens, use_variant_or, pool, flt)
+
+
 # ---------- Route principale : un seul paramètre q ----------
 
+def _page(ranking: list[dict], token: str | None, offset: int) -> dict:
+    """Une page du classement complet + curseur de la page suivante (None si dernière page)."""
+    end = offset + LIMIT
+    more = token is not None and end < len(ranking)
+    return {
+        "results": ranking[offset:end],
+        "offset": offset,
+        "total": len(ranking),
+        "next_cursor": f"{token}.{end}" if more else None,
+    }
+
+
+def _with_snippets(page: dict, entry: dict) -> dict:
+    """Ajoute à chaque résultat de la page son extrait (bloc de sous-titres + timecode)."""
+    found = page_snippets([r["id"] for r in page["results"]], entry["tokens"], entry["phrases"])
+    page["results"] = [{**r, "snippet": found.get(r["id"])} for r in page["results"]]
+    return page
+
+
 @router.get("")
-def search(q: str = Query(..., description="Mots-clés ou courte phrase")):
+def search(
+    q: str = Query(..., description="Mots-clés ou courte phrase"),
+    show: str | None = Query(None, description="Seulement cette série (nom exact)"),
+    season: int | None = Query(None, ge=0, description="Seulement cette saison"),
+    ep_from: int | None = Query(None, ge=0, description="Épisodes à partir de ce numéro"),
+    ep_to: int | None = Query(None, ge=0, description="Épisodes jusqu'à ce numéro (inclus)"),
+    snippets: bool = Query(True, description="Extraits surlignés + timecodes des résultats"),
+):
     """
     Mode fixe : AND prioritaire + fallback OR + boost bigrammes.
     Dédup par série (max 1 épisode par show) + Rerank par série (Top-3 séries promues).
     Variantes singulier/pluriel auto si la requête contient un seul mot.
+    Phrases entre guillemets ("mot1 mot2") : seuls les épisodes qui les contiennent telles
+    quelles sont retenus (index positionnel), avec un bonus de proximité entre les mots.
+    Mots inconnus de l'index corrigés par le mot connu le plus proche (distance 1-2, puis DF).
+    Avec SEARCH_ENGINE=memory, les candidats viennent de l'index en mémoire s'il est à jour.
+    Filtres show / season / ep_from-ep_to appliqués pendant la récupération des candidats
+    (index episodes en SQL, bitmaps par série et saison en mémoire), pas après coup.
+    Pages suivantes : GET /search/next?cursor=<next_cursor>.
+    Chaque résultat porte un extrait (bloc de sous-titres le plus pertinent, mots surlignés,
+    timecode "aller à"), lu via la table des blocs sans retokeniser le fichier.
     """
     start = time.perf_counter()
 
-    tokens = normalize_line(q)
+    tokens, phrases, corrections, use_variant_or = _prepare_query(q)
     if not tokens:
         elapsed = (time.perf_counter() - start) * 1000.0
         return {"query": q, "tokens": [], "time_ms": round(elapsed, 2), "results": []}
+    flt = EpisodeFilter(show, season, ep_from, ep_to)
 
-    # Variantes singulier/pluriel auto si UN seul mot (ex: vampire <-> vampires)
-    use_variant_or = False
-    if len(tokens) == 1:
-        t = tokens[0]
-        variants = {t}
-        if t.endswith("s"):
-            if len(t) > 1:
-                variants.add(t[:-1])
-        else:
-            variants.add(t + "s")
-        tokens = list(variants)
-        use_variant_or = True
-
-    # Bigrammes pour boost de "phrase exacte"
-    bigrams = [(tokens[i], tokens[i + 1]) for i in range(len(tokens) - 1)]
-
-    # ----- Récupération des candidats (AND prioritaire puis OR) -----
-    with get_connection() as conn, conn.cursor() as cur:
-        if use_variant_or:
-            rows_and = []
-            rows_or = _query_or(cur, tokens, CANDIDATE_POOL)
-        else:
-            rows_and = _query_and(cur, tokens, CANDIDATE_POOL)
-            remaining = max(0, CANDIDATE_POOL - len(rows_and))
-            rows_or = _query_or(cur, tokens, remaining) if remaining else []
-
-    # Fusion sans doublons d'épisodes (AND avant OR)
-    seen_ep = {r["id"] for r in rows_and}
-    rows = rows_and + [r for r in rows_or if r["id"] not in seen_ep]
-
-    # ----- Boost de phrase exacte via bigram_counts -----
-    if bigrams and rows:
-        ep_ids = [r["id"] for r in rows]
-        placeholders_ep = ",".join(["%s"] * len(ep_ids))
-        placeholders_bg = ",".join(["(%s,%s)"] * len(bigrams))
-        bg_params = []
-        for t1, t2 in bigrams:
-            bg_params += [t1, t2]
-
-        boost_sql = f"""
-        SELECT episode_id, SUM(freq) AS bgfreq
-        FROM bigram_counts
-        WHERE episode_id IN ({placeholders_ep})
-          AND (token1, token2) IN ({placeholders_bg})
-        GROUP BY episode_id;
-        """
-        with get_connection() as conn, conn.cursor() as cur:
-            cur.execute(boost_sql, ep_ids + bg_params)
-            boosts = {r["episode_id"]: r["bgfreq"] for r in cur.fetchall()}
-        for r in rows:
-            r["score"] = float(r["score"]) + 2.0 * float(boosts.get(r["id"], 0))
-
-    # ----- Tri primaire (AND d'abord, puis score décroissant) -----
-    rows.sort(key=lambda x: (0 if x["match_type"] == "AND" else 1, -x["score"]))
-
-    # ----- Rerank par série : promouvoir les Top-3 séries -----
-    # 1) score par série = somme des scores + petit bonus sur matched_terms max
-    series_score = {}
-    best_ep_per_show = {}
-    for r in rows:
-        show = r["show_name"]
-        series_score.setdefault(show, 0.0)
-        series_score[show] += float(r["score"])
-        # garder le meilleur épisode par série
-        if show not in best_ep_per_show or r["score"] > best_ep_per_show[show]["score"]:
-            best_ep_per_show[show] = r
-        # bonus léger à la "couverture" (approx: matched_terms max)
-        series_score[show] += 0.1 * int(r.get("matched_terms", 0))
-
-    # 2) top-3 séries
-    top_series = sorted(series_score.items(), key=lambda kv: kv[1], reverse=True)[:3]
-    top3_shows = [name for name, _ in top_series]
-    top3_episodes = [best_ep_per_show[s] for s in top3_shows if s in best_ep_per_show]
-
-    # ----- Diversité : max 1 épisode par série + priorité aux Top-3 -----
-    diverse = []
-    seen_shows = set()
-
-    # place d'abord les meilleurs épisodes des 3 meilleures séries
-    for r in top3_episodes:
-        if r["show_name"] not in seen_shows:
-            diverse.append(r)
-            seen_shows.add(r["show_name"])
-            if len(diverse) >= LIMIT:
-                break
-
-    # puis complète avec le reste, en respectant "1 épisode par série"
-    if len(diverse) < LIMIT:
-        for r in rows:
-            if r["show_name"] in seen_shows:
-                continue
-            diverse.append(r)
-            seen_shows.add(r["show_name"])
-            if len(diverse) >= LIMIT:
-                break
+    # ----- Cache : même requête normalisée, mêmes filtres, même génération -> même classement -----
+    cache_key = (tuple(tokens), use_variant_or, tuple(map(tuple, phrases)), flt)
+    generation = None
+    entry = None
+    if result_cache.enabled:
+        generation = current_generation()
+        result_cache.sync(generation)
+        entry = result_cache.get(cache_key)
 
+    if entry is None:
+        # ----- Récupération des candidats (AND prioritaire puis OR) + boosts bigrammes -----
+        engine = search_engine.get_engine() if not phrases else None
+        rows, boosts = _candidates(tokens, use_variant_or, phrases, engine=engine, flt=flt)
+        if boosts:
+            apply_bigram_boost(rows, boosts)
+
+        # ----- Tri, rerank par série (Top-3 promues) et diversité (1 épisode par série) -----
+        # classement complet du pool : les pages suivantes n'en sont que des tranches
+        entry = {
+            "tokens": tokens,
+            "phrases": phrases,
+            "engine": "memory" if engine is not None else "sql",
+            "ranking": rerank(rows, len(rows)),
+        }
+        result_cache.put(cache_key, entry, generation)
+        cached = False
+    else:
+        cached = True
+
+    # ----- Curseur (TTL court) si le classement dépasse une page -----
+    token = None
+    if cursor_store.enabled and len(entry["ranking"]) > LIMIT:
+        token = secrets.token_urlsafe(12)
+        cursor_store.put(token, entry)
+
+    page = _page(entry["ranking"], token, 0)
+    if snippets:
+        page = _with_snippets(page, entry)
     elapsed = (time.perf_counter() - start) * 1000.0
     return {
         "query": q,
-        "tokens": tokens,
+        "tokens": entry["tokens"],
+        "phrases": entry["phrases"],
+        "corrections": corrections,
+        "filters": flt._asdict() if flt.active else None,
+        "engine": entry["engine"],
+        "cached": cached,
+        **page,
+        "time_ms": round(elapsed, 2),
+    }
+
+
+@router.get("/next")
+def search_next(
+    cursor: str = Query(..., description="next_cursor renvoyé par /search ou /search/next"),
+    snippets: bool = Query(True, description="Extraits surlignés + timecodes des résultats"),
+):
+    """Page suivante d'une recherche : tranche du classement mémorisé (seuls les extraits sont lus)."""
+    start = time.perf_counter()
+    token, _, offset = cursor.rpartition(".")
+    entry = cursor_store.get(token) if token and offset.isdigit() else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="curseur inconnu ou expiré : relancer la recherche")
+    page = _page(entry["ranking"], token, int(offset))
+    if snippets:
+        page = _with_snippets(page, entry)
+    elapsed = (time.perf_counter() - start) * 1000.0
+    return {
+        "tokens": entry["tokens"],
+        "phrases": entry["phrases"],
+        **page,
+        "time_ms": round(elapsed, 2),
+    }
+
+
+# ---------- Recherche par lots (évaluation hors ligne, réglage du classement) ----------
+# Même plan que CANDIDATES_SQL pour BATCH_CHUNK requêtes à la fois :
+# $1, $2, $3 = (n° de requête, position, mot) à plat ; $4 = OR seul par requête ; $5 = pool.
+# Les listes des mots communs à plusieurs requêtes du lot ne sont lues qu'une fois (post).
+BATCH_CANDIDATES_SQL = """
+WITH w AS (
+    SELECT q.qid, q.pos, k.id AS tok
+    FROM UNNEST($1::int[], $2::int[], $3::text[]) AS q(qid, pos, text)
+    LEFT JOIN tokens k ON k.text = q.text
+),
+qs AS (
+    SELECT qid, COUNT(*) AS n, ($4::boolean[])[qid] AS variant_or
+    FROM w
+    GROUP BY qid
+),
+post AS MATERIALIZED (
+    SELECT u.token_id, u.episode_id, u.freq * COALESCE(t.idf, 0.0) AS s
+    FROM (SELECT DISTINCT tok FROM w WHERE tok IS NOT NULL) d
+    JOIN unigram_counts u ON u.token_id = d.tok
+    LEFT JOIN token_df t  ON t.token_id = u.token_id
+),
+agg AS (
+    SELECT w.qid, p.episode_id,
+           COUNT(DISTINCT p.token_id) AS matched_terms,
+           SUM(p.s) AS tfidf
+    FROM w
+    JOIN post p ON p.token_id = w.tok
+    GROUP BY w.qid, p.episode_id
+),
+ranked AS (
+    SELECT a.*, (NOT qs.variant_or AND a.matched_terms = qs.n) AS is_and
+    FROM agg a
+    JOIN qs ON qs.qid = a.qid
+),
+numbered AS (
+    SELECT r.*,
+           ROW_NUMBER() OVER (PARTITION BY r.qid, r.is_and ORDER BY r.tfidf DESC, r.episode_id) AS and_rank,
+           ROW_NUMBER() OVER (PARTITION BY r.qid
+                              ORDER BY r.matched_terms DESC, r.tfidf DESC, r.episode_id) AS or_rank
+    FROM ranked r
+),
+flagged AS (
+    SELECT n.*,
+           (n.is_and AND n.and_rank <= $5) AS in_and,
+           COUNT(*) FILTER (WHERE n.is_and AND n.and_rank <= $5) OVER (PARTITION BY n.qid) AS n_and
+    FROM numbered n
+),
+cand AS (
+    SELECT * FROM flagged
+    WHERE in_and OR or_rank <= $5 - n_and
+),
+pairs AS (
+    SELECT DISTINCT a.qid, a.tok AS t1, b.tok AS t2
+    FROM w a JOIN w b ON b.qid = a.qid AND b.pos = a.pos + 1
+    WHERE a.tok IS NOT NULL AND b.tok IS NOT NULL
+),
+boosts AS (
+    SELECT c.qid, c.episode_id, SUM(bc.freq) AS bgfreq
+    FROM cand c
+    JOIN pairs p          ON p.qid = c.qid
+    JOIN bigram_counts bc ON bc.episode_id = c.episode_id
+                         AND bc.token1_id = p.t1 AND bc.token2_id = p.t2
+    GROUP BY c.qid, c.episode_id
+)
+SELECT
+    c.qid, e.id, e.show_name, e.season, e.episode, e.file_path,
+    c.matched_terms, c.tfidf,
+    CASE WHEN c.in_and THEN 'AND' ELSE 'OR' END AS match_type,
+    b.bgfreq
+FROM cand c
+JOIN episodes e    ON e.id = c.episode_id
+LEFT JOIN boosts b ON b.qid = c.qid AND b.episode_id = c.episode_id
+ORDER BY c.qid, c.in_and DESC, c.matched_terms DESC, c.tfidf DESC, e.id
+"""
+
+BATCH_CHUNK = 25     # requêtes par instruction SQL
+BATCH_MAX = 20000    # requêtes max par appel de POST /search/batch
+
+
+def _sql_candidates_batch(items, pool=CANDIDATE_POOL):
+    """[(tokens, OR seul ?)] -> [(candidats, boosts)] dans le même ordre, en une instruction."""
+    qids, positions, words = [], [], []
+    for qid, (tokens, _) in enumerate(items, start=1):
+        for pos, t in enumerate(tokens):
+            qids.append(qid)
+            positions.append(pos)
+            words.append(t)
+    variant_or = [v for _, v in items]
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_prepared(
+            cur, "search_candidates_batch", BATCH_CANDIDATES_SQL,
+            (qids, positions, words, variant_or, pool),
+        )
+        fetched = cur.fetchall()
+
+    per_query = [[] for _ in items]
+    for r in fetched:
+        per_query[r.pop("qid") - 1].append(r)
+    return [(rows, _split_boosts(rows)) for rows in per_query]
+
+
+def search_batch(
+    queries: list[str],
+    candidate_pool: int = CANDIDATE_POOL,
+    bigram_weight: float = BIGRAM_WEIGHT,
+    top_series: int = TOP_SERIES,
+    limit: int = LIMIT,
+    workers: int | None = None,
+) -> list[dict]:
+    """
+    Exécute beaucoup de requêtes d'un coup (mêmes règles que /search, paramètres de
+    classement ajustables) ; renvoie, dans l'ordre, {query, tokens, corrections, results}.
+
+    Les requêtes identiques après normalisation ne sont calculées qu'une fois ; les autres
+    passent par lots de BATCH_CHUNK (listes partagées) répartis sur les connexions du pool,
+    ou par l'index en mémoire s'il est à jour. Le cache de résultats n'est pas utilisé.
+    """
+    prepared = [_prepare_query(q) for q in queries]
+
+    # requêtes distinctes (tokens, phrases, OR seul)
+    keys: dict[tuple, int] = {}
+    distinct: list[tuple] = []
+    for tokens, phrases, _, use_variant_or in prepared:
+        key = (tuple(tokens), use_variant_or, tuple(map(tuple, phrases)))
+        if tokens and key not in keys:
+            keys[key] = len(distinct)
+            distinct.append((tokens, phrases, use_variant_or))
+
+    candidates: list = [None] * len(distinct)
+    engine = search_engine.get_engine()
+    plain = [i for i, (_, phrases, _) in enumerate(distinct) if not phrases]
+    if engine is not None:
+        for i in plain:
+            tokens, _, use_variant_or = distinct[i]
+            candidates[i] = _memory_candidates(engine, tokens, use_variant_or, candidate_pool)
+        plain = []
+
+    jobs = [plain[k:k + BATCH_CHUNK] for k in range(0, len(plain), BATCH_CHUNK)]
+    phrase_jobs = [i for i, (_, phrases, _) in enumerate(distinct) if phrases]
+
+    def run_chunk(chunk):
+        items = [(distinct[i][0], distinct[i][2]) for i in chunk]
+        for i, res in zip(chunk, _sql_candidates_batch(items, candidate_pool)):
+            candidates[i] = res
+
+    def run_phrase(i):
+        tokens, phrases, _ = distinct[i]
+        candidates[i] = (_phrase_candidates(tokens, phrases, candidate_pool), {})
+
+    with ThreadPoolExecutor(max_workers=workers or DB_POOL_SIZE) as pool:
+        futures = [pool.submit(run_chunk, c) for c in jobs]
+        futures += [pool.submit(run_phrase, i) for i in phrase_jobs]
+        for f in futures:
+            f.result()
+
+    rankings = []
+    for rows, boosts in candidates:
+        if boosts:
+            apply_bigram_boost(rows, boosts, bigram_weight)
+        rankings.append(rerank(rows, limit, top_series))
+
+    out = []
+    for q, (tokens, phrases, corrections, use_variant_or) in zip(queries, prepared):
+        key = (tuple(tokens), use_variant_or, tuple(map(tuple, phrases)))
+        results = rankings[keys[key]] if tokens else []
+        out.append({"query": q, "tokens": tokens, "corrections": corrections, "results": results})
+    return out
+
+
+class BatchParams(BaseModel):
+    candidate_pool: int = Field(CANDIDATE_POOL, ge=1, le=5000)
+    bigram_weight: float = BIGRAM_WEIGHT
+    top_series: int = Field(TOP_SERIES, ge=0, le=100)
+    limit: int = Field(LIMIT, ge=1, le=100)
+
+
+class BatchRequest(BaseModel):
+    queries: list[str]
+    params: BatchParams = BatchParams()
+
+
+@router.post("/batch")
+def search_batch_route(body: BatchRequest):
+    """
+    Rejoue une liste de requêtes en un appel (évaluation, réglage de CANDIDATE_POOL,
+    du poids des bigrammes, de la promotion des séries et de la limite).
+    """
+    if len(body.queries) > BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"{BATCH_MAX} requêtes max par appel")
+    start = time.perf_counter()
+    results = search_batch(body.queries, **body.params.model_dump())
+    elapsed = (time.perf_counter() - start) * 1000.0
+    return {
+        "count": len(results),
+        "params": body.params.model_dump(),
         "time_ms": round(elapsed, 2),
-        "results": diverse,
+        "results": results,
     }
+
+
+@router.get("/suggest")
+def search_suggest(
+    prefix: str = Query(..., description="Début de saisie (ex: 'vamp', 'the walk')"),
+    limit: int = Query(suggest.SUGGEST_LIMIT, ge=1, le=suggest.SUGGEST_MAX),
+):
+    """
+    Autocomplétion servie depuis la mémoire (aucune requête SQL) : séries dont le nom
+    commence par le préfixe, mots qui complètent le dernier mot tapé, classés par DF.
+    """
+    start = time.perf_counter()
+    idx = suggest.get_index()
+    found = idx.suggest(prefix, limit) if idx is not None else {"shows": [], "tokens": []}
+    elapsed = (time.perf_counter() - start) * 1000.0
+    return {"prefix": prefix, "ready": idx is not None, **found, "time_ms": round(elapsed, 3)}
+
+
+@router.get("/cache-stats")
+def search_cache_stats():
+    """Compteurs du cache de résultats (hits, misses, évictions...) pour le dimensionner."""
+    return result_cache.stats()
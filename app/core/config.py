@@ -9,3 +9,29 @@ PG_PASSWORD = os.getenv("POSTGRES_PASSWORD", "sae")
 PG_DB = os.getenv("POSTGRES_DB", "sae_db")
 PG_HOST = os.getenv("POSTGRES_HOST", "localhost")
 PG_PORT = int(os.getenv("POSTGRES_PORT", "5432"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))   # connexions max du pool (lectures /search)
+
+# Indexation en masse (scripts/bulk_index.py, /admin/reindex)
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "0")) or (os.cpu_count() or 1)  # process de parsing
+INDEX_WRITERS = int(os.getenv("INDEX_WRITERS", "2"))                          # connexions d'écriture
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "25"))                   # épisodes par transaction
+
+# Moteur de recherche : "sql" (défaut) ou "memory" (listes inversées en mémoire, cf. search_engine.py)
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "sql").lower()
+SEARCH_SNAPSHOT = os.getenv("SEARCH_SNAPSHOT", "data/index.snapshot")          # fichier mappé en mémoire
+
+# Cache des résultats de /search (LRU + TTL, vidé à chaque nouvelle génération d'index)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))   # 0 = désactivé
+SEARCH_CACHE_TTL_S = float(os.getenv("SEARCH_CACHE_TTL_S", "300"))
+
+# Pagination de /search : curseurs vers le classement complet (LRU + TTL court)
+SEARCH_CURSOR_SIZE = int(os.getenv("SEARCH_CURSOR_SIZE", "4096"))
+SEARCH_CURSOR_TTL_S = float(os.getenv("SEARCH_CURSOR_TTL_S", "120"))
+
+# Cache des résultats de /user/recommend (par utilisateur, vidé par /user/rate et à chaque génération)
+RECO_CACHE_SIZE = int(os.getenv("RECO_CACHE_SIZE", "4096"))   # 0 = désactivé
+RECO_CACHE_TTL_S = float(os.getenv("RECO_CACHE_TTL_S", "600"))
+
+# Recommandations précalculées (scripts/precompute_recommendations.py) : servies si plus récentes
+# que les notes de l'utilisateur, de la génération d'index courante et plus jeunes que ce délai
+RECO_BATCH_MAX_AGE_S = float(os.getenv("RECO_BATCH_MAX_AGE_S", "86400"))
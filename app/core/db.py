@@ -1,10 +1,15 @@
 # app/core/db.py
+import threading
+import weakref
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from .config import PG_USER, PG_PASSWORD, PG_DB, PG_HOST, PG_PORT
+from psycopg2.pool import ThreadedConnectionPool
+from .config import PG_USER, PG_PASSWORD, PG_DB, PG_HOST, PG_PORT, DB_POOL_SIZE
 
-def get_connection():
-    return psycopg2.connect(
+def _connect_kwargs() -> dict:
+    return dict(
         dbname=PG_DB,
         user=PG_USER,
         password=PG_PASSWORD,
@@ -13,6 +18,9 @@ def get_connection():
         cursor_factory=RealDictCursor,
     )
 
+def get_connection():
+    return psycopg2.connect(**_connect_kwargs())
+
 def check_db() -> bool:
     try:
         with get_connection() as conn:
@@ -22,3 +30,52 @@ def check_db() -> bool:
         return True
     except Exception:
         return False
+
+# ---------- Pool de connexions (chemins de lecture chauds : /search...) ----------
+
+_pool: ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)  # attend une connexion libre plutôt que PoolError
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(1, DB_POOL_SIZE, **_connect_kwargs())
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    Connexion réutilisée (pas d'établissement de connexion par requête).
+    La transaction est validée en sortie, annulée en cas d'erreur ; une connexion
+    cassée est fermée au lieu d'être rendue au pool.
+    """
+    with _pool_slots:
+        pool = _get_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+
+# ---------- Requêtes préparées côté serveur ----------
+
+_prepared: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # connexion -> noms préparés
+
+def execute_prepared(cur, name: str, sql: str, params: tuple) -> None:
+    """
+    EXECUTE name(params) ; la requête est préparée (PREPARE) au premier usage sur la
+    connexion du curseur, puis Postgres réutilise son plan. `sql` utilise $1, $2...
+    """
+    names = _prepared.setdefault(cur.connection, set())
+    if name not in names:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        names.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", params)
@@ -1,4 +1,5 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.staticfiles import StaticFiles                      # <-- NEW
 from starlette.middleware.sessions import SessionMiddleware      # <-- NEW
@@ -9,6 +10,7 @@ from .services.subtitles import srt_to_lines
 from .services.normalize import normalize_line, token_counts_from_file
 from .services.schema import init_schema
 from .services.indexer import index_srt
+from .services import fuzzy, item_cf, search_engine, show_vectors, suggest
 
 from app.api import admin, debug_index
 from app.api import search
@@ -17,7 +19,21 @@ from app.api import auth
 
 from app.web import router as web_router                         # <-- NEW (router HTML)
 
-app = FastAPI(title="Series Reco")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # SEARCH_ENGINE=memory : chargement de l'index de recherche en tâche de fond
+    search_engine.start()
+    # vocabulaire en mémoire (fautes de frappe, autocomplétion), en tâche de fond aussi
+    fuzzy.start()
+    suggest.start()
+    # matrice série x token de /user/recommend (si NumPy est installé)
+    show_vectors.start()
+    # filtrage collaboratif (user_ratings), mis à jour ensuite par /user/rate
+    item_cf.start()
+    yield
+
+
+app = FastAPI(title="Series Reco", lifespan=lifespan)
 
 # === Sessions (cookie signé) pour savoir qui est connecté ===
 # (la clé peut être n'importe quelle chaîne secrète en développement)
@@ -0,0 +1,499 @@
+# app/services/bulk_indexer.py
+"""
+Indexation en masse, dans le process (plus d'appels HTTP vers /admin/index-srt).
+
+- parsing + normalisation des .srt répartis sur un pool de process
+- écriture en BDD par quelques threads "writers" (1 connexion chacun), par lots
+- mode incrémental : seuls les fichiers nouveaux/modifiés (taille, mtime, hash)
+  sont retraités, les épisodes dont le fichier a disparu sont supprimés
+- token_df / show_token_counts : recalcul ensembliste après un chargement complet,
+  application des variations (DF, fréquences par série) après un passage incrémental
+- les .srt contenus dans des archives .zip/.7z sont lus en mémoire (clé "archive!membre")
+"""
+from __future__ import annotations
+import multiprocessing
+import os
+import pathlib
+import queue
+import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Callable, Iterator
+
+from app.core.config import INDEX_WORKERS, INDEX_WRITERS, INDEX_BATCH_SIZE
+from app.core.db import get_connection
+from app.services.indexer import (
+    content_hash, delete_episodes, merged_counts, parse_source, upsert_episode, write_counts, write_cues,
+)
+from app.services.index_state import bump_generation
+from app.services.idf import apply_df_delta, df_delta, recompute_df, refresh_idf
+from app.services.show_tokens import apply_show_delta, refresh_show_tokens, show_delta
+from app.services.sources import is_archive, list_archive, member_key, read_archive, read_source, split_key
+from app.services.tokens import counts_to_ids
+
+WRITER_POLL_S = 1.0   # attente max d'une place dans la file avant de vérifier que les writers tournent
+
+# Garde uniquement ces tags. Vide => aucune restriction.
+LANG_KEEP = {"VF", "FR"}                 # mets set() si tu veux tout prendre
+
+PATTERNS = [
+    re.compile(r"[Ss](\d{1,2})[ ._-]*[Ee](\d{1,2})"),  # S01E02, S1E3, S01.E02, etc.
+    re.compile(r"(\d{1,2})[xX](\d{2})"),               # 2x01, 11x05, etc.
+]
+
+
+def detect_season_ep(filename: str):
+    stem = pathlib.Path(filename).stem
+    for pat in PATTERNS:
+        m = pat.search(stem)
+        if m:
+            s, e = m.groups()
+            return int(s), int(e)
+    return None
+
+
+def keep_by_language(filename: str) -> bool:
+    if not LANG_KEEP:
+        return True
+    upper = filename.upper()
+    return any(tag in upper for tag in LANG_KEEP)
+
+
+def show_from_path(path) -> str:
+    p = pathlib.Path(path)
+    return p.parent.name.replace("_", " ").strip()
+
+
+def _item(file_path: str, name_path: pathlib.Path, size: int, mtime: float, **extra) -> dict | None:
+    """Décrit une source indexable, ou None si la langue / le motif SxxEyy ne conviennent pas."""
+    if not keep_by_language(name_path.name):
+        return None
+    se = detect_season_ep(name_path.name)
+    if not se:
+        return None
+    season, ep = se
+    return {
+        "file_path": file_path,
+        "show": show_from_path(name_path),
+        "season": season,
+        "episode": ep,
+        "size": size,
+        "mtime": mtime,
+        **extra,
+    }
+
+
+def discover_files(root_dir: str = "data/sous-titres") -> list[dict]:
+    """
+    Liste les .srt indexables (langue OK + motif saison/épisode reconnu),
+    y compris ceux contenus dans les archives .zip/.7z (lus sans extraction).
+    Un membre déjà extrait à côté de son archive (ancien scripts/extract_archives.py)
+    n'est indexé qu'une fois : le fichier à plat l'emporte (cf. shadowed_members).
+    """
+    root = pathlib.Path(root_dir)
+    found = []
+    for path in sorted(root.rglob("*")):
+        if path.suffix.lower() == ".srt" and path.is_file():
+            st = path.stat()
+            item = _item(str(path.resolve()), path, st.st_size, st.st_mtime)
+            if item:
+                found.append(item)
+        elif is_archive(path) and path.is_file():
+            archive = path.resolve()
+            mtime = archive.stat().st_mtime
+            try:
+                members = list_archive(archive)
+            except Exception:
+                continue    # archive illisible : ignorée (comme l'ancienne extraction)
+            for m in members:
+                if (path.parent / m["member"]).is_file():
+                    continue    # déjà extrait : indexé comme fichier à plat
+                # même nom de série que si l'archive avait été extraite à côté d'elle
+                item = _item(
+                    member_key(archive, m["member"]), path.parent / m["member"], m["size"], mtime,
+                    archive=str(archive), member=m["member"],
+                )
+                if item:
+                    found.append(item)
+    return found
+
+
+def load_manifest(root_dir: str) -> dict[str, dict]:
+    """Manifeste (taille, mtime, hash) des épisodes déjà indexés sous root_dir."""
+    prefix = str(pathlib.Path(root_dir).resolve()) + os.sep
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id, file_path, file_size, file_mtime, content_hash,
+                   EXISTS (SELECT 1 FROM token_positions p WHERE p.episode_id = e.id) AS has_positions,
+                   EXISTS (SELECT 1 FROM episode_cues c WHERE c.episode_id = e.id) AS has_cues
+            FROM episodes e
+            WHERE starts_with(file_path, %s);
+            """,
+            (prefix,),
+        )
+        return {r["file_path"]: r for r in cur.fetchall()}
+
+
+def shadowed_members(manifest: dict[str, dict]) -> list[int]:
+    """Épisodes indexés comme membres d'archive alors que le fichier extrait existe à côté (doublons)."""
+    out = []
+    for path, r in manifest.items():
+        archive, member = split_key(path)
+        if member is not None and (pathlib.Path(archive).parent / member).is_file():
+            out.append(r["id"])
+    return out
+
+
+def source_missing(key: str, listings: dict[str, set[str] | None]) -> bool:
+    """
+    La source a-t-elle vraiment disparu ? Fichier absent, archive absente, ou membre absent
+    d'une archive lue sans erreur. Une archive illisible ou non prise en charge (.7z sans
+    py7zr) ne prouve rien : ses membres sont conservés. `listings` : cache archive -> membres.
+    """
+    archive, member = split_key(key)
+    if member is None:
+        return not pathlib.Path(key).is_file()
+    if not pathlib.Path(archive).is_file():
+        return True
+    if archive not in listings:
+        try:
+            listings[archive] = {m["member"] for m in list_archive(pathlib.Path(archive))}
+        except Exception:
+            listings[archive] = None
+    names = listings[archive]
+    return names is not None and member not in names
+
+
+def plan_incremental(items: list[dict], manifest: dict[str, dict]) -> tuple[list[dict], int, list[int]]:
+    """
+    Compare les fichiers présents au manifeste.
+    Renvoie (fichiers à traiter, nb inchangés, ids d'épisodes dont le fichier a disparu).
+    Disparu = source réellement absente (cf. source_missing), pas seulement écartée par
+    discover_files (langue, motif SxxEyy : épisodes indexés à la main via /admin/index-srt).
+    Taille + mtime identiques => inchangé sans relire ; sinon le hash tranchera dans le worker.
+    Les épisodes indexés avant l'index positionnel ou la table des blocs sont retraités.
+    """
+    todo: list[dict] = []
+    unchanged = 0
+    seen: set[str] = set()
+    for item in items:
+        seen.add(item["file_path"])
+        known = manifest.get(item["file_path"])
+        if known and not (known["has_positions"] and known["has_cues"]):
+            known = None
+        if (
+            known and known["content_hash"]
+            and known["file_size"] == item["size"] and known["file_mtime"] == item["mtime"]
+        ):
+            unchanged += 1
+            continue
+        todo.append({**item, "known_hash": known["content_hash"] if known else None})
+    listings: dict[str, set[str] | None] = {}
+    removed = [r["id"] for path, r in manifest.items() if path not in seen and source_missing(path, listings)]
+    return todo, unchanged, removed
+
+
+def remove_episodes(episode_ids: list[int], delta: Counter, delta_show: Counter) -> int:
+    """Supprime des épisodes ; les variations (DF, par série) sont ajoutées à `delta` / `delta_show`."""
+    if not episode_ids:
+        return 0
+    with get_connection() as conn, conn.cursor() as cur:
+        d, ds = delete_episodes(cur, episode_ids)
+        conn.commit()
+    delta.update(d)
+    delta_show.update(ds)
+    return len(episode_ids)
+
+
+def finalize_aggregates(incremental: bool, delta: Counter, delta_show: Counter) -> int:
+    """
+    Met token_df et show_token_counts à jour à la fin d'un passage (+ nouvelle génération d'index).
+    Renvoie le nb de tokens dont le DF a été (re)calculé.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        if incremental:
+            apply_df_delta(cur, delta)
+            refresh_idf(cur)
+            apply_show_delta(cur, delta_show)
+            n = len(delta)
+        else:
+            n = recompute_df(cur)
+            refresh_show_tokens(cur)
+        bump_generation(cur)
+        conn.commit()
+    return n
+
+
+def _with_archive_bytes(items: list[dict]) -> Iterator[dict]:
+    """
+    Joint le contenu des membres d'archives (une ouverture par archive, au fil de l'eau).
+    Les .srt simples sont lus directement par les workers.
+    """
+    for archive, group in groupby(items, key=lambda it: it.get("archive")):
+        group = list(group)
+        if archive is None:
+            yield from group
+            continue
+        try:
+            contents = dict(read_archive(pathlib.Path(archive), [it["member"] for it in group]))
+        except Exception as e:
+            for it in group:
+                yield {**it, "error": f"{type(e).__name__}: {e}"}
+            continue
+        for it in group:
+            yield {**it, "data": contents.get(it["member"])}
+
+
+def _parse_file(item: dict) -> dict:
+    """Exécuté dans un process du pool : lecture + hash + normalisation + comptage."""
+    if "error" in item:
+        return item
+    try:
+        data = item.pop("data", None)
+        if data is None:
+            data = read_source(item["file_path"])   # une seule lecture : hash + parsing
+        digest = content_hash(data)
+        manifest = {"file_size": item["size"], "file_mtime": item["mtime"], "content_hash": digest}
+        if item.get("known_hash") == digest:
+            # seul le mtime a bougé : pas besoin de retokeniser
+            return {**item, "manifest": manifest, "unchanged": True}
+        n_lines, c_uni, c_bi, positions, cues = parse_source(data)
+        return {
+            **item, "manifest": manifest, "lines": n_lines,
+            "unigrams": c_uni, "bigrams": c_bi, "positions": positions, "cues": cues,
+        }
+    except Exception as e:
+        return {**item, "error": f"{type(e).__name__}: {e}"}
+
+
+def _parse_all(
+    pool: ProcessPoolExecutor, items: Iterator[dict], window: int, cancel: threading.Event | None = None
+) -> Iterator[dict]:
+    """
+    Soumet les sources au pool avec au plus `window` tâches en vol (mémoire bornée).
+    Si `cancel` est levé, plus rien n'est soumis et les tâches en attente sont abandonnées.
+    """
+    pending: deque = deque()
+    for item in items:
+        if cancel is not None and cancel.is_set():
+            break
+        pending.append(pool.submit(_parse_file, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        if cancel is not None and cancel.is_set():
+            for fut in pending:
+                fut.cancel()
+            return
+        yield pending.popleft().result()
+
+
+def _writer_loop(
+    batches: queue.Queue,
+    stats: dict,
+    lock: threading.Lock,
+    replace: bool,
+    deltas: tuple[Counter, Counter] | None,
+) -> None:
+    """
+    Thread d'écriture : une connexion, un commit par lot.
+    En incrémental, les variations (DF, par série) sont cumulées dans `deltas`.
+    Connexion perdue : le lot est compté en erreur, une nouvelle connexion est ouverte
+    pour le lot suivant.
+    """
+    conn = None
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if conn is None:
+                conn = _writer_connection(stats, lock)
+            if conn is None:
+                # pas de connexion : on continue à vider la file pour ne pas bloquer le parsing
+                with lock:
+                    stats["errors"] += len(batch)
+                continue
+            touched = 0
+            batch_delta: Counter = Counter()
+            batch_show: Counter = Counter()
+            try:
+                with conn.cursor() as cur:
+                    for item in batch:
+                        if item.get("unchanged"):
+                            cur.execute(
+                                "UPDATE episodes SET file_size = %s, file_mtime = %s WHERE file_path = %s;",
+                                (item["manifest"]["file_size"], item["manifest"]["file_mtime"], item["file_path"]),
+                            )
+                            touched += 1
+                            continue
+                        episode_id, _, old_show = upsert_episode(
+                            cur, item["file_path"], item["show"], item["season"], item["episode"],
+                            item["manifest"],
+                        )
+                        uni, bi, pos = counts_to_ids(item["unigrams"], item["bigrams"], item["positions"])
+                        old = write_counts(cur, episode_id, uni, bi, replace=replace, positions=pos)
+                        write_cues(cur, episode_id, item["cues"])
+                        if deltas is not None:
+                            new = merged_counts(old, uni, replace)
+                            batch_delta.update(df_delta(set(old), set(new)))
+                            batch_show.update(show_delta(old_show, old, item["show"], new))
+                conn.commit()
+            except Exception as e:
+                with lock:
+                    stats["errors"] += len(batch)
+                    stats["last_error"] = f"{type(e).__name__}: {e}"
+                try:
+                    conn.rollback()
+                except Exception:
+                    conn.close()   # connexion cassée : une nouvelle au prochain lot
+                    conn = None
+                continue
+            with lock:
+                stats["indexed"] += len(batch) - touched
+                stats["unchanged"] += touched
+                if deltas is not None:
+                    deltas[0].update(batch_delta)
+                    deltas[1].update(batch_show)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def _writer_connection(stats: dict, lock: threading.Lock):
+    """Connexion d'un writer, ou None (erreur notée dans stats)."""
+    try:
+        return get_connection()
+    except Exception as e:
+        with lock:
+            stats["last_error"] = f"{type(e).__name__}: {e}"
+        return None
+
+
+def _put(batches: queue.Queue, item, threads: list[threading.Thread]) -> bool:
+    """batches.put() sans attente infinie : False si plus aucun writer ne vide la file."""
+    while True:
+        try:
+            batches.put(item, timeout=WRITER_POLL_S)
+            return True
+        except queue.Full:
+            if not any(t.is_alive() for t in threads):
+                return False
+
+
+def run_bulk(
+    root_dir: str = "data/sous-titres",
+    workers: int | None = None,
+    writers: int | None = None,
+    batch_size: int | None = None,
+    replace: bool = True,
+    incremental: bool = False,
+    progress: Callable[[dict], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> dict:
+    """
+    Indexe tous les .srt sous root_dir et renvoie un résumé
+    (fichiers vus, indexés, inchangés, supprimés, erreurs, durée, fichiers/s).
+    Avec incremental=True, seuls les fichiers nouveaux ou modifiés sont retraités
+    et les épisodes dont le fichier a disparu sont supprimés.
+
+    progress(stats) est appelé après chaque fichier parsé ; lever `cancel` arrête
+    proprement le passage (ce qui est déjà écrit reste cohérent, token_df compris).
+    """
+    workers = workers or INDEX_WORKERS
+    writers = writers or INDEX_WRITERS
+    batch_size = batch_size or INDEX_BATCH_SIZE
+
+    t0 = time.perf_counter()
+    stats = {
+        "files": 0, "todo": 0, "parsed": 0, "indexed": 0, "unchanged": 0, "removed": 0,
+        "errors": 0, "last_error": None, "df_tokens": 0, "cancelled": False,
+    }
+    root = pathlib.Path(root_dir)
+    if not root.exists():
+        stats["last_error"] = f"dossier introuvable: {root.resolve()}"
+        return _summary(stats, t0, workers, writers)
+
+    items = discover_files(root_dir)
+    stats["files"] = len(items)
+
+    delta: Counter = Counter()
+    delta_show: Counter = Counter()
+    manifest = load_manifest(root_dir)
+    duplicates = shadowed_members(manifest)
+    if incremental:
+        items, stats["unchanged"], missing = plan_incremental(items, manifest)
+        stats["removed"] = remove_episodes(sorted(set(missing) | set(duplicates)), delta, delta_show)
+        if not items:
+            stats["df_tokens"] = finalize_aggregates(True, delta, delta_show)
+            return _summary(stats, t0, workers, writers)
+    else:
+        stats["removed"] = remove_episodes(duplicates, delta, delta_show)   # token_df recalculé à la fin
+    stats["todo"] = len(items)
+    if progress:
+        progress(dict(stats))
+
+    lock = threading.Lock()
+    batches: queue.Queue = queue.Queue(maxsize=writers * 2)   # back-pressure sur le parsing
+    deltas = (delta, delta_show) if incremental else None
+    threads = [
+        threading.Thread(target=_writer_loop, args=(batches, stats, lock, replace, deltas), daemon=True)
+        for _ in range(writers)
+    ]
+    for t in threads:
+        t.start()
+
+    writers_lost = False
+    try:
+        batch: list[dict] = []
+        # "spawn" : les writers (threads, connexions, verrous) tournent déjà ; un fork
+        # copierait leur état au milieu d'une écriture (verrou tenu, socket partagée)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for res in _parse_all(pool, _with_archive_bytes(items), window=workers * 4, cancel=cancel):
+                with lock:
+                    stats["parsed"] += 1
+                    if "error" in res:
+                        stats["errors"] += 1
+                        stats["last_error"] = res["error"]
+                    snapshot = dict(stats)
+                if progress:
+                    progress(snapshot)
+                if "error" in res:
+                    continue
+                batch.append(res)
+                if len(batch) >= batch_size:
+                    if not _put(batches, batch, threads):
+                        writers_lost = True
+                        break
+                    batch = []
+        if batch and not writers_lost:
+            writers_lost = not _put(batches, batch, threads)
+    finally:
+        for _ in threads:
+            if not _put(batches, None, threads):
+                break
+        for t in threads:
+            t.join()
+
+    stats["cancelled"] = bool(cancel is not None and cancel.is_set())
+    # ce qui a été écrit reste cohérent (token_df compris), même si les writers sont tombés
+    stats["df_tokens"] = finalize_aggregates(incremental, delta, delta_show)
+    if writers_lost:
+        detail = f" ({stats['last_error']})" if stats["last_error"] else ""
+        raise RuntimeError(f"plus aucun writer actif, indexation interrompue{detail}")
+    return _summary(stats, t0, workers, writers)
+
+
+def _summary(stats: dict, t0: float, workers: int, writers: int) -> dict:
+    elapsed = time.perf_counter() - t0
+    return {
+        **stats,
+        "workers": workers,
+        "writers": writers,
+        "elapsed_s": round(elapsed, 2),
+        "files_per_sec": round(stats["indexed"] / elapsed, 1) if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,89 @@
+# app/services/cache.py
+"""
+Petit cache LRU + TTL thread-safe, avec compteurs (hits, misses, évictions...).
+
+Optionnellement lié à la génération de l'index : sync(generation) vide le cache dès
+que la génération change (nouvelle indexation, recalcul IDF).
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation: int | None = None
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def sync(self, generation: int) -> None:
+        """Vide le cache si la génération de l'index a changé depuis le dernier appel."""
+        if generation == self.generation:
+            return
+        with self._lock:
+            if generation != self.generation:
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+                self.generation = generation
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """generation : celle vue avant le calcul ; si elle a changé entre-temps, on ne stocke pas."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Any | None:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,125 @@
+# app/services/cues.py
+"""
+Table des blocs de sous-titres d'un épisode (table episode_cues), écrite par l'indexeur.
+
+Pour chaque bloc : numéro, timecode de début (ms), offset en octets dans la source et
+position de son premier token dans le flux de tokens de l'épisode (mêmes positions que
+token_positions). Une position de token -> bloc qui la contient : bisect sur ces
+premières positions, sans retokeniser quoi que ce soit.
+
+Le texte d'un bloc est relu directement dans la source (seek + lecture de quelques
+centaines d'octets, cf. read_cue_text) : c'est ce qui sert aux extraits de /search.
+
+Stockage compact (BYTEA) : numéros et timecodes en int32, offsets et premières positions
+(croissants) en écarts, comme les positions (cf. positions.py).
+"""
+from __future__ import annotations
+import sys
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from app.services.positions import decode_positions, encode_positions
+from app.services.sources import read_source, split_key
+from app.services.subtitles import Cue, read_cue
+
+
+def _pack_ints(values) -> bytes:
+    arr = array("i", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _unpack_ints(data: bytes | memoryview) -> array:
+    arr = array("i")
+    arr.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+class CueTable:
+    """Blocs d'un épisode ; offsets a un élément de plus (fin du dernier bloc = taille de la source)."""
+
+    def __init__(self, codec: str | None, numbers, starts_ms, offsets, token_starts):
+        self.codec = codec              # None : offsets inconnus, texte non relisible
+        self.numbers = numbers          # -1 si absent
+        self.starts_ms = starts_ms      # -1 si absent
+        self.offsets = offsets
+        self.token_starts = token_starts
+
+    @classmethod
+    def build(
+        cls, codec: str | None, spans: list[tuple[int, Cue]], cue_tokens: list[int], size: int
+    ) -> CueTable:
+        """spans = (offset, bloc) (cf. iter_cue_offsets), cue_tokens = nb de tokens de chaque bloc."""
+        numbers = array("i", (-1 if c.index is None else c.index for _, c in spans))
+        starts = array("i", (-1 if c.start_ms is None else c.start_ms for _, c in spans))
+        offsets = [o for o, _ in spans] + [size]
+        token_starts = list(accumulate(cue_tokens, initial=0))[:-1]
+        return cls(codec, numbers, starts, offsets, token_starts)
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def encode(self) -> tuple[str | None, bytes, bytes, bytes, bytes]:
+        """Colonnes (codec, numbers, starts_ms, offsets, token_starts) de episode_cues."""
+        return (
+            self.codec,
+            _pack_ints(self.numbers),
+            _pack_ints(self.starts_ms),
+            encode_positions(self.offsets),
+            encode_positions(self.token_starts),
+        )
+
+    @classmethod
+    def from_row(cls, row: dict) -> CueTable:
+        return cls(
+            row["codec"],
+            _unpack_ints(row["numbers"]),
+            _unpack_ints(row["starts_ms"]),
+            decode_positions(row["offsets"]),
+            decode_positions(row["token_starts"]),
+        )
+
+    def cue_at(self, position: int) -> int:
+        """Indice du bloc contenant la position de token."""
+        return max(bisect_right(self.token_starts, position) - 1, 0)
+
+    def start_ms(self, k: int) -> int | None:
+        ms = self.starts_ms[k]
+        return None if ms < 0 else ms
+
+    def number(self, k: int) -> int | None:
+        n = self.numbers[k]
+        return None if n < 0 else n
+
+
+def timecode(ms: int | None) -> str | None:
+    """62345 -> '00:01:02' (lien "aller à")."""
+    if ms is None:
+        return None
+    s = ms // 1000
+    return f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}"
+
+
+def read_cue_text(file_path: str, table: CueTable, k: int) -> str | None:
+    """
+    Texte du bloc k, relu dans la source : seek + lecture de ses seuls octets pour un .srt,
+    tranche du membre pour une archive. None si la source a disparu ou n'est pas relisible.
+    """
+    if table.codec is None or not 0 <= k < len(table):
+        return None
+    start, end = table.offsets[k], table.offsets[k + 1]
+    try:
+        if split_key(file_path)[1] is None:
+            with open(file_path, "rb") as f:
+                f.seek(start)
+                raw = f.read(end - start)
+        else:
+            raw = read_source(file_path)[start:end]
+    except Exception:
+        return None     # source déplacée ou supprimée, archive illisible...
+    cue = read_cue(raw, table.codec)
+    return cue.text if cue is not None else None
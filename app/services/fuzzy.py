@@ -0,0 +1,196 @@
+# app/services/fuzzy.py
+"""
+Tolérance aux fautes de frappe pour /search ("vampyre" -> "vampire", "hopitall" -> "hopital").
+
+Index "symmetric delete" construit en mémoire depuis le vocabulaire indexé (tokens + token_df) :
+chaque mot est enregistré sous toutes ses variantes obtenues en supprimant 0 à
+FUZZY_MAX_DISTANCE lettres de son préfixe (FUZZY_PREFIX lettres). Pour un mot inconnu,
+on génère ses propres suppressions et on les cherche dans l'index (bisect sur un tableau
+trié d'entiers empreinte|mot, 8 octets par entrée) : aucun parcours du vocabulaire, seuls
+quelques candidats sont vérifiés
+par une vraie distance d'édition (Damerau restreinte : insertion, suppression,
+substitution, inversion de deux lettres voisines).
+
+Correction retenue : la plus petite distance, puis le DF le plus élevé.
+L'index est reconstruit en tâche de fond quand la génération de l'index change ;
+l'ancien reste utilisé pendant ce temps.
+"""
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+
+from app.core.db import get_connection
+from app.services.index_state import GenerationalIndex, read_generation
+
+FUZZY_MAX_DISTANCE = 2   # distance max (1 seulement pour les mots courts, cf. max_distance_for)
+FUZZY_SHORT_WORD = 4     # mots de 4 lettres ou moins : distance 1
+FUZZY_MIN_LEN = 3        # mots plus courts : jamais corrigés
+FUZZY_PREFIX = 7         # seules les suppressions dans les 7 premières lettres sont indexées
+FUZZY_MIN_DF = 2         # mots proposés en correction : présents dans au moins 2 épisodes
+ID_BITS = 24             # clé = empreinte (40 bits) << 24 | rang du mot (16 M mots max)
+
+
+def max_distance_for(word: str) -> int:
+    if len(word) < FUZZY_MIN_LEN:
+        return 0
+    return 1 if len(word) <= FUZZY_SHORT_WORD else FUZZY_MAX_DISTANCE
+
+
+def _deletes_by_level(word: str, max_distance: int) -> list[set[str]]:
+    """[{mot}, variantes à 1 lettre supprimée, à 2 lettres...] (sans doublons entre niveaux)."""
+    levels = [{word}]
+    seen = {word}
+    for _ in range(max_distance):
+        nxt = {w[:i] + w[i + 1:] for w in levels[-1] if len(w) > 1 for i in range(len(w))} - seen
+        seen |= nxt
+        levels.append(nxt)
+    return levels
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Distance de Damerau restreinte (OSA) ; max_distance + 1 dès qu'elle est dépassée."""
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if abs(la - lb) > max_distance:
+        return max_distance + 1
+    before: list[int] = []
+    prev = list(range(lb + 1))
+    for i in range(1, la + 1):
+        ca = a[i - 1]
+        cur = [i] + [0] * lb
+        row_min = i
+        for j in range(1, lb + 1):
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, before[j - 2] + 1)
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > max_distance:
+            return max_distance + 1
+        before, prev = prev, cur
+    return min(prev[lb], max_distance + 1)
+
+
+def _key(text: str) -> int:
+    """Empreinte sur 40 bits, décalée de ID_BITS (tient dans un int64 signé)."""
+    return (hash(text) >> ID_BITS) << ID_BITS
+
+
+class FuzzyIndex:
+    def __init__(self, generation: int, vocab: list[tuple[str, int]]):
+        """vocab = (mot, df) de tous les mots indexés."""
+        self.generation = generation
+        self.known = {w for w, _ in vocab}
+        entries = [(w, df) for w, df in vocab if df >= FUZZY_MIN_DF]
+        self.words = [w for w, _ in entries]
+        self.df = array("i", (df for _, df in entries))
+
+        self.keys = array("q", sorted(
+            _key(d) | i
+            for i, w in enumerate(self.words)
+            for level in _deletes_by_level(w[:FUZZY_PREFIX], FUZZY_MAX_DISTANCE)
+            for d in level
+        ))
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "known_words": len(self.known),
+            "indexed_words": len(self.words),
+            "delete_keys": len(self.keys),
+        }
+
+    def candidates(self, word: str, max_distance: int | None = None) -> list[tuple[str, int, int]]:
+        """
+        Mots indexés les plus proches (à distance <= max_distance) : (mot, distance, df),
+        les plus fréquents d'abord. Les suppressions du mot sont parcourues par niveau :
+        après le niveau k, tout mot à distance <= k a été vu, on s'arrête si on en tient un.
+        """
+        if max_distance is None:
+            max_distance = max_distance_for(word)
+        if max_distance <= 0:
+            return []
+        keys, words, n = self.keys, self.words, len(self.keys)
+        mask = (1 << ID_BITS) - 1
+        best = max_distance
+        found: list[tuple[str, int, int]] = []
+        seen: set[int] = set()
+        for level, deletes in enumerate(_deletes_by_level(word[:FUZZY_PREFIX], max_distance)):
+            if found and best < level:
+                break
+            for d in deletes:
+                h = _key(d)
+                k = bisect_left(keys, h)
+                while k < n and keys[k] & ~mask == h:
+                    wid = keys[k] & mask
+                    k += 1
+                    if wid in seen:
+                        continue
+                    seen.add(wid)
+                    dist = edit_distance(word, words[wid], best)
+                    if dist < best or (dist == best and not found):
+                        best, found = dist, []
+                    if dist == best:
+                        found.append((words[wid], dist, self.df[wid]))
+        found.sort(key=lambda c: (-c[2], c[0]))
+        return found
+
+    def correct(self, word: str) -> str | None:
+        """Correction d'un mot inconnu (plus proche puis plus fréquent), None sinon."""
+        if word in self.known:
+            return None
+        found = self.candidates(word)
+        return found[0][0] if found else None
+
+
+def build_index() -> FuzzyIndex:
+    with get_connection() as conn, conn.cursor() as cur:
+        gen = read_generation(cur)
+        cur.execute(
+            """
+            SELECT k.text, d.df
+            FROM token_df d
+            JOIN tokens k ON k.id = d.token_id
+            WHERE d.df > 0;
+            """
+        )
+        vocab = [(r["text"], r["df"]) for r in cur.fetchall()]
+    conn.close()
+    return FuzzyIndex(gen, vocab)
+
+
+# ---------- Index courant (un par process) ----------
+
+_index = GenerationalIndex("fuzzy-index", build_index)
+
+
+def get_index() -> FuzzyIndex | None:
+    """Index courant (une génération de retard possible) ; None tant que le premier n'est pas prêt."""
+    return _index.get()
+
+
+def correct_tokens(tokens: list[str]) -> tuple[list[str], dict[str, str]]:
+    """Remplace les mots inconnus par leur correction ; renvoie (tokens, {faute: correction})."""
+    idx = get_index()
+    if idx is None:
+        return tokens, {}
+    corrections = {}
+    for t in dict.fromkeys(tokens):
+        fixed = idx.correct(t)
+        if fixed is not None:
+            corrections[t] = fixed
+    if not corrections:
+        return tokens, {}
+    return [corrections.get(t, t) for t in tokens], corrections
+
+
+def start() -> None:
+    """Au démarrage de l'API : construction de l'index en tâche de fond."""
+    _index.refresh_async()
+
+
+def status() -> dict:
+    return _index.status()
@@ -0,0 +1,124 @@
+# app/services/idf.py
+"""
+Maintenance de la table token_df (DF + IDF) utilisée par /search et /user/recommend.
+
+idf = ln(N / df), N = nombre d'épisodes indexés au dernier recalcul complet
+(index_state.idf_total).
+- après un chargement en masse : recompute_df() (ensembliste, une seule requête)
+- à l'unité (index_srt, suppression) : apply_df_delta() + refresh_idf(cur, tokens)
+  -> aucun parcours complet de unigram_counts, IDF recalculé pour les seuls tokens
+  touchés avec le N de référence ; tous les IDF ne sont recalculés (N courant) que
+  quand N s'en écarte de plus de IDF_MAX_DRIFT
+Le TF-IDF par série n'est pas stocké : freq * idf, calculé à la lecture.
+"""
+from __future__ import annotations
+from collections import Counter
+from io import StringIO
+
+IDF_MAX_DRIFT = 0.01   # écart relatif toléré entre N courant et N de référence
+
+
+def recompute_df(cur) -> int:
+    """Recalcule DF et IDF de tous les tokens depuis unigram_counts. Renvoie le nb de tokens."""
+    cur.execute(
+        """
+        TRUNCATE token_df;
+        INSERT INTO token_df (token_id, df, idf)
+        SELECT u.token_id,
+               COUNT(*) AS df,
+               LN(n.total::float8 / COUNT(*)) AS idf
+        FROM unigram_counts u
+        CROSS JOIN (SELECT COUNT(*) AS total FROM episodes) n
+        GROUP BY u.token_id, n.total;
+        """
+    )
+    n = cur.rowcount
+    cur.execute("UPDATE index_state SET idf_total = (SELECT COUNT(*) FROM episodes) WHERE id = 1;")
+    return n
+
+
+def apply_df_delta(cur, delta: Counter) -> list[int]:
+    """
+    Ajoute des variations de DF (id de token -> +k / -k) en une passe ensembliste.
+    Les tokens dont le DF tombe à 0 sont supprimés. Renvoie les tokens touchés.
+    """
+    touched = [tok for tok, d in delta.items() if d]
+    if not touched:
+        return []
+
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS stage_df (token_id INT, delta INT) ON COMMIT DELETE ROWS;
+        """
+    )
+    buf = StringIO()
+    for tok in touched:
+        buf.write(f"{tok}\t{delta[tok]}\n")
+    buf.seek(0)
+    cur.copy_from(buf, "stage_df", columns=("token_id", "delta"))
+    cur.execute(
+        """
+        INSERT INTO token_df (token_id, df, idf)
+        SELECT token_id, SUM(delta), 0.0 FROM stage_df GROUP BY token_id
+        ON CONFLICT (token_id)
+        DO UPDATE SET df = token_df.df + EXCLUDED.df;
+
+        DELETE FROM token_df
+        WHERE df <= 0 AND token_id IN (SELECT token_id FROM stage_df);
+
+        TRUNCATE stage_df;
+        """
+    )
+    return touched
+
+
+def refresh_idf(cur, tokens: list[int] | None = None) -> None:
+    """
+    Recalcule idf = ln(N/df) à partir de token_df seul.
+    tokens=None : tous les tokens, avec le N courant (qui devient le N de référence) ;
+    sinon seulement les id indiqués, avec le N de référence, sauf si N a trop dérivé
+    (> IDF_MAX_DRIFT) : recalcul complet.
+    """
+    if tokens is not None:
+        if not tokens:
+            return
+        cur.execute(
+            """
+            SELECT s.idf_total, n.total
+            FROM index_state s, (SELECT COUNT(*) AS total FROM episodes) n
+            WHERE s.id = 1;
+            """
+        )
+        row = cur.fetchone()
+        ref = row["idf_total"] if row else None
+        if ref and abs(row["total"] - ref) <= ref * IDF_MAX_DRIFT:
+            cur.execute(
+                """
+                UPDATE token_df
+                SET idf = GREATEST(LN(%s::float8 / df), 0.0)   -- df peut dépasser le N de référence
+                WHERE token_id = ANY(%s);
+                """,
+                (ref, tokens),
+            )
+            return
+
+    cur.execute(
+        """
+        UPDATE token_df t
+        SET idf = LN(n.total::float8 / t.df)
+        FROM (SELECT COUNT(*) AS total FROM episodes) n
+        WHERE n.total > 0;
+
+        UPDATE index_state SET idf_total = (SELECT COUNT(*) FROM episodes) WHERE id = 1;
+        """
+    )
+
+
+def df_delta(old_tokens: set[int], new_tokens: set[int]) -> Counter:
+    """Variation de DF quand un épisode passe de old_tokens à new_tokens."""
+    delta: Counter = Counter()
+    for tok in new_tokens - old_tokens:
+        delta[tok] += 1
+    for tok in old_tokens - new_tokens:
+        delta[tok] -= 1
+    return delta
@@ -0,0 +1,125 @@
+# app/services/index_state.py
+"""
+Génération de l'index : compteur (table index_state) incrémenté à chaque écriture
+qui change les résultats de recherche (index_srt, suppression, passage en masse,
+recalcul IDF), dans la même transaction que l'écriture.
+
+Les caches et le moteur en mémoire comparent leur génération à current_generation(),
+relue en base au plus une fois par GENERATION_TTL_S. GenerationalIndex : structures
+dérivées (correction orthographique, autocomplétion) reconstruites en tâche de fond.
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Callable
+
+from app.core.db import pooled_connection
+
+GENERATION_TTL_S = 1.0   # retard max avant de voir une nouvelle génération
+
+_cached: tuple[float, int] | None = None   # (instant de lecture, génération)
+_lock = threading.Lock()
+
+
+def bump_generation(cur) -> int:
+    """Nouvelle génération (visible des lecteurs au commit de la transaction en cours)."""
+    global _cached
+    cur.execute(
+        """
+        UPDATE index_state
+        SET generation = generation + 1, updated_at = NOW()
+        WHERE id = 1
+        RETURNING generation;
+        """
+    )
+    row = cur.fetchone()
+    _cached = None
+    return row["generation"] if row else 0
+
+
+def read_generation(cur) -> int:
+    cur.execute("SELECT generation FROM index_state WHERE id = 1;")
+    row = cur.fetchone()
+    return row["generation"] if row else 0
+
+
+def current_generation() -> int:
+    """Génération courante (lecture en base mise en cache GENERATION_TTL_S secondes)."""
+    global _cached
+    now = time.monotonic()
+    cached = _cached
+    if cached is not None and now - cached[0] < GENERATION_TTL_S:
+        return cached[1]
+    with _lock:
+        cached = _cached
+        if cached is not None and now - cached[0] < GENERATION_TTL_S:
+            return cached[1]
+        with pooled_connection() as conn, conn.cursor() as cur:
+            gen = read_generation(cur)
+        _cached = (time.monotonic(), gen)
+        return gen
+
+
+class GenerationalIndex:
+    """
+    Structure en mémoire dérivée de l'index (vocabulaire...), reconstruite en tâche de fond
+    quand la génération change ; l'ancienne version reste servie pendant la reconstruction.
+    `build()` renvoie un objet qui expose `generation` et `stats`.
+    `stale(courante)` remplace le test de génération pour une structure qui ne dépend pas
+    de l'index (son objet n'a alors pas besoin de `generation`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        build: Callable[[], Any],
+        retry_after_s: float = 30.0,
+        stale: Callable[[Any], bool] | None = None,
+    ):
+        self.name = name
+        self.build = build
+        self.stale = stale or (lambda cur: cur.generation < current_generation())
+        self.retry_after_s = retry_after_s   # délai avant une nouvelle tentative après un échec
+        self.current: Any | None = None
+        self._lock = threading.Lock()
+        self.state = {"building": False, "loaded_at": None, "load_s": None, "last_error": None, "failed_at": None}
+
+    def get(self) -> Any | None:
+        """Version courante (éventuellement d'une génération précédente) ; None avant la première."""
+        cur = self.current
+        try:
+            stale = cur is None or self.stale(cur)
+        except Exception:
+            return cur
+        if stale:
+            self.refresh_async()
+        return cur
+
+    def refresh_async(self, force: bool = False) -> bool:
+        """Lance une reconstruction en tâche de fond ; False si une reconstruction est déjà en cours."""
+        with self._lock:
+            if self.state["building"]:
+                return False
+            failed_at = self.state["failed_at"]
+            if not force and failed_at is not None and time.time() - failed_at < self.retry_after_s:
+                return False
+            self.state["building"] = True
+        threading.Thread(target=self._refresh, daemon=True, name=self.name).start()
+        return True
+
+    def _refresh(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            self.current = self.build()
+            self.state.update(
+                loaded_at=time.time(), load_s=round(time.perf_counter() - t0, 3),
+                last_error=None, failed_at=None,
+            )
+        except Exception as e:
+            self.state.update(last_error=f"{type(e).__name__}: {e}", failed_at=time.time())
+        finally:
+            self.state["building"] = False
+
+    def status(self) -> dict:
+        cur = self.current
+        return {**self.state, "index": cur.stats if cur is not None else None}
@@ -1,77 +1,332 @@
 # app/services/indexer.py
 from __future__ import annotations
+import hashlib
 from collections import Counter
+from io import StringIO
 from pathlib import Path
 
+import psycopg2
+
 from app.core.db import get_connection
-from app.services.subtitles import srt_to_lines
+from app.services.cues import CueTable
+from app.services.subtitles import iter_cue_offsets
 from app.services.normalize import normalize_lines, tokens_flatten, bigrams
+from app.services.index_state import bump_generation
+from app.services.positions import copy_bytea, encode_positions, token_positions
+from app.services.idf import apply_df_delta, df_delta, refresh_idf
+from app.services.show_tokens import apply_show_delta, show_delta
+from app.services.sources import read_source, split_key, stat_source
+from app.services.tokens import counts_to_ids
+
 
-def index_srt(file_path: str, show_name: str | None = None, season: int | None = None, episode: int | None = None) -> dict:
+def count_tokens(lines: list[str]) -> tuple[Counter, Counter, dict[str, bytes]]:
     """
-    Lit un .srt, normalise, compte les tokens (unigrams) ET bigrams, puis écrit dans la BDD.
-    Tables utilisées : episodes, unigram_counts, bigram_counts (ton schéma).
+    Normalise les lignes et compte unigrams + bigrams (sans toucher à la BDD).
+    Renvoie aussi les positions de chaque token, encodées (cf. positions.py).
     """
-    path = Path(file_path)
+    return _count_normalized(normalize_lines(lines))
 
-    # 1) extraction + normalisation
-    lines = srt_to_lines(str(path))
-    toks_per_line = normalize_lines(lines)
+
+def _count_normalized(toks_per_line: list[list[str]]) -> tuple[Counter, Counter, dict[str, bytes]]:
     toks_all = tokens_flatten(toks_per_line)
-    bigs_all = bigrams(toks_all)
+    positions = {tok: encode_positions(pos) for tok, pos in token_positions(toks_all).items()}
+    return Counter(toks_all), Counter(bigrams(toks_all)), positions
+
+
+def parse_source(data: bytes) -> tuple[int, Counter, Counter, dict[str, bytes], CueTable]:
+    """
+    Contenu brut d'un .srt -> (nb de lignes, unigrams, bigrams, positions, table des blocs).
+    Un seul parsing : les blocs (avec leur offset dans la source) donnent les lignes,
+    et le nb de tokens de chaque bloc situe les positions dans les blocs (cf. cues.py).
+    """
+    codec, spans = iter_cue_offsets(data)
+    spans = list(spans)
+    lines: list[str] = []
+    for _, cue in spans:
+        lines.extend(cue.lines)
+    toks_per_line = normalize_lines(lines)
+
+    cue_tokens = []
+    i = 0
+    for _, cue in spans:
+        j = i + len(cue.lines)
+        cue_tokens.append(sum(len(toks) for toks in toks_per_line[i:j]))
+        i = j
+    cues = CueTable.build(codec, spans, cue_tokens, len(data))
+    return (len(lines), *_count_normalized(toks_per_line), cues)
+
+
+def _copy_rows(cur, table: str, columns: tuple[str, ...], rows) -> None:
+    """
+    Envoie des lignes via COPY (un seul aller-retour pour tout l'épisode).
+    Que des entiers (id d'épisode, id de tokens, fréquences) ou des BYTEA déjà échappés
+    (copy_bytea) : pas d'autre échappement nécessaire.
+    """
+    buf = StringIO()
+    for row in rows:
+        buf.write("\t".join(str(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_from(buf, table, columns=columns)
+
+
+def content_hash(data: bytes) -> str:
+    """Empreinte du contenu d'un fichier (sert à détecter les vraies modifications)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_manifest(file_path: str, data: bytes | None = None) -> dict:
+    """Taille, mtime et hash d'une source (.srt ou archive!membre), tels que stockés dans `episodes`."""
+    size, mtime = stat_source(file_path)
+    if data is None:
+        data = read_source(file_path)
+    return {"file_size": size, "file_mtime": mtime, "content_hash": content_hash(data)}
+
+
+def upsert_episode(
+    cur,
+    file_path: str,
+    show_name: str | None,
+    season: int | None,
+    episode: int | None,
+    manifest: dict | None = None,
+) -> tuple[int, bool, str | None]:
+    """
+    Crée (ou met à jour) la ligne `episodes` (+ manifeste si fourni).
+    Renvoie (id, True si l'épisode vient d'être créé, ancien show_name).
+    """
+    manifest = manifest or {}
+    cur.execute(
+        """
+        WITH old AS (SELECT show_name FROM episodes WHERE file_path = %s)
+        INSERT INTO episodes (show_name, season, episode, file_path,
+                              file_size, file_mtime, content_hash, indexed_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (file_path)
+        DO UPDATE SET show_name    = EXCLUDED.show_name,
+                      season       = EXCLUDED.season,
+                      episode      = EXCLUDED.episode,
+                      file_size    = EXCLUDED.file_size,
+                      file_mtime   = EXCLUDED.file_mtime,
+                      content_hash = EXCLUDED.content_hash,
+                      indexed_at   = EXCLUDED.indexed_at
+        RETURNING id, (xmax = 0) AS inserted, (SELECT show_name FROM old) AS old_show;
+        """,
+        (
+            file_path,
+            show_name, season, episode, file_path,
+            manifest.get("file_size"), manifest.get("file_mtime"), manifest.get("content_hash"),
+        ),
+    )
+    row = cur.fetchone()
+    if hasattr(row, "keys"):
+        return row["id"], row["inserted"], row["old_show"]
+    return row[0], row[1], row[2]
+
+
+def _fetch_counts(cur) -> Counter:
+    rows = cur.fetchall()
+    if rows and hasattr(rows[0], "keys"):
+        return Counter({r["token_id"]: r["freq"] for r in rows})
+    return Counter({r[0]: r[1] for r in rows})
+
+
+def write_counts(
+    cur,
+    episode_id: int,
+    c_uni: Counter,
+    c_bi: Counter,
+    replace: bool = True,
+    positions: dict[int, bytes] | None = None,
+) -> Counter:
+    """
+    Écrit les compteurs d'un épisode (clés = id de tokens, cf. counts_to_ids) en quelques
+    requêtes ensemblistes, ainsi que les positions des tokens si fournies.
+    Renvoie les unigrams présents AVANT l'écriture (pour mettre à jour DF et agrégats par série).
+
+    - replace=True  : supprime les anciens tokens de l'épisode puis COPY direct
+                      (les tokens disparus d'une ancienne indexation sont ainsi retirés)
+    - replace=False : COPY dans une table temporaire puis fusion ON CONFLICT
+                      (les anciens tokens absents du fichier sont conservés)
+    """
+    uni_rows = ((episode_id, tok, freq) for tok, freq in c_uni.items())
+    bi_rows = ((episode_id, t1, t2, freq) for (t1, t2), freq in c_bi.items())
+    pos_rows = ((episode_id, tok, copy_bytea(data)) for tok, data in (positions or {}).items())
+
+    if replace:
+        cur.execute("DELETE FROM unigram_counts WHERE episode_id = %s RETURNING token_id, freq;", (episode_id,))
+        old_counts = _fetch_counts(cur)
+        cur.execute("DELETE FROM bigram_counts WHERE episode_id = %s;", (episode_id,))
+        cur.execute("DELETE FROM token_positions WHERE episode_id = %s;", (episode_id,))
+        _copy_rows(cur, "unigram_counts", ("episode_id", "token_id", "freq"), uni_rows)
+        _copy_rows(cur, "bigram_counts", ("episode_id", "token1_id", "token2_id", "freq"), bi_rows)
+        _copy_rows(cur, "token_positions", ("episode_id", "token_id", "positions"), pos_rows)
+        return old_counts
+
+    cur.execute("SELECT token_id, freq FROM unigram_counts WHERE episode_id = %s;", (episode_id,))
+    old_counts = _fetch_counts(cur)
+
+    # Tables de transit (vidées automatiquement à la fin de la transaction)
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS stage_unigrams
+          (LIKE unigram_counts INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+        CREATE TEMP TABLE IF NOT EXISTS stage_bigrams
+          (LIKE bigram_counts INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+        CREATE TEMP TABLE IF NOT EXISTS stage_positions
+          (LIKE token_positions INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+        """
+    )
+    _copy_rows(cur, "stage_unigrams", ("episode_id", "token_id", "freq"), uni_rows)
+    _copy_rows(cur, "stage_bigrams", ("episode_id", "token1_id", "token2_id", "freq"), bi_rows)
+    _copy_rows(cur, "stage_positions", ("episode_id", "token_id", "positions"), pos_rows)
+    cur.execute(
+        """
+        INSERT INTO unigram_counts (episode_id, token_id, freq)
+        SELECT episode_id, token_id, freq FROM stage_unigrams
+        ON CONFLICT (episode_id, token_id)
+        DO UPDATE SET freq = EXCLUDED.freq;
+
+        INSERT INTO bigram_counts (episode_id, token1_id, token2_id, freq)
+        SELECT episode_id, token1_id, token2_id, freq FROM stage_bigrams
+        ON CONFLICT (episode_id, token1_id, token2_id)
+        DO UPDATE SET freq = EXCLUDED.freq;
+
+        -- positions : celles du nouveau fichier remplacent les anciennes pour ses tokens
+        INSERT INTO token_positions (episode_id, token_id, positions)
+        SELECT episode_id, token_id, positions FROM stage_positions
+        ON CONFLICT (episode_id, token_id)
+        DO UPDATE SET positions = EXCLUDED.positions;
+
+        TRUNCATE stage_unigrams, stage_bigrams, stage_positions;
+        """
+    )
+    return old_counts
+
+
+def write_cues(cur, episode_id: int, cues: CueTable) -> None:
+    """Table des blocs de l'épisode (remplace la précédente : elle décrit le fichier actuel)."""
+    codec, *arrays = cues.encode()
+    cur.execute(
+        """
+        INSERT INTO episode_cues (episode_id, codec, numbers, starts_ms, offsets, token_starts)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (episode_id)
+        DO UPDATE SET codec        = EXCLUDED.codec,
+                      numbers      = EXCLUDED.numbers,
+                      starts_ms    = EXCLUDED.starts_ms,
+                      offsets      = EXCLUDED.offsets,
+                      token_starts = EXCLUDED.token_starts;
+        """,
+        (episode_id, codec, *map(psycopg2.Binary, arrays)),
+    )
+
+
+def merged_counts(old_counts: Counter, c_uni: Counter, replace: bool) -> Counter:
+    """Unigrams de l'épisode APRÈS write_counts (remplacement ou fusion)."""
+    if replace:
+        return c_uni
+    merged = Counter(old_counts)
+    merged.update({tok: f - old_counts.get(tok, 0) for tok, f in c_uni.items()})
+    return merged
+
+
+def delete_episodes(cur, episode_ids: list[int]) -> tuple[Counter, Counter]:
+    """
+    Supprime des épisodes (compteurs compris) et renvoie les variations correspondantes
+    (valeurs négatives) : DF par token, fréquence par (série, token), clés = id de tokens.
+    Calculées sur les seules lignes supprimées.
+    """
+    delta: Counter = Counter()
+    delta_show: Counter = Counter()
+    if not episode_ids:
+        return delta, delta_show
+    cur.execute(
+        """
+        WITH gone AS (
+          DELETE FROM unigram_counts u
+          USING episodes e
+          WHERE e.id = u.episode_id AND u.episode_id = ANY(%s)
+          RETURNING e.show_name, u.token_id, u.freq
+        )
+        SELECT show_name, token_id, COUNT(*) AS n, SUM(freq) AS f
+        FROM gone
+        GROUP BY show_name, token_id;
+        """,
+        (episode_ids,),
+    )
+    for r in cur.fetchall():
+        delta[r["token_id"]] -= r["n"]
+        if r["show_name"] is not None:
+            delta_show[(r["show_name"], r["token_id"])] -= r["f"]
+    cur.execute("DELETE FROM episodes WHERE id = ANY(%s);", (episode_ids,))
+    return delta, delta_show
 
-    c_uni = Counter(toks_all)
-    c_bi  = Counter(bigs_all)
 
-    # 2) upsert épisode
+def index_srt(
+    file_path: str,
+    show_name: str | None = None,
+    season: int | None = None,
+    episode: int | None = None,
+    replace: bool = True,
+) -> dict:
+    """
+    Lit un .srt, normalise, compte les tokens (unigrams) ET bigrams, puis écrit dans la BDD.
+    Tables utilisées : episodes, unigram_counts, bigram_counts, token_positions,
+    episode_cues (tokens stockés par id, cf. tokens).
+    file_path peut désigner un membre d'archive : "chemin/archive.zip!membre.srt".
+    Avec replace=True (défaut), les tokens d'une indexation précédente du même fichier
+    sont remplacés (et non fusionnés).
+    token_df est mis à jour par différence (DF +1/-1 sur les tokens apparus/disparus),
+    show_token_counts aussi (fréquences de l'épisode retirées/ajoutées à sa série).
+    """
+    key = file_path if split_key(file_path)[1] else str(Path(file_path))
+
+    # 1) extraction + normalisation (source lue une seule fois : hash + parsing)
+    data = read_source(key)
+    n_lines, c_uni, c_bi, positions, cues = parse_source(data)
+    c_uni, c_bi, positions = counts_to_ids(c_uni, c_bi, positions)
+
+    manifest = file_manifest(key, data)
+
+    # 2) upsert épisode + 3) écriture ensembliste des compteurs
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO episodes (show_name, season, episode, file_path)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (file_path)
-                DO UPDATE SET show_name = EXCLUDED.show_name,
-                              season    = EXCLUDED.season,
-                              episode   = EXCLUDED.episode
-                RETURNING id;
-                """,
-                (show_name, season, episode, str(path)),
-            )
-            row = cur.fetchone()
-            episode_id = row["id"] if hasattr(row, "keys") else row[0]
-
-            # 3) upsert UNIGRAMS
-            for token, freq in c_uni.items():
-                cur.execute(
-                    """
-                    INSERT INTO unigram_counts (episode_id, token, freq)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (episode_id, token)
-                    DO UPDATE SET freq = EXCLUDED.freq;
-                    """,
-                    (episode_id, token, freq),
-                )
-
-            # 4) upsert BIGRAMS
-            for (t1, t2), freq in c_bi.items():
-                cur.execute(
-                    """
-                    INSERT INTO bigram_counts (episode_id, token1, token2, freq)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (episode_id, token1, token2)
-                    DO UPDATE SET freq = EXCLUDED.freq;
-                    """,
-                    (episode_id, t1, t2, freq),
-                )
+            episode_id, _, old_show = upsert_episode(cur, key, show_name, season, episode, manifest)
+            old_counts = write_counts(cur, episode_id, c_uni, c_bi, replace=replace, positions=positions)
+            write_cues(cur, episode_id, cues)
+            new_counts = merged_counts(old_counts, c_uni, replace)
 
+            # 4) DF / IDF incrémental (tokens touchés ; tous si N a trop dérivé, cf. idf.py)
+            touched = apply_df_delta(cur, df_delta(set(old_counts), set(new_counts)))
+            refresh_idf(cur, touched)
+
+            # 5) agrégat par série
+            apply_show_delta(cur, show_delta(old_show, old_counts, show_name, new_counts))
+            bump_generation(cur)
         conn.commit()
 
     return {
         "episode_id": episode_id,
-        "file": str(path),
-        "lines": len(lines),
+        "file": key,
+        "lines": n_lines,
         "tokens_total": sum(c_uni.values()),
         "unigrams_unique": len(c_uni),
         "bigrams_unique": len(c_bi),
     }
+
+
+def delete_episode(file_path: str) -> dict:
+    """Supprime un épisode indexé (par chemin) et ajuste token_df / show_token_counts."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM episodes WHERE file_path = %s;", (file_path,))
+            row = cur.fetchone()
+            if row is None:
+                return {"file": file_path, "deleted": False}
+            delta, delta_show = delete_episodes(cur, [row["id"]])
+            refresh_idf(cur, apply_df_delta(cur, delta))
+            apply_show_delta(cur, delta_show)
+            bump_generation(cur)
+        conn.commit()
+    return {"file": file_path, "deleted": True, "episode_id": row["id"]}
@@ -0,0 +1,224 @@
+# app/services/item_cf.py
+"""
+Filtrage collaboratif item-item pour /user/recommend : deux séries se ressemblent si
+les mêmes utilisateurs les notent de la même façon.
+
+Notes centrées sur la note neutre (5 -> +2, 3 -> 0, 1 -> -2). Similarité = cosinus des
+vecteurs de notes de deux séries (sur les utilisateurs qui ont noté les deux), réduite
+quand peu d'utilisateurs ont noté les deux (cnt / (cnt + CF_SHRINK)).
+
+Modèle en mémoire : produits scalaires et normes par paire de séries, construits une fois
+depuis user_ratings en tâche de fond au démarrage, puis mis à jour à chaque /user/rate sur
+les seules paires (série notée, autres séries de l'utilisateur), sans reconstruction.
+Indépendant de la génération de l'index (les sous-titres n'y jouent aucun rôle). Notes
+écrites par un autre worker : reconstruction au plus toutes les CF_RESYNC_S secondes, et
+seulement si user_ratings a changé depuis (nb de lignes, dernière mise à jour). Voisins
+(top CF_NEIGHBORS) recalculés à la demande pour les seules séries touchées.
+
+Service : pour chaque série notée par l'utilisateur, ses voisins pondérés par sa note
+centrée ; lecture en mémoire, aucune requête.
+"""
+from __future__ import annotations
+import math
+import threading
+import time
+from collections import deque
+
+from app.core.db import get_connection, pooled_connection
+from app.services.index_state import GenerationalIndex
+
+CF_NEUTRAL = 3        # note neutre (ni aimée ni détestée)
+CF_SHRINK = 5.0       # similarité x cnt / (cnt + CF_SHRINK), cnt = utilisateurs communs
+CF_NEIGHBORS = 20     # voisins conservés par série
+CF_REPLAY_S = 60.0    # notes rejouées sur un modèle fraîchement construit (cf. build_model)
+CF_RESYNC_S = 600.0   # intervalle min entre deux vérifications de user_ratings (autres workers)
+
+
+class ItemCF:
+    def __init__(self, stamp: tuple | None = None):
+        self.stamp = stamp                     # (nb de lignes, MAX(updated_at)) de user_ratings lu
+        self.checked_at = time.monotonic()     # dernière comparaison de stamp avec la base
+        self.ratings: dict[str, dict[str, int]] = {}       # user -> série -> note centrée
+        self.dot: dict[str, dict[str, float]] = {}         # série -> série -> somme des produits
+        self.cnt: dict[str, dict[str, int]] = {}           # série -> série -> utilisateurs communs
+        self.sq: dict[str, float] = {}                     # série -> somme des carrés
+        self._neighbors: dict[str, list[tuple[str, float]]] = {}
+        self._dirty: set[str] = set()
+        self.updates = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "users": len(self.ratings),
+            "shows": len(self.sq),
+            "pairs": sum(len(d) for d in self.cnt.values()) // 2,
+            "updates": self.updates,
+        }
+
+    def set_rating(self, user_id: str, show: str, rating: int) -> None:
+        """Note (absolue) d'un utilisateur : ne met à jour que les paires de cette série."""
+        with self._lock:
+            self._set(user_id, show, rating - CF_NEUTRAL)
+            self.updates += 1
+
+    def _set(self, user_id: str, show: str, v: int) -> None:
+        mine = self.ratings.setdefault(user_id, {})
+        old = mine.get(show)
+        if old == v:
+            return
+        dv = v - (old or 0)
+        dot_i = self.dot.setdefault(show, {})
+        cnt_i = self.cnt.setdefault(show, {})
+        for other, w in mine.items():
+            if other == show:
+                continue
+            d = dot_i.get(other, 0.0) + dv * w
+            dot_i[other] = self.dot[other][show] = d
+            if old is None:
+                cnt_i[other] = self.cnt[other][show] = cnt_i.get(other, 0) + 1
+        self.sq[show] = self.sq.get(show, 0.0) + v * v - (old or 0) ** 2
+        mine[show] = v
+        # la norme de `show` a changé : ses voisins et ceux de toutes les séries liées aussi
+        self._dirty.add(show)
+        self._dirty.update(dot_i)
+
+    def similarity(self, a: str, b: str) -> float:
+        d = self.dot.get(a, {}).get(b, 0.0)
+        norm = math.sqrt(self.sq.get(a, 0.0) * self.sq.get(b, 0.0))
+        if not d or not norm:
+            return 0.0
+        n = self.cnt[a][b]
+        return d / norm * n / (n + CF_SHRINK)
+
+    def neighbors(self, show: str) -> list[tuple[str, float]]:
+        """Séries les plus similaires (similarité > 0), les CF_NEIGHBORS premières."""
+        with self._lock:
+            if show in self._dirty or show not in self._neighbors:
+                sims = ((other, self.similarity(show, other)) for other in self.dot.get(show, ()))
+                self._neighbors[show] = sorted(
+                    ((o, s) for o, s in sims if s > 0), key=lambda x: (-x[1], x[0])
+                )[:CF_NEIGHBORS]
+                self._dirty.discard(show)
+            return self._neighbors[show]
+
+    def recommend(self, user_id: str, limit: int) -> dict[str, float]:
+        """
+        {série: score} des séries non notées par l'utilisateur, score = moyenne des similarités
+        avec ses séries notées pondérées par leurs notes centrées (dans [-1, 1]), > 0 seulement.
+        """
+        mine = dict(self.ratings.get(user_id, {}))
+        total = sum(abs(v) for v in mine.values())
+        if not total:
+            return {}
+        scores: dict[str, float] = {}
+        for show, v in mine.items():
+            if not v:
+                continue
+            for other, sim in self.neighbors(show):
+                if other not in mine:
+                    scores[other] = scores.get(other, 0.0) + v * sim
+        best = sorted(((s / total, name) for name, s in scores.items() if s > 0), key=lambda x: (-x[0], x[1]))
+        return {name: s for s, name in best[:limit]}
+
+
+def blend(content: list[dict], cf: dict[str, float], cf_weight: float, exclude: set[str], limit: int) -> list[dict]:
+    """
+    Score final = (1 - cf_weight) x TF-IDF + cf_weight x collaboratif, chacun ramené à [0, 1]
+    par son maximum ; une série absente d'un des deux classements y compte pour 0.
+    """
+    c_scores = {r["show_name"]: r["score"] for r in content}
+    c_max = max(c_scores.values(), default=0.0) or 1.0
+    f_max = max(cf.values(), default=0.0) or 1.0
+    rows = [
+        {
+            "show_name": name,
+            "score": (1 - cf_weight) * c_scores.get(name, 0.0) / c_max + cf_weight * cf.get(name, 0.0) / f_max,
+            "content": c_scores.get(name, 0.0),
+            "cf": cf.get(name, 0.0),
+        }
+        for name in c_scores.keys() | cf.keys()
+        if name not in exclude
+    ]
+    rows.sort(key=lambda r: (-r["score"], r["show_name"]))
+    return rows[:limit]
+
+
+def model_from_rows(rows, stamp: tuple | None = None) -> ItemCF:
+    """Modèle complet depuis des lignes {user_id, show_name, rating} de user_ratings."""
+    model = ItemCF(stamp)
+    for r in rows:
+        model._set(r["user_id"], r["show_name"], r["rating"] - CF_NEUTRAL)
+    return model
+
+
+# ---------- Modèle courant (un par process) ----------
+
+_log: deque = deque(maxlen=100_000)   # (instant, user, série, note) des dernières notes
+_log_lock = threading.Lock()
+_fresh: ItemCF | None = None          # modèle en cours d'installation (cf. build_model)
+
+
+def _read_stamp(cur) -> tuple:
+    """État de user_ratings : (nb de lignes, dernière mise à jour) ; change à chaque écriture."""
+    cur.execute("SELECT COUNT(*) AS n, MAX(updated_at) AS last FROM user_ratings;")
+    row = cur.fetchone()
+    return row["n"], row["last"]
+
+
+def build_model() -> ItemCF:
+    """
+    Modèle complet depuis user_ratings. Les notes reçues pendant la construction sont
+    rejouées dessus (mise à jour idempotente : note absolue, pas un delta).
+    """
+    global _fresh
+    started = time.monotonic()
+    with get_connection() as conn, conn.cursor() as cur:
+        stamp = _read_stamp(cur)   # lu avant les notes : une note concurrente le rend périmé
+        cur.execute("SELECT user_id, show_name, rating FROM user_ratings ORDER BY user_id, show_name;")
+        rows = cur.fetchall()
+    conn.close()
+
+    model = model_from_rows(rows, stamp)
+    with _log_lock:
+        for at, user_id, show, rating in _log:
+            if at >= started - CF_REPLAY_S:
+                model._set(user_id, show, rating - CF_NEUTRAL)
+        _fresh = model   # reçoit aussi les notes jusqu'à son installation par GenerationalIndex
+    return model
+
+
+def _stale(model: ItemCF) -> bool:
+    """Reconstruction si user_ratings a changé hors de ce process (vérifié toutes les CF_RESYNC_S)."""
+    now = time.monotonic()
+    if now - model.checked_at < CF_RESYNC_S:
+        return False
+    model.checked_at = now
+    with pooled_connection() as conn, conn.cursor() as cur:
+        return _read_stamp(cur) != model.stamp
+
+
+_index = GenerationalIndex("item-cf", build_model, stale=_stale)
+
+
+def get_model() -> ItemCF | None:
+    """Modèle courant ; None tant que le premier n'est pas prêt."""
+    return _index.get()
+
+
+def record_rating(user_id: str, show: str, rating: int) -> None:
+    """Après un /user/rate (note validée en base) : mise à jour incrémentale du modèle."""
+    with _log_lock:
+        _log.append((time.monotonic(), user_id, show, rating))
+        targets = {id(m): m for m in (_index.current, _fresh) if m is not None}
+        for model in targets.values():
+            model.set_rating(user_id, show, rating)
+
+
+def start() -> None:
+    """Au démarrage de l'API : construction du modèle en tâche de fond."""
+    _index.refresh_async()
+
+
+def status() -> dict:
+    return _index.status()
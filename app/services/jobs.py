@@ -0,0 +1,186 @@
+# app/services/jobs.py
+"""
+Petit gestionnaire de tâches de fond pour les réindexations longues.
+
+- une tâche = un passage run_bulk() exécuté sur un thread dédié
+- progression consultable (fichiers traités, fichiers/s, erreurs, ETA)
+- annulation coopérative (threading.Event) et reprise : la reprise relance un
+  passage incrémental, qui saute tout ce que le manifeste connaît déjà
+- une seule réindexation à la fois (sinon JobConflict)
+- pas d'écriture d'index à l'unité (index-srt, suppression, recalcul IDF) pendant une
+  réindexation : token_df et show_token_counts n'y sont mis à jour qu'à la fin
+  (cf. index_write)
+
+Le registre est en mémoire : il est propre au process (un worker uvicorn).
+"""
+from __future__ import annotations
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from app.services.bulk_indexer import run_bulk
+
+ACTIVE = ("queued", "running")
+RESUMABLE = ("cancelled", "failed")
+MAX_FINISHED_JOBS = 50   # historique conservé en mémoire
+
+
+class JobConflict(Exception):
+    """Une tâche incompatible (même type) est déjà en cours."""
+
+
+class JobNotFound(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, params: dict, resumed_from: str | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.resumed_from = resumed_from
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.progress: dict = {}
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.cancel_event = threading.Event()
+
+    def on_progress(self, stats: dict) -> None:
+        self.progress = stats
+
+    def snapshot(self) -> dict:
+        """État sérialisable (pour l'API), avec débit et ETA calculés."""
+        p = self.progress
+        total = p.get("todo", 0)
+        done = p.get("parsed", 0)
+        now = self.finished_at or time.time()
+        elapsed = (now - self.started_at) if self.started_at else 0.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 and self.status == "running" else None
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "resumed_from": self.resumed_from,
+            "files_total": total,
+            "files_done": done,
+            "files_written": p.get("indexed", 0),
+            "files_unchanged": p.get("unchanged", 0),
+            "errors": p.get("errors", 0),
+            "last_error": p.get("last_error") or self.error,
+            "files_per_sec": round(rate, 1),
+            "elapsed_s": round(elapsed, 1),
+            "eta_s": round(eta, 1) if eta is not None else None,
+            "result": self.result,
+        }
+
+
+_jobs: dict[str, Job] = {}
+_lock = threading.Lock()
+_writes_done = threading.Condition(_lock)
+_index_writes = 0                    # écritures d'index à l'unité en cours (cf. index_write)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+
+
+def _run(job: Job) -> None:
+    if job.cancel_event.is_set():      # annulée avant d'avoir démarré
+        job.finished_at = time.time()
+        return
+    with _writes_done:                 # écritures à l'unité commencées avant le job : on les laisse finir
+        _writes_done.wait_for(lambda: _index_writes == 0)
+    if job.cancel_event.is_set():
+        job.finished_at = time.time()
+        return
+    job.status = "running"
+    job.started_at = time.time()
+    try:
+        job.result = run_bulk(**job.params, progress=job.on_progress, cancel=job.cancel_event)
+        job.progress = {**job.progress, **job.result}
+        job.status = "cancelled" if job.result.get("cancelled") else "done"
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        job.status = "failed"
+    finally:
+        job.finished_at = time.time()
+
+
+def _prune() -> None:
+    finished = [j for j in _jobs.values() if j.status not in ACTIVE]
+    finished.sort(key=lambda j: j.created_at)
+    for j in finished[:-MAX_FINISHED_JOBS]:
+        del _jobs[j.id]
+
+
+def _active_reindex() -> Job | None:
+    return next((j for j in _jobs.values() if j.kind == "reindex" and j.status in ACTIVE), None)
+
+
+def start_reindex(params: dict, resumed_from: str | None = None) -> Job:
+    """Crée et lance une réindexation en tâche de fond ; refuse s'il y en a déjà une."""
+    with _lock:
+        running = _active_reindex()
+        if running is not None:
+            raise JobConflict(running.id)
+        _prune()
+        job = Job("reindex", params, resumed_from)
+        _jobs[job.id] = job
+    _executor.submit(_run, job)
+    return job
+
+
+@contextmanager
+def index_write():
+    """
+    Encadre une écriture d'index hors job (index-srt, suppression, recalcul IDF) :
+    JobConflict si une réindexation est en attente ou en cours ; une réindexation
+    lancée entre-temps attend la fin de l'écriture pour démarrer.
+    """
+    global _index_writes
+    with _lock:
+        running = _active_reindex()
+        if running is not None:
+            raise JobConflict(running.id)
+        _index_writes += 1
+    try:
+        yield
+    finally:
+        with _writes_done:
+            _index_writes -= 1
+            _writes_done.notify_all()
+
+
+def get_job(job_id: str) -> Job:
+    job = _jobs.get(job_id)
+    if job is None:
+        raise JobNotFound(job_id)
+    return job
+
+
+def list_jobs() -> list[Job]:
+    return sorted(_jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+
+def cancel_job(job_id: str) -> Job:
+    job = get_job(job_id)
+    if job.status in ACTIVE:
+        job.cancel_event.set()
+        if job.status == "queued":
+            job.status = "cancelled"
+    return job
+
+
+def resume_job(job_id: str) -> Job:
+    """
+    Reprend une réindexation annulée/échouée : passage incrémental avec les mêmes
+    paramètres (les fichiers déjà écrits sont reconnus par le manifeste).
+    """
+    job = get_job(job_id)
+    if job.status not in RESUMABLE:
+        raise ValueError(f"job {job_id} : statut {job.status}, seuls les jobs {'/'.join(RESUMABLE)} peuvent être repris")
+    return start_reindex({**job.params, "incremental": True}, resumed_from=job.id)
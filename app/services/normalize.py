@@ -1,6 +1,7 @@
 # app/services/normalize.py
 from __future__ import annotations
 from collections import Counter
+from functools import lru_cache
 from .subtitles import srt_to_lines
 import re
 import unicodedata
@@ -28,6 +29,56 @@ def _strip_accents(s: str) -> str:
     """Supprime les accents (é -> e)."""
     return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
 
+def fold(s: str) -> str:
+    """Minuscules, sans accents, espaces simples (noms de séries, préfixes d'autocomplétion)."""
+    return " ".join(_strip_accents(s.lower()).split())
+
+def _normalize_line_slow(line: str) -> list[str]:
+    """Version de référence (lente) : sert de repli et de témoin pour le benchmark."""
+    s = line.lower()
+    s = _strip_accents(s)
+    s = _DIGITS.sub(" ", s)
+    s = _PUNCT.sub(" ", s)
+    tokens = s.split()
+    tokens = [t for t in tokens if t not in STOPWORDS and len(t) > 1]
+    return tokens
+
+
+class _FoldTable(dict):
+    """
+    Table pour str.translate, remplie à la demande (1 calcul par caractère distinct) :
+    caractère -> sans accents, chiffres et ponctuation remplacés par une espace.
+    Applique caractère par caractère exactement les mêmes règles que _normalize_line_slow.
+    """
+    def __init__(self):
+        super().__init__()
+        self.unsafe: set[int] = set()   # marques combinantes non-Mn : repli sur la version lente
+
+    def __missing__(self, code: int):
+        c = chr(code)
+        decomposed = unicodedata.normalize("NFD", c)
+        if any(unicodedata.combining(ch) and unicodedata.category(ch) != "Mn" for ch in decomposed):
+            self.unsafe.add(code)
+        folded = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+        folded = _PUNCT.sub(" ", _DIGITS.sub(" ", folded))
+        value = code if folded == c else folded
+        self[code] = value
+        return value
+
+
+_FOLD = _FoldTable()
+WORD_CACHE_SIZE = 200_000   # vocabulaire des sous-titres très répétitif
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def _normalize_word(word: str) -> tuple[str, ...]:
+    """Normalise un "mot" (déjà en minuscules, sans espace) ; mémoïsé."""
+    folded = word.translate(_FOLD)
+    if _FOLD.unsafe and not _FOLD.unsafe.isdisjoint(map(ord, word)):
+        return tuple(_normalize_line_slow(word))
+    return tuple(t for t in folded.split() if t not in STOPWORDS and len(t) > 1)
+
+
 def normalize_line(line: str) -> list[str]:
     """
     Transforme une ligne en tokens 'propres' :
@@ -36,18 +87,31 @@ def normalize_line(line: str) -> list[str]:
     - sans chiffres ni ponctuation
     - sans stopwords
     - tokens de longueur > 1
+    Chemin rapide : table de traduction + cache par mot (même sortie que la version de référence).
     """
-    s = line.lower()
-    s = _strip_accents(s)
-    s = _DIGITS.sub(" ", s)
-    s = _PUNCT.sub(" ", s)
-    tokens = s.split()
-    tokens = [t for t in tokens if t not in STOPWORDS and len(t) > 1]
-    return tokens
+    out: list[str] = []
+    norm = _normalize_word
+    for word in line.lower().split():
+        out.extend(norm(word))
+    return out
+
 
 def normalize_lines(lines: list[str]) -> list[list[str]]:
-    """Applique normalize_line à une liste de lignes."""
-    return [normalize_line(l) for l in lines]
+    """Applique normalize_line à une liste de lignes (un fichier entier en un appel)."""
+    norm = _normalize_word
+    out: list[list[str]] = []
+    for line in lines:
+        toks: list[str] = []
+        for word in line.lower().split():
+            toks.extend(norm(word))
+        out.append(toks)
+    return out
+
+
+def normalize_cache_info() -> dict:
+    """Statistiques du cache de mots (taille, hits, misses)."""
+    info = _normalize_word.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
 
 def tokens_flatten(lines_tokens: list[list[str]]) -> list[str]:
     """Aplati [[t1,t2],[t3]] -> [t1,t2,t3]."""
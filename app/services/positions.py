@@ -0,0 +1,101 @@
+# app/services/positions.py
+"""
+Index positionnel : pour chaque (épisode, token), la liste des positions du token dans
+le flux de tokens normalisés de l'épisode (mêmes tokens que unigram/bigram_counts,
+stopwords déjà retirés, lignes concaténées).
+
+Stockage compact (table token_positions, colonne BYTEA) : écarts entre positions
+successives, dans un tableau d'entiers de largeur fixe choisie par liste
+(1 octet de type + uint8/uint16/uint32 little-endian). Le décodage se fait en C
+(array + accumulate), sans boucle Python par position.
+
+Sert aux phrases exactes entre guillemets et au score de proximité de /search.
+"""
+from __future__ import annotations
+import heapq
+import sys
+from array import array
+from itertools import accumulate
+
+_WIDTHS = (("B", 0xFF), ("H", 0xFFFF), ("I", 0xFFFFFFFF))   # typecode, écart max
+
+
+def token_positions(tokens: list[str]) -> dict[str, list[int]]:
+    """Positions (croissantes) de chaque token dans la liste."""
+    out: dict[str, list[int]] = {}
+    for i, tok in enumerate(tokens):
+        lst = out.get(tok)
+        if lst is None:
+            out[tok] = [i]
+        else:
+            lst.append(i)
+    return out
+
+
+def encode_positions(positions: list[int]) -> bytes:
+    """Positions croissantes -> octets (écarts, largeur minimale)."""
+    gaps = [positions[0]] + [b - a for a, b in zip(positions, positions[1:])] if positions else []
+    top = max(gaps, default=0)
+    code = next(c for c, limit in _WIDTHS if top <= limit)
+    arr = array(code, gaps)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return code.encode() + arr.tobytes()
+
+
+def decode_positions(data: bytes | memoryview) -> list[int]:
+    """Inverse de encode_positions."""
+    data = bytes(data)
+    if not data:
+        return []
+    arr = array(chr(data[0]))
+    arr.frombytes(data[1:])
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return list(accumulate(arr))
+
+
+def copy_bytea(data: bytes) -> str:
+    """Valeur BYTEA (hexadécimal, backslash échappé) pour un COPY au format texte."""
+    return "\\\\x" + data.hex()
+
+
+def phrase_starts(lists: list[list[int]]) -> set[int]:
+    """
+    Positions de début de la phrase dont `lists` sont les positions des mots successifs
+    (le mot i doit être à la position p + i).
+    """
+    if not lists or any(not lst for lst in lists):
+        return set()
+    starts = set(lists[0])
+    for offset, lst in enumerate(lists[1:], start=1):
+        starts.intersection_update(p - offset for p in lst)
+        if not starts:
+            break
+    return starts
+
+
+def phrase_count(lists: list[list[int]]) -> int:
+    """Nombre d'occurrences de la phrase (cf. phrase_starts)."""
+    return len(phrase_starts(lists))
+
+
+def min_span(lists: list[list[int]]) -> int | None:
+    """
+    Plus petite fenêtre (en tokens, bornes incluses) contenant au moins une position
+    de chaque liste ; None si une liste est vide.
+    """
+    if not lists or any(not lst for lst in lists):
+        return None
+    heap = [(lst[0], i, 0) for i, lst in enumerate(lists)]
+    heapq.heapify(heap)
+    high = max(p for p, _, _ in heap)
+    best = high - heap[0][0] + 1
+    while True:
+        low, i, j = heapq.heappop(heap)
+        best = min(best, high - low + 1)
+        if best == len(lists) or j + 1 == len(lists[i]):
+            return best
+        nxt = lists[i][j + 1]
+        high = max(high, nxt)
+        heapq.heappush(heap, (nxt, i, j + 1))
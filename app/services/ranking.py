@@ -0,0 +1,183 @@
+# app/services/ranking.py
+"""
+Logique de classement de /search, partagée par le chemin SQL et le moteur en mémoire :
+variantes singulier/pluriel, fusion AND puis OR, boost bigrammes, rerank par série.
+"""
+from __future__ import annotations
+import re
+from typing import NamedTuple
+
+from app.services.normalize import normalize_line
+from app.services.positions import min_span, phrase_count
+
+BIGRAM_WEIGHT = 2.0     # poids d'une occurrence de bigramme de la requête
+TOP_SERIES = 3          # séries promues en tête des résultats
+PHRASE_WEIGHT = 3.0     # poids d'une occurrence exacte d'une phrase entre guillemets
+PROXIMITY_WEIGHT = 1.0  # bonus max quand les mots de la requête sont côte à côte
+
+_QUOTED = re.compile(r'"([^"]*)"')
+
+
+def parse_query(q: str) -> tuple[list[str], list[list[str]]]:
+    """
+    Tokens de la requête (dans l'ordre) + phrases entre guillemets (>= 2 tokens).
+    Ex: '"buffy contre" vampires' -> (["buffy", "contre", "vampires"], [["buffy", "contre"]])
+    """
+    phrases = [toks for toks in map(normalize_line, _QUOTED.findall(q)) if len(toks) > 1]
+    return normalize_line(q.replace('"', " ")), phrases
+
+
+class EpisodeFilter(NamedTuple):
+    """Filtres de /search : série (nom exact), saison, plage d'épisodes (bornes incluses)."""
+    show: str | None = None
+    season: int | None = None
+    ep_from: int | None = None
+    ep_to: int | None = None
+
+    @property
+    def active(self) -> bool:
+        return any(v is not None for v in self)
+
+    @property
+    def episode_range(self) -> tuple[int, int] | None:
+        if self.ep_from is None and self.ep_to is None:
+            return None
+        return (
+            self.ep_from if self.ep_from is not None else 0,
+            self.ep_to if self.ep_to is not None else 2**31 - 1,
+        )
+
+    def accepts(self, episode: dict) -> bool:
+        """Épisode (show_name, season, episode) retenu par le filtre ?"""
+        if self.show is not None and episode["show_name"] != self.show:
+            return False
+        if self.season is not None and episode["season"] != self.season:
+            return False
+        rng = self.episode_range
+        return rng is None or (episode["episode"] is not None and rng[0] <= episode["episode"] <= rng[1])
+
+
+def expand_variants(tokens: list[str]) -> tuple[list[str], bool]:
+    """
+    Variantes singulier/pluriel auto si UN seul mot (ex: vampire <-> vampires).
+    Renvoie (tokens, True si la recherche doit se faire en OR seul).
+    """
+    if len(tokens) != 1:
+        return tokens, False
+    t = tokens[0]
+    variants = {t}
+    if t.endswith("s"):
+        if len(t) > 1:
+            variants.add(t[:-1])
+    else:
+        variants.add(t + "s")
+    return list(variants), True
+
+
+def query_bigrams(terms: list) -> list[tuple]:
+    """Paires de termes consécutifs (les termes inconnus, None, sont ignorés)."""
+    return [
+        (terms[i], terms[i + 1]) for i in range(len(terms) - 1)
+        if terms[i] is not None and terms[i + 1] is not None
+    ]
+
+
+def score_positions(
+    tokens: list[str], phrases: list[list[str]], positions: dict[str, list[int]], idf: dict[str, float]
+) -> dict | None:
+    """
+    Candidat d'une requête à phrases, calculé depuis les positions des tokens dans l'épisode :
+    None si une phrase n'y figure pas ; sinon matched_terms, tfidf (comme en SQL), occurrences
+    des phrases, et score = tfidf + PHRASE_WEIGHT * occurrences.
+    """
+    hits = 0
+    for phrase in phrases:
+        n = phrase_count([positions.get(t, []) for t in phrase])
+        if not n:
+            return None
+        hits += n
+    tfidf = sum(len(positions.get(t, ())) * idf.get(t, 0.0) for t in tokens)
+    matched = sum(1 for t in set(tokens) if t in positions)
+    return {
+        "matched_terms": matched,
+        "tfidf": tfidf,
+        "phrase_matches": hits,
+        "score": tfidf + PHRASE_WEIGHT * hits,
+        "match_type": "AND" if matched == len(set(tokens)) else "OR",
+    }
+
+
+def proximity_bonus(lists: list[list[int]], weight: float = PROXIMITY_WEIGHT) -> float:
+    """
+    weight si les k termes présents tiennent dans une fenêtre de k tokens,
+    décroît avec la taille de la plus petite fenêtre qui les contient tous.
+    """
+    lists = [lst for lst in lists if lst]
+    if len(lists) < 2:
+        return 0.0
+    span = min_span(lists)
+    return weight * (len(lists) - 1) / (span - 1)
+
+
+def merge_candidates(rows_and: list[dict], rows_or: list[dict]) -> list[dict]:
+    """Fusion sans doublons d'épisodes (AND avant OR)."""
+    seen_ep = {r["id"] for r in rows_and}
+    return rows_and + [r for r in rows_or if r["id"] not in seen_ep]
+
+
+def apply_bigram_boost(rows: list[dict], boosts: dict, weight: float = BIGRAM_WEIGHT) -> None:
+    """score += weight * occurrences des bigrammes de la requête dans l'épisode."""
+    for r in rows:
+        r["score"] = float(r["score"]) + weight * float(boosts.get(r["id"], 0))
+
+
+def rerank(rows: list[dict], limit: int, top_series: int = TOP_SERIES) -> list[dict]:
+    """
+    Tri primaire (AND d'abord, puis score), promotion des meilleures séries,
+    puis diversité : max 1 épisode par série. Trie `rows` sur place.
+    """
+    # ----- Tri primaire (AND d'abord, puis score décroissant) -----
+    rows.sort(key=lambda x: (0 if x["match_type"] == "AND" else 1, -x["score"]))
+
+    # ----- Rerank par série : promouvoir les Top-3 séries -----
+    # 1) score par série = somme des scores + petit bonus sur matched_terms max
+    series_score = {}
+    best_ep_per_show = {}
+    for r in rows:
+        show = r["show_name"]
+        series_score.setdefault(show, 0.0)
+        series_score[show] += float(r["score"])
+        # garder le meilleur épisode par série
+        if show not in best_ep_per_show or r["score"] > best_ep_per_show[show]["score"]:
+            best_ep_per_show[show] = r
+        # bonus léger à la "couverture" (approx: matched_terms max)
+        series_score[show] += 0.1 * int(r.get("matched_terms", 0))
+
+    # 2) top-3 séries
+    top = sorted(series_score.items(), key=lambda kv: kv[1], reverse=True)[:top_series]
+    top_shows = [name for name, _ in top]
+    top_episodes = [best_ep_per_show[s] for s in top_shows if s in best_ep_per_show]
+
+    # ----- Diversité : max 1 épisode par série + priorité aux Top-3 -----
+    diverse = []
+    seen_shows = set()
+
+    # place d'abord les meilleurs épisodes des meilleures séries
+    for r in top_episodes:
+        if r["show_name"] not in seen_shows:
+            diverse.append(r)
+            seen_shows.add(r["show_name"])
+            if len(diverse) >= limit:
+                break
+
+    # puis complète avec le reste, en respectant "1 épisode par série"
+    if len(diverse) < limit:
+        for r in rows:
+            if r["show_name"] in seen_shows:
+                continue
+            diverse.append(r)
+            seen_shows.add(r["show_name"])
+            if len(diverse) >= limit:
+                break
+
+    return diverse
@@ -0,0 +1,164 @@
+# app/services/reco_batch.py
+"""
+Précalcul des recommandations de tous les utilisateurs (newsletter, page d'accueil) dans
+la table user_recommendations, servie ensuite par /user/recommend tant qu'elle est fraîche.
+
+Un seul passage :
+- lecture de toute la table user_ratings (une requête, un instantané) ;
+- résultat intermédiaire partagé : matrice creuse série x série (ShowVectors.affinity),
+  scores de chaque série aimée seule ; les scores TF-IDF d'un paquet d'utilisateurs =
+  somme pondérée des lignes de leurs séries aimées (np.bincount), mémoire bornée par
+  BATCH_CELLS quel que soit le nombre de séries ;
+- modèle collaboratif construit une fois depuis les mêmes notes, mélange comme en ligne ;
+- écriture ensembliste : COPY dans une table de travail (aucun verrou sur la table servie),
+  index créé après le chargement, puis échange par RENAME dans une transaction courte.
+
+Mêmes résultats que /user/recommend avec les mêmes réglages. Nécessite NumPy.
+"""
+from __future__ import annotations
+import io
+import time
+
+from app.core.db import get_connection
+from app.services import item_cf, show_vectors
+
+BATCH_CELLS = 1 << 22   # scores (utilisateurs x séries) calculés par paquet : 32 Mo de float64
+
+# Table de travail, chargée à part puis échangée avec user_recommendations
+STAGE_SQL = """
+DROP TABLE IF EXISTS user_recommendations_new;
+CREATE TABLE user_recommendations_new (LIKE user_recommendations INCLUDING DEFAULTS);
+"""
+INDEX_SQL = """
+ALTER TABLE user_recommendations_new
+  ADD CONSTRAINT user_recommendations_new_pkey PRIMARY KEY (user_id, rank);
+"""
+SWAP_SQL = """
+SET LOCAL lock_timeout = '5s';
+DROP TABLE user_recommendations;
+ALTER TABLE user_recommendations_new RENAME TO user_recommendations;
+ALTER TABLE user_recommendations RENAME CONSTRAINT user_recommendations_new_pkey TO user_recommendations_pkey;
+"""
+
+
+def _copy_text(value: str) -> str:
+    """Texte pour un COPY au format texte (on échappe ce que COPY interprète)."""
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_float(value: float | None) -> str:
+    return "\\N" if value is None else repr(value)
+
+
+def precompute_all(
+    top: int,
+    pool: int,
+    top_tokens: int,
+    min_rating: int,
+    idf_min: float,
+    idf_max: float,
+    cf_weight: float,
+) -> dict:
+    """
+    Recalcule les `top` premières recommandations de chaque utilisateur (pool = candidats
+    de chaque score avant mélange, cf. item_cf.blend). Renvoie un résumé (utilisateurs/s...).
+    """
+    np = show_vectors.np
+    if np is None:
+        raise RuntimeError("NumPy est nécessaire au précalcul des recommandations")
+    t0 = time.perf_counter()
+
+    conn = get_connection()
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        with conn.cursor() as cur:
+            cur.execute("SELECT NOW() AS snapshot;")
+            snapshot = cur.fetchone()["snapshot"]
+            cur.execute("SELECT user_id, show_name, rating FROM user_ratings ORDER BY user_id, show_name;")
+            ratings = cur.fetchall()
+        conn.rollback()
+    finally:
+        conn.close()
+    vectors = show_vectors.build_index()
+    cf_model = item_cf.model_from_rows(ratings) if cf_weight > 0 else None
+    t_read = time.perf_counter()
+
+    liked: dict[str, list[tuple[str, int]]] = {}
+    for r in ratings:
+        mine = liked.setdefault(r["user_id"], [])
+        if r["rating"] >= min_rating:
+            mine.append((r["show_name"], show_vectors.rating_weight(r["rating"], min_rating)))
+    users = list(liked)
+    a_ptr, a_col, a_val = vectors.affinity(top_tokens, idf_min, idf_max)
+    content_pool = max(top, pool) if cf_model is not None else top
+    n_shows = len(vectors.shows)
+    chunk_size = max(1, BATCH_CELLS // max(n_shows, 1))
+
+    results: list[tuple[str, list[dict]]] = []
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+        # (utilisateur du paquet, série aimée, poids) -> lignes creuses de l'affinité
+        triples = [
+            (k, vectors.show_index[name], w)
+            for k, user_id in enumerate(chunk)
+            for name, w in liked[user_id]
+            if name in vectors.show_index
+        ]
+        if triples:
+            ks, shows, ws = (np.array(v) for v in zip(*triples))
+            idx, lens = show_vectors.spans(a_ptr, shows)
+            scores = np.bincount(
+                np.repeat(ks, lens) * n_shows + a_col[idx],
+                weights=a_val[idx] * np.repeat(ws.astype(np.float64), lens),
+                minlength=len(chunk) * n_shows,
+            ).reshape(len(chunk), n_shows)
+        else:
+            scores = np.zeros((len(chunk), n_shows))
+        for k, user_id in enumerate(chunk):
+            names = [name for name, _ in liked[user_id]]
+            rows = vectors.top(scores[k], names, content_pool)
+            if cf_model is not None:
+                rows = item_cf.blend(rows, cf_model.recommend(user_id, content_pool), cf_weight, set(names), top)
+            if rows:
+                results.append((user_id, rows))
+    t_compute = time.perf_counter()
+
+    buf = io.StringIO()
+    n_rows = 0
+    for user_id, rows in results:
+        uid = _copy_text(user_id)
+        for rank, r in enumerate(rows, start=1):
+            buf.write(
+                f"{uid}\t{rank}\t{_copy_text(r['show_name'])}\t{r['score']!r}\t"
+                f"{_copy_float(r.get('content'))}\t{_copy_float(r.get('cf'))}\t"
+                f"{vectors.generation}\t{snapshot.isoformat()}\n"
+            )
+            n_rows += 1
+    buf.seek(0)
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(STAGE_SQL)
+        cur.copy_expert(
+            "COPY user_recommendations_new (user_id, rank, show_name, score, content, cf, generation, computed_at) "
+            "FROM STDIN",
+            buf,
+        )
+        cur.execute(INDEX_SQL)
+        conn.commit()
+        # seul moment où la table servie est verrouillée : le temps des RENAME
+        cur.execute(SWAP_SQL)
+        conn.commit()
+    conn.close()
+    t_write = time.perf_counter()
+
+    elapsed = t_write - t0
+    return {
+        "users": len(users),
+        "users_with_results": len(results),
+        "rows": n_rows,
+        "generation": vectors.generation,
+        "read_s": round(t_read - t0, 3),
+        "compute_s": round(t_compute - t_read, 3),
+        "write_s": round(t_write - t_compute, 3),
+        "elapsed_s": round(elapsed, 3),
+        "users_per_sec": round(len(users) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
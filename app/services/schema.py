@@ -1,5 +1,8 @@
 # app/services/schema.py
 from app.core.db import get_connection
+from app.services.index_state import bump_generation
+from app.services.show_tokens import refresh_show_tokens
+from app.services.tokens import clear_cache
 
 DDL = """
 -- Épisodes + index
@@ -13,34 +16,84 @@ CREATE TABLE IF NOT EXISTS episodes (
 CREATE INDEX IF NOT EXISTS idx_episodes_show_season_ep
   ON episodes(show_name, season, episode);
 
+-- Manifeste pour la réindexation incrémentale (taille, mtime, hash du contenu)
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS file_size BIGINT;
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS file_mtime DOUBLE PRECISION;
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS indexed_at TIMESTAMPTZ;
+
+-- Dictionnaire des tokens (les tables de comptage ne stockent que l'id)
+CREATE TABLE IF NOT EXISTS tokens (
+    id SERIAL PRIMARY KEY,
+    text TEXT UNIQUE NOT NULL
+);
+
 -- Unigrammes
 CREATE TABLE IF NOT EXISTS unigram_counts (
     episode_id INT REFERENCES episodes(id) ON DELETE CASCADE,
-    token TEXT NOT NULL,
+    token_id INT NOT NULL,
     freq INT NOT NULL,
-    PRIMARY KEY (episode_id, token)
+    PRIMARY KEY (episode_id, token_id)
 );
 CREATE INDEX IF NOT EXISTS idx_unigrams_token
-  ON unigram_counts(token);
+  ON unigram_counts(token_id);
 
 -- Bigrammes
 CREATE TABLE IF NOT EXISTS bigram_counts (
     episode_id INT REFERENCES episodes(id) ON DELETE CASCADE,
-    token1 TEXT NOT NULL,
-    token2 TEXT NOT NULL,
+    token1_id INT NOT NULL,
+    token2_id INT NOT NULL,
     freq INT NOT NULL,
-    PRIMARY KEY (episode_id, token1, token2)
+    PRIMARY KEY (episode_id, token1_id, token2_id)
 );
 CREATE INDEX IF NOT EXISTS idx_bigrams_t1_t2
-  ON bigram_counts(token1, token2);
+  ON bigram_counts(token1_id, token2_id);
 
--- (Optionnel mais utile pour la reco/IDF si tu l'utilises)
+-- Positions des tokens par épisode (écarts encodés, cf. positions.py) : phrases exactes, proximité
+CREATE TABLE IF NOT EXISTS token_positions (
+    episode_id INT REFERENCES episodes(id) ON DELETE CASCADE,
+    token_id INT NOT NULL,
+    positions BYTEA NOT NULL,
+    PRIMARY KEY (episode_id, token_id)
+);
+
+-- Blocs de sous-titres par épisode (cf. cues.py) : extraits et timecodes de /search
+CREATE TABLE IF NOT EXISTS episode_cues (
+    episode_id INT PRIMARY KEY REFERENCES episodes(id) ON DELETE CASCADE,
+    codec TEXT,                    -- NULL : offsets inconnus (texte non relisible)
+    numbers BYTEA NOT NULL,
+    starts_ms BYTEA NOT NULL,
+    offsets BYTEA NOT NULL,
+    token_starts BYTEA NOT NULL
+);
+
+-- DF / IDF par token (la clé primaire sert d'index)
 CREATE TABLE IF NOT EXISTS token_df (
-    token TEXT PRIMARY KEY,
+    token_id INT PRIMARY KEY,
     df INT NOT NULL,
     idf DOUBLE PRECISION NOT NULL
 );
-CREATE INDEX IF NOT EXISTS idx_token_df_token ON token_df(token);
+
+-- Agrégat par série (somme des fréquences ; TF-IDF = freq * idf à la lecture), maintenu par l'indexeur
+CREATE TABLE IF NOT EXISTS show_token_counts (
+    show_name TEXT NOT NULL,
+    token_id INT NOT NULL,
+    freq BIGINT NOT NULL,
+    PRIMARY KEY (show_name, token_id)
+);
+ALTER TABLE show_token_counts DROP COLUMN IF EXISTS tfidf;
+CREATE INDEX IF NOT EXISTS idx_show_tokens_token
+  ON show_token_counts(token_id);
+
+-- Génération de l'index (incrémentée à chaque écriture, cf. index_state.py)
+CREATE TABLE IF NOT EXISTS index_state (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    generation BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+-- N (nb d'épisodes) du dernier recalcul complet des IDF (cf. idf.py)
+ALTER TABLE index_state ADD COLUMN IF NOT EXISTS idf_total BIGINT;
+INSERT INTO index_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
 
 -- Utilisateurs (auth)
 CREATE TABLE IF NOT EXISTS users (
@@ -60,10 +113,89 @@ CREATE TABLE IF NOT EXISTS user_ratings (
 );
 CREATE INDEX IF NOT EXISTS idx_user_ratings_user ON user_ratings(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_ratings_show ON user_ratings(show_name);
+ALTER TABLE user_ratings ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+-- Recommandations précalculées pour tous les utilisateurs (réglages par défaut, cf. reco_batch.py)
+CREATE TABLE IF NOT EXISTS user_recommendations (
+    user_id TEXT NOT NULL,
+    rank INT NOT NULL,
+    show_name TEXT NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    content DOUBLE PRECISION,          -- part TF-IDF et part collaborative (NULL sans mélange)
+    cf DOUBLE PRECISION,
+    generation BIGINT NOT NULL,        -- génération de l'index de la matrice série x token
+    computed_at TIMESTAMPTZ NOT NULL,  -- instant de lecture des notes
+    PRIMARY KEY (user_id, rank)
+);
+"""
+
+# Migration : anciennes tables où les tokens étaient stockés en TEXT
+LEGACY_RENAME = """
+DROP INDEX IF EXISTS idx_unigrams_token, idx_bigrams_t1_t2, idx_token_df_token, idx_show_tokens_token;
+DROP TABLE IF EXISTS show_token_counts;   -- reconstruit depuis unigram_counts
+
+ALTER TABLE unigram_counts RENAME TO unigram_counts_text;
+ALTER TABLE unigram_counts_text RENAME CONSTRAINT unigram_counts_pkey TO unigram_counts_text_pkey;
+ALTER TABLE bigram_counts RENAME TO bigram_counts_text;
+ALTER TABLE bigram_counts_text RENAME CONSTRAINT bigram_counts_pkey TO bigram_counts_text_pkey;
+ALTER TABLE token_df RENAME TO token_df_text;
+ALTER TABLE token_df_text RENAME CONSTRAINT token_df_pkey TO token_df_text_pkey;
 """
 
+LEGACY_COPY = """
+INSERT INTO tokens (text)
+SELECT token FROM unigram_counts_text
+UNION SELECT token1 FROM bigram_counts_text
+UNION SELECT token2 FROM bigram_counts_text
+UNION SELECT token FROM token_df_text
+ON CONFLICT (text) DO NOTHING;
+
+INSERT INTO unigram_counts (episode_id, token_id, freq)
+SELECT u.episode_id, t.id, u.freq
+FROM unigram_counts_text u
+JOIN tokens t ON t.text = u.token;
+
+INSERT INTO bigram_counts (episode_id, token1_id, token2_id, freq)
+SELECT b.episode_id, t1.id, t2.id, b.freq
+FROM bigram_counts_text b
+JOIN tokens t1 ON t1.text = b.token1
+JOIN tokens t2 ON t2.text = b.token2;
+
+INSERT INTO token_df (token_id, df, idf)
+SELECT t.id, d.df, d.idf
+FROM token_df_text d
+JOIN tokens t ON t.text = d.token;
+
+DROP TABLE unigram_counts_text, bigram_counts_text, token_df_text;
+"""
+
+
+def _has_text_tokens(cur) -> bool:
+    cur.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'unigram_counts' AND column_name = 'token';
+        """
+    )
+    return cur.fetchone() is not None
+
+
 def init_schema() -> None:
+    """
+    Crée les tables manquantes. Une base à l'ancien format (tokens en TEXT) est
+    convertie vers le dictionnaire d'id dans la même transaction.
+    """
     with get_connection() as conn:
         with conn.cursor() as cur:
+            legacy = _has_text_tokens(cur)
+            if legacy:
+                cur.execute(LEGACY_RENAME)
             cur.execute(DDL)
+            if legacy:
+                cur.execute(LEGACY_COPY)
+                refresh_show_tokens(cur)
+                bump_generation(cur)
+                cur.execute("ANALYZE tokens, unigram_counts, bigram_counts, token_df, show_token_counts;")
         conn.commit()
+    clear_cache()
@@ -0,0 +1,639 @@
+# app/services/search_engine.py
+"""
+Moteur de recherche en mémoire (optionnel : SEARCH_ENGINE=memory).
+
+Listes inversées compactes (tableaux d'entiers), IDF et métadonnées des épisodes,
+lues depuis un fichier instantané (snapshot) mappé en mémoire : un redémarrage ne
+relit pas les tables. Le snapshot est reconstruit depuis Postgres quand la génération
+de l'index (index_state) change ; pendant la reconstruction, /search passe par SQL.
+
+Même logique que le chemin SQL : AND puis OR (pool de candidats), boost bigrammes,
+puis rerank par série (app/services/ranking.py). Le top-k OR est calculé avec élagage
+MaxScore : borne par mot = fréquence max x idf ; dès qu'un nouvel épisode ne peut plus
+entrer dans le pool, les listes des mots fréquents ne sont plus que sondées par bisect.
+Filtres série / saison : bitmaps d'épisodes par série et par saison (calculés au chargement),
+sélection (rangs + masque) mise en cache par filtre et par snapshot ; même élagage MaxScore,
+le masque écartant les épisodes non retenus, et seuls les épisodes retenus sont sondés
+dans les listes (bisect) quand ils sont peu nombreux.
+
+Format du snapshot (ordre d'octets natif) : MAGIC, longueur de l'en-tête (u64),
+en-tête JSON (génération, épisodes, sections), puis les sections alignées sur 8 octets :
+- vocab_blob / vocab_off : textes des tokens, triés (recherche par bisect)
+- vocab_id / vocab_idf   : id et IDF de chaque entrée du vocabulaire
+- uni_key / uni_start / uni_len, uni_ep / uni_freq : listes inversées par id de token,
+  triées par épisode ; uni_maxf = fréquence max de chaque liste (élagage MaxScore)
+- bg_key / bg_start / bg_len, bg_ep / bg_freq : idem par bigramme (clé = id1 << 32 | id2)
+uni_ep / bg_ep contiennent le rang de l'épisode dans la liste `episodes` de l'en-tête.
+"""
+from __future__ import annotations
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+from app.core.config import SEARCH_ENGINE, SEARCH_SNAPSHOT
+from app.core.db import get_connection
+from app.services.index_state import current_generation, read_generation
+from app.services.ranking import EpisodeFilter
+
+MAGIC = b"SRIDX002"
+ALIGN = 8
+RETRY_AFTER_S = 30.0   # délai avant une nouvelle tentative après un échec de construction
+PROBE_FACTOR = 16      # MaxScore : sonder par bisect si candidats x PROBE_FACTOR < longueur de liste
+FILTER_CACHE_SIZE = 256   # sélections (filtre -> épisodes retenus) gardées par snapshot
+
+
+# ---------- Construction depuis Postgres ----------
+
+class _PostingsSink:
+    """
+    Reçoit un COPY (clé..., episode_id, freq) TO STDOUT trié par clé
+    et le range en listes inversées contiguës.
+    """
+
+    def __init__(self, ep_index: dict[int, int], bigram: bool = False):
+        self.ep_index = ep_index
+        self.bigram = bigram
+        self.key = array("q")
+        self.start = array("q")
+        self.length = array("i")
+        self.maxf = array("i")   # fréquence max de chaque liste (borne supérieure du score)
+        self.ep = array("i")
+        self.freq = array("i")
+        self._rest = ""
+        self._current = None
+
+    def write(self, data) -> int:
+        if not isinstance(data, str):
+            data = bytes(data).decode()
+        buf = self._rest + data
+        cut = buf.rfind("\n") + 1
+        self._rest = buf[cut:]
+        ep_index, ep, freq, maxf = self.ep_index, self.ep, self.freq, self.maxf
+        for line in buf[:cut].splitlines():
+            cols = line.split("\t")
+            key = (int(cols[0]) << 32) | int(cols[1]) if self.bigram else int(cols[0])
+            if key != self._current:
+                self._close_key()
+                self.key.append(key)
+                self.start.append(len(ep))
+                maxf.append(0)
+                self._current = key
+            f = int(cols[-1])
+            ep.append(ep_index[int(cols[-2])])
+            freq.append(f)
+            if f > maxf[-1]:
+                maxf[-1] = f
+        return len(data)
+
+    def _close_key(self) -> None:
+        if self._current is not None:
+            self.length.append(len(self.ep) - self.start[-1])
+
+    def finish(self) -> None:
+        self._close_key()
+        self._current = None
+
+
+def build_snapshot(path: Path) -> int:
+    """Lit l'index (une transaction cohérente) et écrit le snapshot. Renvoie sa génération."""
+    conn = get_connection()
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        with conn.cursor() as cur:
+            generation = read_generation(cur)
+
+            cur.execute("SELECT id, show_name, season, episode, file_path FROM episodes ORDER BY id;")
+            episodes = [dict(r) for r in cur.fetchall()]
+            ep_index = {e["id"]: i for i, e in enumerate(episodes)}
+
+            cur.execute(
+                """
+                SELECT t.id, t.text, COALESCE(d.idf, 0.0) AS idf
+                FROM tokens t
+                LEFT JOIN token_df d ON d.token_id = t.id;
+                """
+            )
+            vocab = sorted((r["text"].encode(), r["id"], r["idf"]) for r in cur.fetchall())
+
+            uni = _PostingsSink(ep_index)
+            cur.copy_expert(
+                "COPY (SELECT token_id, episode_id, freq FROM unigram_counts "
+                "ORDER BY token_id, episode_id) TO STDOUT",
+                uni,
+            )
+            uni.finish()
+
+            bg = _PostingsSink(ep_index, bigram=True)
+            cur.copy_expert(
+                "COPY (SELECT token1_id, token2_id, episode_id, freq FROM bigram_counts "
+                "ORDER BY token1_id, token2_id, episode_id) TO STDOUT",
+                bg,
+            )
+            bg.finish()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    vocab_off = array("q", [0])
+    for text, _, _ in vocab:
+        vocab_off.append(vocab_off[-1] + len(text))
+    sections = {
+        "vocab_blob": b"".join(text for text, _, _ in vocab),
+        "vocab_off": vocab_off,
+        "vocab_id": array("i", (tid for _, tid, _ in vocab)),
+        "vocab_idf": array("d", (idf for _, _, idf in vocab)),
+        "uni_key": uni.key, "uni_start": uni.start, "uni_len": uni.length, "uni_maxf": uni.maxf,
+        "uni_ep": uni.ep, "uni_freq": uni.freq,
+        "bg_key": bg.key, "bg_start": bg.start, "bg_len": bg.length,
+        "bg_ep": bg.ep, "bg_freq": bg.freq,
+    }
+    _write_snapshot(path, {"generation": generation, "episodes": episodes}, sections)
+    return generation
+
+
+def _write_snapshot(path: Path, header: dict, sections: dict) -> None:
+    """
+    Écrit le fichier à côté puis le renomme (un lecteur ne voit jamais un fichier partiel).
+    Nom temporaire unique : plusieurs workers peuvent reconstruire le snapshot en même temps.
+    """
+    layout = {}
+    pos = 0
+    for name, arr in sections.items():
+        typecode = arr.typecode if isinstance(arr, array) else "B"
+        nbytes = len(arr) * (arr.itemsize if isinstance(arr, array) else 1)
+        layout[name] = [pos, typecode, nbytes]
+        pos += nbytes + (-nbytes % ALIGN)
+    head = json.dumps({**header, "sections": layout}).encode()
+    pad = -(len(MAGIC) + 8 + len(head)) % ALIGN
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(head)))
+            f.write(head)
+            f.write(b"\0" * pad)
+            for name, arr in sections.items():
+                f.write(arr)
+                f.write(b"\0" * (-layout[name][2] % ALIGN))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# ---------- Lecture du snapshot ----------
+
+class _SortedTexts:
+    """Vue "séquence" sur les textes triés du snapshot (pour bisect, sans copie)."""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+
+def _bitmaps(values) -> dict:
+    """valeur -> bitmap (int) des rangs d'épisodes qui ont cette valeur."""
+    values = list(values)
+    size = len(values) // 8 + 1
+    maps: dict = {}
+    for i, v in enumerate(values):
+        if v is not None:
+            m = maps.get(v)
+            if m is None:
+                m = maps[v] = bytearray(size)
+            m[i >> 3] |= 1 << (i & 7)
+    return {v: int.from_bytes(m, "little") for v, m in maps.items()}
+
+
+def _ranks(bits: int) -> list[int]:
+    """Bitmap -> rangs croissants."""
+    out = []
+    for i, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+        if byte:
+            base = i << 3
+            out.extend(base + j for j in range(8) if byte >> j & 1)
+    return out
+
+
+class MemoryIndex:
+    def __init__(self, header: dict, arrays: dict, mm: mmap.mmap | None = None):
+        self.generation = header["generation"]
+        self.episodes = header["episodes"]
+        self.vocab = _SortedTexts(arrays["vocab_blob"], arrays["vocab_off"])
+        self.a = arrays
+        self._mm = mm   # garde le mapping ouvert tant que l'index est utilisé
+        self.show_bits = _bitmaps(e["show_name"] for e in self.episodes)
+        self.season_bits = _bitmaps(e["season"] for e in self.episodes)
+        self._selections: dict[EpisodeFilter, tuple[list[int], bytearray]] = {}
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "episodes": len(self.episodes),
+            "vocabulary": len(self.vocab),
+            "postings": len(self.a["uni_ep"]),
+            "bigram_postings": len(self.a["bg_ep"]),
+        }
+
+    def allowed(self, flt: EpisodeFilter) -> tuple[list[int], bytearray]:
+        """
+        Sélection du filtre : rangs (croissants) des épisodes retenus (ET des bitmaps série /
+        saison) et masque (1 octet par épisode) ; calculée une fois par filtre et par snapshot.
+        """
+        sel = self._selections.get(flt)
+        if sel is not None:
+            return sel
+        bits = (1 << len(self.episodes)) - 1
+        if flt.show is not None:
+            bits &= self.show_bits.get(flt.show, 0)
+        if flt.season is not None:
+            bits &= self.season_bits.get(flt.season, 0)
+        ranks = _ranks(bits)
+        if flt.episode_range is not None:
+            ranks = [i for i in ranks if flt.accepts(self.episodes[i])]
+        mask = bytearray(len(self.episodes))
+        for i in ranks:
+            mask[i] = 1
+        if len(self._selections) >= FILTER_CACHE_SIZE:
+            self._selections.pop(next(iter(self._selections)), None)
+        self._selections[flt] = sel = (ranks, mask)
+        return sel
+
+    def lookup(self, word: str) -> int | None:
+        """Rang du mot dans le vocabulaire (None si inconnu)."""
+        w = word.encode()
+        i = bisect_left(self.vocab, w)
+        if i < len(self.vocab) and self.vocab[i] == w:
+            return i
+        return None
+
+    @staticmethod
+    def _postings(keys, starts, lengths, key: int) -> tuple[int, int]:
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return starts[i], starts[i] + lengths[i]
+        return 0, 0
+
+    def _row(self, ep: int, matched: int, score: float, match_type: str) -> dict:
+        return {
+            **self.episodes[ep],
+            "matched_terms": matched,
+            "tfidf": score,
+            "score": score,
+            "match_type": match_type,
+        }
+
+    def _terms(self, tokens: list[str]) -> tuple[list, list[tuple]]:
+        """
+        (rangs des mots dans le vocabulaire, termes distincts) ; un terme = (poids, début, fin, borne)
+        avec poids = idf x nb d'occurrences dans la requête (comme la jointure SQL) et
+        borne = fréquence max x poids.
+        """
+        a = self.a
+        q = [self.lookup(t) for t in tokens]
+        terms = []
+        for vi, mult in Counter(v for v in q if v is not None).items():
+            w = a["vocab_idf"][vi] * mult
+            k = bisect_left(a["uni_key"], a["vocab_id"][vi])
+            if k < len(a["uni_key"]) and a["uni_key"][k] == a["vocab_id"][vi]:
+                s = a["uni_start"][k]
+                terms.append((w, s, s + a["uni_len"][k], a["uni_maxf"][k] * w))
+            else:
+                terms.append((w, 0, 0, 0.0))
+        return q, terms
+
+    @staticmethod
+    def _score(terms: list[tuple], found: dict[int, int]) -> float:
+        score = 0.0
+        for i, t in enumerate(terms):
+            f = found.get(i)
+            if f is not None:
+                score += f * t[0]
+        return score
+
+    def _hits(self, s: int, e: int, sel: tuple | None):
+        """
+        (épisode, fréquence) de la liste [s, e), par épisode croissant, restreints à la sélection
+        d'un filtre : épisodes retenus sondés par bisect s'ils sont peu nombreux devant la
+        liste, sinon parcours de la liste filtré par le masque.
+        """
+        eps, freqs = self.a["uni_ep"], self.a["uni_freq"]
+        if sel is None:
+            return zip(eps[s:e], freqs[s:e])
+        ranks, mask = sel
+        if len(ranks) * PROBE_FACTOR < e - s:
+            return self._probe(s, e, ranks)
+        return ((ep, f) for ep, f in zip(eps[s:e], freqs[s:e]) if mask[ep])
+
+    def _probe(self, s: int, e: int, ranks: list[int]):
+        eps, freqs = self.a["uni_ep"], self.a["uni_freq"]
+        lo = s
+        for ep in ranks:
+            lo = bisect_left(eps, ep, lo, e)
+            if lo == e:
+                return
+            if eps[lo] == ep:
+                yield ep, freqs[lo]
+
+    def _top_and(self, terms: list[tuple], k: int, sel: tuple | None = None) -> list[tuple]:
+        """
+        Épisodes contenant tous les termes : la liste la plus courte (restreinte à la sélection
+        d'un filtre) guide l'intersection.
+        """
+        eps, freqs = self.a["uni_ep"], self.a["uni_freq"]
+        by_len = sorted(range(len(terms)), key=lambda i: terms[i][2] - terms[i][1])
+        lead, others = by_len[0], by_len[1:]
+        cur = [t[1] for t in terms]
+        heap: list[tuple] = []   # (score, -ep), les k meilleurs
+        for d, f in self._hits(terms[lead][1], terms[lead][2], sel):
+            found = {lead: f}
+            for i in others:
+                j = bisect_left(eps, d, cur[i], terms[i][2])
+                cur[i] = j
+                if j == terms[i][2] or eps[j] != d:
+                    break
+                found[i] = freqs[j]
+            else:
+                key = (self._score(terms, found), -d)
+                if len(heap) < k:
+                    heapq.heappush(heap, key)
+                elif key > heap[0]:
+                    heapq.heapreplace(heap, key)
+        return [(len(terms), score, neg_ep) for score, neg_ep in sorted(heap, reverse=True)]
+
+    @staticmethod
+    def _may_enter(matched: int, score: float, worst: tuple) -> bool:
+        """Un épisode borné par (matched, score) peut-il battre le moins bon du pool ?"""
+        if matched != worst[0]:
+            return matched > worst[0]
+        return score * (1 + 1e-9) >= worst[1]   # marge pour les arrondis flottants
+
+    def _top_or(self, terms: list[tuple], k: int, sel: tuple | None = None) -> list[tuple]:
+        """
+        Top-k OR (matched_terms puis score) par MaxScore, terme par terme, parmi les épisodes
+        de la sélection d'un filtre s'il y en a une (les bornes restent valables).
+        Les termes sont traités par borne décroissante (mots rares d'abord). Dès qu'un épisode
+        absent des accumulateurs ne peut plus entrer dans le pool, même avec la borne de tous
+        les termes restants, les listes restantes ne créent plus de candidats : les candidats
+        sans chance sont éliminés et les survivants sont sondés par bisect (ou par un parcours
+        si la liste est courte) au lieu de parcourir la liste d'un mot fréquent.
+        """
+        eps, freqs = self.a["uni_ep"], self.a["uni_freq"]
+        n = len(terms)
+        order = sorted(range(n), key=lambda i: -terms[i][3])
+        rest = [0.0] * (n + 1)   # rest[j] = somme des bornes des termes order[j:]
+        for j in range(n - 1, -1, -1):
+            rest[j] = rest[j + 1] + terms[order[j]][3]
+
+        matched: dict[int, int] = {}   # épisode -> nb de termes trouvés
+        score: dict[int, float] = {}   # épisode -> score
+        for j, i in enumerate(order):
+            w, s, e, _ = terms[i]
+            remaining = n - j
+            theta = None
+            if len(score) >= k:
+                theta = heapq.nlargest(k, zip(matched.values(), score.values()))[-1]
+
+            if theta is None or self._may_enter(remaining, rest[j], theta):
+                for ep, f in self._hits(s, e, sel):
+                    if ep in score:
+                        score[ep] += f * w
+                        matched[ep] += 1
+                    else:
+                        score[ep] = f * w
+                        matched[ep] = 1
+                continue
+
+            # plus de nouveaux candidats : on retire ceux qui ne peuvent plus entrer
+            for ep in [ep for ep, m in matched.items()
+                       if not self._may_enter(m + remaining, score[ep] + rest[j], theta)]:
+                del matched[ep], score[ep]
+            if len(score) * PROBE_FACTOR < e - s:
+                lo = s
+                for ep in sorted(score):
+                    lo = bisect_left(eps, ep, lo, e)
+                    if lo == e:
+                        break
+                    if eps[lo] == ep:
+                        score[ep] += freqs[lo] * w
+                        matched[ep] += 1
+            else:
+                for ep, f in zip(eps[s:e], freqs[s:e]):
+                    if ep in score:
+                        score[ep] += f * w
+                        matched[ep] += 1
+
+        return heapq.nlargest(k, ((matched[ep], sc, -ep) for ep, sc in score.items()))
+
+    def _scan_all(self, terms: list[tuple], sel: tuple | None = None) -> tuple[dict, dict]:
+        """Parcours exhaustif de toutes les listes (référence, sans élagage)."""
+        score: dict[int, float] = {}
+        matched: dict[int, int] = {}
+        for w, s, e, _ in terms:
+            for ep, f in self._hits(s, e, sel):
+                score[ep] = score.get(ep, 0.0) + f * w
+                matched[ep] = matched.get(ep, 0) + 1
+        return score, matched
+
+    @staticmethod
+    def _select(score: dict, matched: dict, n: int, use_and: bool, pool: int) -> tuple[list, list]:
+        """Top AND (tous les n termes) puis OR pour compléter, depuis des scores complets."""
+        top_and = []
+        if use_and:
+            best = heapq.nsmallest(
+                pool, (ep for ep, m in matched.items() if m == n), key=lambda ep: (-score[ep], ep)
+            )
+            top_and = [(n, score[ep], -ep) for ep in best]
+        remaining = pool - len(top_and)
+        top_or = []
+        if remaining > 0:
+            best = heapq.nsmallest(remaining, matched, key=lambda ep: (-matched[ep], -score[ep], ep))
+            top_or = [(matched[ep], score[ep], -ep) for ep in best]
+        return top_and, top_or
+
+    def candidates(
+        self,
+        tokens: list[str],
+        or_only: bool,
+        pool: int,
+        pruning: bool = True,
+        flt: EpisodeFilter | None = None,
+    ) -> tuple[list[dict], list[dict]]:
+        """
+        Équivalent de _query_and / _query_or : (lignes AND, lignes OR), même ordre de tri
+        (AND : tfidf ; OR : matched_terms puis tfidf ; égalités départagées par id d'épisode),
+        `pool` lignes au plus en tout. pruning=False : parcours exhaustif (référence / benchmark).
+        flt : seuls les épisodes retenus par le filtre sont candidats.
+        """
+        q, terms = self._terms(tokens)
+        if not terms:
+            return [], []
+        # AND strict : tous les mots connus et distincts
+        use_and = not or_only and None not in q and len(set(q)) == len(q)
+
+        sel = self.allowed(flt) if flt is not None and flt.active else None
+        if pruning:
+            top_and = self._top_and(terms, pool, sel) if use_and else []
+            remaining = pool - len(top_and)
+            top_or = self._top_or(terms, remaining, sel) if remaining > 0 else []
+        else:
+            score, matched = self._scan_all(terms, sel)
+            top_and, top_or = self._select(score, matched, len(q), use_and, pool)
+
+        rows_and = [self._row(-d, m, score, "AND") for m, score, d in top_and]
+        rows_or = [self._row(-d, m, score, "OR") for m, score, d in top_or]
+        return rows_and, rows_or
+
+    def bigram_boosts(self, episode_ids: list[int], pairs: list[tuple[str, str]]) -> dict[int, int]:
+        """Occurrences des bigrammes de la requête, par épisode candidat (episode_id -> freq)."""
+        a = self.a
+        wanted = set(episode_ids)
+        boosts: dict[int, int] = {}
+        keys = set()
+        for t1, t2 in pairs:
+            v1, v2 = self.lookup(t1), self.lookup(t2)
+            if v1 is not None and v2 is not None:
+                keys.add((a["vocab_id"][v1] << 32) | a["vocab_id"][v2])
+        for key in keys:
+            s, e = self._postings(a["bg_key"], a["bg_start"], a["bg_len"], key)
+            for ep, f in zip(a["bg_ep"][s:e], a["bg_freq"][s:e]):
+                ep_id = self.episodes[ep]["id"]
+                if ep_id in wanted:
+                    boosts[ep_id] = boosts.get(ep_id, 0) + f
+        return boosts
+
+
+def load_snapshot(path: Path) -> MemoryIndex:
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIC)] != MAGIC:
+        mm.close()
+        raise ValueError(f"snapshot invalide: {path}")
+    (hlen,) = struct.unpack_from("<Q", mm, len(MAGIC))
+    start = len(MAGIC) + 8
+    header = json.loads(mm[start:start + hlen])
+    base = start + hlen
+    base += -base % ALIGN
+    view = memoryview(mm)
+    arrays = {
+        name: view[base + off:base + off + nbytes].cast(typecode)
+        for name, (off, typecode, nbytes) in header["sections"].items()
+    }
+    return MemoryIndex(header, arrays, mm)
+
+
+# ---------- Moteur courant (un par process) ----------
+
+_engine: MemoryIndex | None = None
+_lock = threading.Lock()
+_state = {
+    "building": False,
+    "source": None,        # "snapshot" (fichier réutilisé) ou "sql" (reconstruit)
+    "loaded_at": None,
+    "load_s": None,
+    "last_error": None,
+    "failed_at": None,
+}
+
+
+def enabled() -> bool:
+    return SEARCH_ENGINE == "memory"
+
+
+def get_engine() -> MemoryIndex | None:
+    """
+    Index en mémoire à jour, ou None (désactivé, pas encore chargé, génération dépassée :
+    une reconstruction est alors lancée en tâche de fond et l'appelant passe par SQL).
+    """
+    if not enabled():
+        return None
+    try:
+        gen = current_generation()
+    except Exception:
+        return None
+    eng = _engine
+    if eng is not None and eng.generation >= gen:
+        return eng
+    refresh_async()
+    return None
+
+
+def refresh_async(force: bool = False) -> bool:
+    """Lance un (re)chargement en tâche de fond ; False si un chargement est déjà en cours."""
+    with _lock:
+        if _state["building"]:
+            return False
+        failed_at = _state["failed_at"]
+        if not force and failed_at is not None and time.time() - failed_at < RETRY_AFTER_S:
+            return False
+        _state["building"] = True
+    threading.Thread(target=_refresh, args=(force,), daemon=True, name="search-engine").start()
+    return True
+
+
+def _refresh(force: bool) -> None:
+    global _engine
+    t0 = time.perf_counter()
+    try:
+        path = Path(SEARCH_SNAPSHOT)
+        with get_connection() as conn, conn.cursor() as cur:
+            gen = read_generation(cur)
+        conn.close()
+
+        eng = None
+        if not force and path.exists():
+            try:
+                eng = load_snapshot(path)
+            except (OSError, ValueError):
+                eng = None
+            if eng is not None and eng.generation < gen:
+                eng = None
+        source = "snapshot"
+        if eng is None:
+            build_snapshot(path)
+            eng = load_snapshot(path)
+            source = "sql"
+
+        _engine = eng
+        _state.update(
+            source=source, loaded_at=time.time(), load_s=round(time.perf_counter() - t0, 3),
+            last_error=None, failed_at=None,
+        )
+    except Exception as e:
+        _state.update(last_error=f"{type(e).__name__}: {e}", failed_at=time.time())
+    finally:
+        _state["building"] = False
+
+
+def start() -> None:
+    """Au démarrage de l'API : charge le snapshot (ou le construit) en tâche de fond."""
+    if enabled():
+        refresh_async()
+
+
+def status() -> dict:
+    eng = _engine
+    return {
+        "enabled": enabled(),
+        "snapshot": SEARCH_SNAPSHOT,
+        **_state,
+        "index": eng.stats if eng is not None else None,
+    }
@@ -0,0 +1,78 @@
+# app/services/show_tokens.py
+"""
+Agrégat par série de unigram_counts : show_token_counts(show_name, token_id, freq).
+Lu par /user/recommend au lieu de ré-agréger tous les épisodes ; tfidf = freq * idf y est
+calculé à la lecture (jointure token_df), rien à réécrire quand l'IDF change.
+
+- après un chargement en masse : refresh_show_tokens() (ensembliste)
+- à l'unité (index_srt, suppression) : apply_show_delta() sur les seuls tokens de l'épisode
+"""
+from __future__ import annotations
+from collections import Counter
+from io import StringIO
+
+
+def refresh_show_tokens(cur) -> int:
+    """Reconstruit tout l'agrégat depuis unigram_counts. Renvoie le nb de lignes."""
+    cur.execute(
+        """
+        TRUNCATE show_token_counts;
+        INSERT INTO show_token_counts (show_name, token_id, freq)
+        SELECT e.show_name, u.token_id, SUM(u.freq)
+        FROM unigram_counts u
+        JOIN episodes e ON e.id = u.episode_id
+        WHERE e.show_name IS NOT NULL
+        GROUP BY e.show_name, u.token_id;
+        """
+    )
+    return cur.rowcount
+
+
+def show_delta(old_show: str | None, old_counts: Counter, new_show: str | None, new_counts: Counter) -> Counter:
+    """Variation (show, token_id) -> freq quand un épisode passe de (old_show, old_counts) à (new_show, new_counts)."""
+    delta: Counter = Counter()
+    if old_show is not None:
+        for tok, f in old_counts.items():
+            delta[(old_show, tok)] -= f
+    if new_show is not None:
+        for tok, f in new_counts.items():
+            delta[(new_show, tok)] += f
+    return delta
+
+
+def apply_show_delta(cur, delta: Counter) -> int:
+    """Ajoute des variations de fréquence par (série, token)."""
+    rows = [(show, tok, d) for (show, tok), d in delta.items() if d]
+    if not rows:
+        return 0
+
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS stage_show_tokens
+          (show_name TEXT, token_id INT, delta BIGINT) ON COMMIT DELETE ROWS;
+        """
+    )
+    buf = StringIO()
+    for show, tok, d in rows:
+        # noms de séries : on échappe ce que COPY (format texte) interprète
+        show = show.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+        buf.write(f"{show}\t{tok}\t{d}\n")
+    buf.seek(0)
+    cur.copy_from(buf, "stage_show_tokens", columns=("show_name", "token_id", "delta"))
+    cur.execute(
+        """
+        INSERT INTO show_token_counts (show_name, token_id, freq)
+        SELECT show_name, token_id, SUM(delta)
+        FROM stage_show_tokens
+        GROUP BY show_name, token_id
+        ON CONFLICT (show_name, token_id)
+        DO UPDATE SET freq = show_token_counts.freq + EXCLUDED.freq;
+
+        DELETE FROM show_token_counts s
+        USING stage_show_tokens d
+        WHERE s.show_name = d.show_name AND s.token_id = d.token_id AND s.freq <= 0;
+
+        TRUNCATE stage_show_tokens;
+        """
+    )
+    return len(rows)
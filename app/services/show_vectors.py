@@ -0,0 +1,238 @@
+# app/services/show_vectors.py
+"""
+Similarité entre séries pour /user/recommend : matrice creuse série x token (TF-IDF =
+freq de show_token_counts x idf de token_df) aux lignes normalisées L2, construite en
+mémoire une fois par génération d'index (tâche de fond, comme fuzzy / suggest).
+
+Profil d'un utilisateur = somme des vecteurs de ses séries aimées, pondérés par la note,
+chacun réduit à ses `top_tokens` meilleurs tokens éligibles (mots alphabétiques de 4 lettres
+ou plus, IDF dans la fenêtre demandée). Score d'une série = produit scalaire de son vecteur
+normalisé avec le profil : un seul produit matrice creuse x vecteur, sur les seules colonnes
+du profil (stockage par colonne, np.bincount), quelle que soit la taille du corpus.
+
+NumPy est optionnel : sans lui (ou tant que la matrice n'est pas prête), /user/recommend
+calcule le même score en SQL (cf. app/api/recommend.py).
+"""
+from __future__ import annotations
+import io
+import re
+
+try:
+    import numpy as np
+except ImportError:  # /user/recommend passe alors par SQL
+    np = None
+
+from app.core.db import get_connection
+from app.services.index_state import GenerationalIndex, read_generation
+
+RECO_WORD = re.compile(r"^[a-z]{4,}$")   # tokens éligibles au profil (hors noms courts, chiffres...)
+
+
+def spans(ptr: np.ndarray, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Indices bout à bout des tranches ptr[k]:ptr[k+1] des clés demandées, et longueur de chacune."""
+    starts = ptr[keys]
+    lens = ptr[keys + 1] - starts
+    return np.arange(lens.sum()) + np.repeat(starts - (np.cumsum(lens) - lens), lens), lens
+
+
+def rating_weight(rating: int, min_rating: int) -> int:
+    """Poids d'une série aimée dans le profil : 1 pour la note minimale, +1 par point au-dessus."""
+    return rating - min_rating + 1
+
+
+class ShowVectors:
+    def __init__(self, generation: int, shows: list[str], tokens: list[tuple[int, str, float]], coo):
+        """
+        shows = noms (rang = ligne) ; tokens = (id, texte, idf) triés par id (rang = colonne) ;
+        coo = (lignes, colonnes, tfidf) des cellules non nulles.
+        """
+        self.generation = generation
+        self.shows = shows
+        self.show_index = {name: i for i, name in enumerate(shows)}
+        self.idf = np.array([idf for _, _, idf in tokens], dtype=np.float64)
+        self.word_ok = np.array([bool(RECO_WORD.match(text)) for _, text, _ in tokens], dtype=bool)
+
+        row, col, val = coo
+        n_shows, n_tokens = len(shows), len(tokens)
+        norms = np.sqrt(np.bincount(row, weights=val * val, minlength=n_shows))
+        val = val / norms[row]
+
+        # par ligne : tokens par poids décroissant (puis id) -> top_tokens = tranche du début
+        order = np.lexsort((col, -val, row))
+        self.r_ptr = np.searchsorted(row[order], np.arange(n_shows + 1))
+        self.r_col = col[order]
+        self.r_val = val[order]
+
+        # par colonne : séries contenant le token (produit matrice x profil)
+        order = np.lexsort((row, col))
+        self.c_ptr = np.searchsorted(col[order], np.arange(n_tokens + 1))
+        self.c_row = row[order]
+        self.c_val = val[order]
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "shows": len(self.shows),
+            "tokens": len(self.idf),
+            "nonzero": len(self.c_val),
+        }
+
+    def profile(
+        self, liked: list[tuple[str, float]], top_tokens: int, idf_min: float, idf_max: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """(colonnes, poids) du profil : meilleurs tokens éligibles de chaque série aimée, pondérés."""
+        eligible = self.word_ok & (self.idf >= idf_min) & (self.idf <= idf_max)
+        cols, vals = [], []
+        for name, weight in liked:
+            i = self.show_index.get(name)
+            if i is None:
+                continue
+            s, e = self.r_ptr[i], self.r_ptr[i + 1]
+            keep = eligible[self.r_col[s:e]]
+            cols.append(self.r_col[s:e][keep][:top_tokens])
+            vals.append(self.r_val[s:e][keep][:top_tokens] * weight)
+        if not cols:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        ucols, inverse = np.unique(np.concatenate(cols), return_inverse=True)
+        return ucols, np.bincount(inverse, weights=np.concatenate(vals))
+
+    def scores(self, cols: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Matrice normalisée x profil, en ne lisant que les colonnes du profil."""
+        idx, lens = spans(self.c_ptr, cols)
+        return np.bincount(
+            self.c_row[idx], weights=self.c_val[idx] * np.repeat(weights, lens), minlength=len(self.shows)
+        )
+
+    def affinity(
+        self, top_tokens: int, idf_min: float, idf_max: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Matrice creuse série x série (ptr, colonnes, valeurs, par ligne) : ligne i = scores non
+        nuls pour le seul profil de la série i (poids 1). Le score est linéaire en les poids du
+        profil : scores d'un utilisateur = somme des lignes de ses séries aimées pondérées
+        (calcul en masse, cf. reco_batch.py). Taille = nb de paires de séries qui partagent
+        un token de profil, pas n_séries².
+        """
+        ptr, cols_out, vals_out = [0], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        for name in self.shows:
+            cols, weights = self.profile([(name, 1)], top_tokens, idf_min, idf_max)
+            idx, lens = spans(self.c_ptr, cols)
+            rows, inverse = np.unique(self.c_row[idx], return_inverse=True)
+            cols_out.append(rows)
+            vals_out.append(np.bincount(inverse, weights=self.c_val[idx] * np.repeat(weights, lens)))
+            ptr.append(ptr[-1] + len(rows))
+        return (
+            np.array(ptr, dtype=np.int64),
+            np.concatenate(cols_out).astype(np.int64),
+            np.concatenate(vals_out).astype(np.float64),
+        )
+
+    def top(self, scores: np.ndarray, exclude: list[str], limit: int) -> list[dict]:
+        """Meilleures séries d'un vecteur de scores (séries exclues, scores nuls ignorés)."""
+        scores = scores.copy()
+        for name in exclude:
+            i = self.show_index.get(name)
+            if i is not None:
+                scores[i] = 0.0
+        # poids tous > 0 : score > 0 <=> la série partage au moins un token du profil
+        cand = np.flatnonzero(scores > 0)
+        # score décroissant, puis nom (les lignes sont dans l'ordre des noms)
+        best = cand[np.argsort(-scores[cand], kind="stable")][:limit]
+        return [{"show_name": self.shows[i], "score": float(scores[i])} for i in best]
+
+    def recommend(
+        self,
+        liked: list[tuple[str, float]],
+        limit: int,
+        top_tokens: int,
+        idf_min: float,
+        idf_max: float,
+    ) -> list[dict]:
+        """Séries les plus proches du profil (séries aimées exclues) : [{show_name, score}]."""
+        cols, weights = self.profile(liked, top_tokens, idf_min, idf_max)
+        if not len(cols):
+            return []
+        return self.top(self.scores(cols, weights), [name for name, _ in liked], limit)
+
+
+def build_index() -> ShowVectors:
+    conn = get_connection()
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        with conn.cursor() as cur:
+            gen = read_generation(cur)
+            cur.execute(
+                """
+                SELECT DISTINCT s.show_name
+                FROM show_token_counts s
+                JOIN token_df t ON t.token_id = s.token_id
+                WHERE t.idf > 0
+                ORDER BY s.show_name;
+                """
+            )
+            shows = [r["show_name"] for r in cur.fetchall()]
+            cur.execute(
+                """
+                SELECT k.id, k.text, COALESCE(d.idf, 0.0) AS idf
+                FROM tokens k
+                LEFT JOIN token_df d ON d.token_id = k.id
+                WHERE EXISTS (SELECT 1 FROM show_token_counts s WHERE s.token_id = k.id)
+                ORDER BY k.id;
+                """
+            )
+            tokens = [(r["id"], r["text"], r["idf"]) for r in cur.fetchall()]
+            # rang de la série (même ordre que `shows`) plutôt que son nom : rien à déséchapper
+            buf = io.StringIO()
+            cur.copy_expert(
+                """
+                COPY (
+                  SELECT DENSE_RANK() OVER (ORDER BY s.show_name) - 1, s.token_id, s.freq * t.idf
+                  FROM show_token_counts s
+                  JOIN token_df t ON t.token_id = s.token_id
+                  WHERE t.idf > 0
+                ) TO STDOUT
+                """,
+                buf,
+            )
+        conn.rollback()
+    finally:
+        conn.close()
+
+    rows, token_ids, values = [], [], []
+    for line in buf.getvalue().splitlines():
+        r, tok, val = line.split("\t")
+        rows.append(int(r))
+        token_ids.append(int(tok))
+        values.append(float(val))
+    col_of = {tid: j for j, (tid, _, _) in enumerate(tokens)}
+    coo = (
+        np.array(rows, dtype=np.int64),
+        np.array([col_of[t] for t in token_ids], dtype=np.int64),
+        np.array(values, dtype=np.float64),
+    )
+    return ShowVectors(gen, shows, tokens, coo)
+
+
+# ---------- Matrice courante (une par process) ----------
+
+_index = GenerationalIndex("show-vectors", build_index)
+
+
+def available() -> bool:
+    return np is not None
+
+
+def get_index() -> ShowVectors | None:
+    """Matrice courante (une génération de retard possible) ; None sans NumPy ou avant la première."""
+    return _index.get() if np is not None else None
+
+
+def start() -> None:
+    """Au démarrage de l'API : construction de la matrice en tâche de fond (si NumPy est installé)."""
+    if np is not None:
+        _index.refresh_async()
+
+
+def status() -> dict:
+    return {"numpy": np is not None, **_index.status()}
@@ -0,0 +1,102 @@
+# app/services/snippets.py
+"""
+Extraits des résultats de /search : le bloc de sous-titres qui contient le plus de mots
+de la requête (les phrases entre guillemets d'abord), son texte avec les mots surlignés
+et son timecode ("aller à 00:12:34").
+
+Aucun fichier n'est reparsé ni retokenisé : les positions des mots (token_positions)
+sont situées dans les blocs grâce à episode_cues (cf. cues.py), puis seul le bloc retenu
+est relu dans la source. Une requête SQL pour toute la page de résultats.
+"""
+from __future__ import annotations
+import re
+from collections import Counter
+
+from app.core.db import execute_prepared, pooled_connection
+from app.services.cues import CueTable, read_cue_text, timecode
+from app.services.normalize import normalize_line
+from app.services.positions import decode_positions, phrase_starts
+
+# $1 = épisodes de la page, $2 = mots de la requête : table des blocs + positions des mots
+SNIPPETS_SQL = """
+SELECT c.episode_id, e.file_path,
+       c.codec, c.numbers, c.starts_ms, c.offsets, c.token_starts,
+       k.text, p.positions
+FROM episode_cues c
+JOIN episodes e             ON e.id = c.episode_id
+LEFT JOIN tokens k          ON k.text = ANY($2::text[])
+LEFT JOIN token_positions p ON p.episode_id = c.episode_id AND p.token_id = k.id
+WHERE c.episode_id = ANY($1::int[])
+"""
+
+_WORD = re.compile(r"\S+")
+
+
+def best_cue(table: CueTable, positions: dict[str, list[int]], phrases: list[list[str]]) -> int | None:
+    """
+    Bloc à montrer : le plus d'occurrences de phrases, puis de mots distincts de la requête,
+    puis d'occurrences ; le premier en cas d'égalité. None si aucun mot n'est dans l'épisode.
+    """
+    words: dict[int, set[str]] = {}
+    hits: Counter = Counter()
+    for text, lst in positions.items():
+        for p in lst:
+            k = table.cue_at(p)
+            words.setdefault(k, set()).add(text)
+            hits[k] += 1
+    if not words:
+        return None
+    phrase_hits: Counter = Counter()
+    for phrase in phrases:
+        for p in phrase_starts([positions.get(t, []) for t in phrase]):
+            phrase_hits[table.cue_at(p)] += 1
+    return max(words, key=lambda k: (phrase_hits[k], len(words[k]), hits[k], -k))
+
+
+def highlights(text: str, tokens: set[str]) -> list[list[int]]:
+    """Plages [début, fin[ des mots du texte dont la forme normalisée est un mot de la requête."""
+    return [
+        [m.start(), m.end()]
+        for m in _WORD.finditer(text)
+        if not tokens.isdisjoint(normalize_line(m.group()))
+    ]
+
+
+def page_snippets(
+    episode_ids: list[int], tokens: list[str], phrases: list[list[str]]
+) -> dict[int, dict]:
+    """Extrait de chaque épisode : {cue, start_ms, timecode, text, highlights} (clé = id)."""
+    if not episode_ids or not tokens:
+        return {}
+    with pooled_connection() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "search_snippets", SNIPPETS_SQL, (episode_ids, list(dict.fromkeys(tokens))))
+        fetched = cur.fetchall()
+
+    tables: dict[int, CueTable] = {}
+    files: dict[int, str] = {}
+    positions: dict[int, dict[str, list[int]]] = {}
+    for r in fetched:
+        ep = r["episode_id"]
+        if ep not in tables:
+            tables[ep] = CueTable.from_row(r)
+            files[ep] = r["file_path"]
+            positions[ep] = {}
+        if r["positions"] is not None:
+            positions[ep][r["text"]] = decode_positions(r["positions"])
+
+    wanted = set(tokens)
+    out = {}
+    for ep, table in tables.items():
+        k = best_cue(table, positions[ep], phrases)
+        if k is None:
+            continue
+        text = read_cue_text(files[ep], table, k)
+        start = table.start_ms(k)
+        out[ep] = {
+            "cue": table.number(k),
+            "start_ms": start,
+            "timecode": timecode(start),
+            "text": text,
+            "highlights": highlights(text, wanted) if text else [],
+        }
+    return out
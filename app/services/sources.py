@@ -0,0 +1,104 @@
+# app/services/sources.py
+"""
+Sources de sous-titres : fichiers .srt "à plat" ou membres d'archives .zip / .7z,
+lus directement en mémoire (plus besoin de scripts/extract_archives.py).
+
+Un membre d'archive est identifié par la clé stable "chemin/archive.zip!dossier/membre.srt",
+utilisée comme file_path dans la table episodes (la réindexation incrémentale marche pareil).
+"""
+from __future__ import annotations
+import zipfile
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import py7zr  # type: ignore
+except ImportError:  # .7z ignorés si py7zr n'est pas installé
+    py7zr = None
+
+ARCHIVE_SEP = "!"
+ARCHIVE_SUFFIXES = (".zip", ".7z")
+
+
+def is_archive(path) -> bool:
+    suffix = Path(path).suffix.lower()
+    return suffix == ".zip" or (suffix == ".7z" and py7zr is not None)
+
+
+def member_key(archive, member: str) -> str:
+    return f"{archive}{ARCHIVE_SEP}{member}"
+
+
+def split_key(key: str) -> tuple[str, str | None]:
+    """'a/b.zip!x/y.srt' -> ('a/b.zip', 'x/y.srt') ; un chemin simple -> (chemin, None)."""
+    lower = key.lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        i = lower.find(suffix + ARCHIVE_SEP)
+        if i >= 0:
+            cut = i + len(suffix)
+            return key[:cut], key[cut + 1:]
+    return key, None
+
+
+def list_archive(archive: Path) -> list[dict]:
+    """Membres .srt d'une archive : nom + taille décompressée (lecture de l'index seulement)."""
+    if archive.suffix.lower() == ".zip":
+        with zipfile.ZipFile(archive) as zf:
+            return [
+                {"member": info.filename, "size": info.file_size}
+                for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".srt")
+            ]
+    with py7zr.SevenZipFile(archive, mode="r") as z:
+        return [
+            {"member": info.filename, "size": info.uncompressed}
+            for info in z.list()
+            if not info.is_directory and info.filename.lower().endswith(".srt")
+        ]
+
+
+def read_archive(archive: Path, members: list[str]) -> Iterator[tuple[str, bytes]]:
+    """Lit en mémoire les membres demandés (une seule ouverture de l'archive)."""
+    if archive.suffix.lower() == ".zip":
+        with zipfile.ZipFile(archive) as zf:
+            for name in members:
+                yield name, zf.read(name)
+        return
+
+    with py7zr.SevenZipFile(archive, mode="r") as z:
+        if hasattr(z, "read"):                       # py7zr < 1.0
+            for name, bio in z.read(targets=members).items():
+                yield name, bio.read()
+            return
+        from py7zr.io import BytesIOFactory          # py7zr >= 1.0
+        factory = BytesIOFactory(limit=1 << 30)
+        z.extract(targets=members, factory=factory)
+        for name in members:
+            out = factory.get(name)
+            out.seek(0)
+            yield name, out.read()
+
+
+def read_source(key: str) -> bytes:
+    """Contenu brut d'une source (chemin .srt ou clé archive!membre)."""
+    archive, member = split_key(key)
+    if member is None:
+        return Path(key).read_bytes()
+    for _, data in read_archive(Path(archive), [member]):
+        return data
+    raise FileNotFoundError(key)
+
+
+def stat_source(key: str) -> tuple[int, float]:
+    """
+    (taille, mtime) d'une source. Pour un membre d'archive : taille décompressée
+    et mtime de l'archive (un changement d'archive déclenche une vérification par hash).
+    """
+    archive, member = split_key(key)
+    st = Path(archive).stat()
+    if member is None:
+        return st.st_size, st.st_mtime
+    for m in list_archive(Path(archive)):
+        if m["member"] == member:
+            return m["size"], st.st_mtime
+    raise FileNotFoundError(key)
@@ -1,39 +1,220 @@
+import codecs
+import io
 import re
-from pathlib import Path
+from itertools import repeat
+from typing import Iterable, Iterator, NamedTuple
 
 # Ligne de timecode: 00:00:12,345 --> 00:00:14,210
-TIME_LINE = re.compile(r"\d{2}:\d{2}:\d{2},\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3}")
-
-def _read_text_guess_encoding(path: Path) -> str:
-    """Lit le fichier en essayant quelques encodages courants."""
-    for enc in ("utf-8", "utf-16", "cp1252", "latin-1"):
-        try:
-            return path.read_text(encoding=enc)
-        except Exception:
-            continue
-    # Dernier recours: ignore les erreurs
-    return path.read_text(encoding="utf-8", errors="ignore")
+TIME_LINE = re.compile(r"(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})")
+# Balises simples <i>...</i>, <font ...>, etc.
+TAGS = re.compile(r"<[^>]+>")
+
+SNIFF_BYTES = 64 * 1024  # échantillon lu pour deviner l'encodage
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),   # avant UTF-16 : même préfixe FF FE
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_CP1252_UNDEFINED = frozenset(b"\x81\x8d\x8f\x90\x9d")
+
+
+def timecode_to_ms(tc: str | None) -> int | None:
+    """'00:01:02,345' -> 62345"""
+    if tc is None:
+        return None
+    return int(tc[0:2]) * 3_600_000 + int(tc[3:5]) * 60_000 + int(tc[6:8]) * 1000 + int(tc[9:12])
+
 
-def srt_to_lines(file_path: str) -> list[str]:
+class Cue(NamedTuple):
+    """Un bloc de sous-titre : numéro, timecodes de début/fin, lignes de texte nettoyées."""
+    index: int | None
+    start: str | None     # "00:01:02,345" (converti à la demande, cf. start_ms)
+    end: str | None
+    lines: list[str]
+
+    @property
+    def start_ms(self) -> int | None:
+        return timecode_to_ms(self.start)
+
+    @property
+    def end_ms(self) -> int | None:
+        return timecode_to_ms(self.end)
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.lines)
+
+
+def sniff_encoding(sample: bytes) -> str:
     """
-    Retourne les lignes utiles (sans les numéros de blocs, ni timecodes, ni balises <i> ...>).
+    Devine l'encodage en une passe : BOM, sinon octets nuls (UTF-16 sans BOM),
+    sinon UTF-8 valide, sinon cp1252 (latin-1 si octets non définis en cp1252).
     """
-    path = Path(file_path)
-    raw = _read_text_guess_encoding(path)
+    for bom, enc in _BOMS:
+        if sample.startswith(bom):
+            return enc
+
+    if sample:
+        zeros_even = sample[0::2].count(0)
+        zeros_odd = sample[1::2].count(0)
+        if zeros_odd > len(sample) // 4:
+            return "utf-16-le"
+        if zeros_even > len(sample) // 4:
+            return "utf-16-be"
+
+    try:
+        # final=False : un caractère multi-octets coupé en fin d'échantillon n'est pas une erreur
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if _CP1252_UNDEFINED.intersection(sample):
+        return "latin-1"
+    return "cp1252"
+
+
+def _open_text(source) -> io.TextIOWrapper:
+    """Ouvre un .srt (chemin ou octets) en texte, encodage deviné sur un échantillon."""
+    if isinstance(source, (bytes, bytearray)):
+        buf = io.BufferedReader(io.BytesIO(source), buffer_size=SNIFF_BYTES)
+    else:
+        buf = open(source, "rb", buffering=SNIFF_BYTES)
+    enc = sniff_encoding(buf.peek(SNIFF_BYTES)[:SNIFF_BYTES])
+    return io.TextIOWrapper(buf, encoding=enc, errors="replace")
+
+
+def _iter_lines(f: io.TextIOWrapper, chunk_chars: int = SNIFF_BYTES) -> Iterator[str]:
+    """Lignes lues par gros blocs (splitlines en C) plutôt qu'une à une."""
+    rest = ""
+    while True:
+        chunk = f.read(chunk_chars)
+        if not chunk:
+            break
+        buf = rest + chunk
+        cut = buf.rfind("\n") + 1
+        # la fin du bloc peut couper une ligne : on la garde pour le bloc suivant
+        rest = buf[cut:]
+        yield from buf[:cut].splitlines()
+    if rest:
+        yield from rest.splitlines()
+
+
+def _parse_cues(rows: Iterable[tuple[int, str]]) -> Iterator[tuple[int, Cue]]:
+    """
+    Découpe en blocs des (offset, ligne) ; renvoie (offset de la 1re ligne du bloc, bloc).
+    Les numéros de blocs et timecodes sont extraits, les balises retirées du texte.
+    """
+    index = start = end = None
+    first = 0
     lines: list[str] = []
-    for line in raw.splitlines():
+    tags_sub = TAGS.sub
+    time_search = TIME_LINE.search
+
+    for offset, line in rows:
         line = line.strip()
         if not line:
+            if lines or start is not None or index is not None:
+                yield first, Cue(index, start, end, lines)
+                index = start = end = None
+                lines = []
             continue
+        if not (lines or start is not None or index is not None):
+            first = offset
         if line.isdigit():               # numéros de séquence
+            if lines or start is not None:
+                yield first, Cue(index, start, end, lines)
+                start = end = None
+                lines = []
+                first = offset
+            index = int(line) if line.isdecimal() else None
             continue
-        if TIME_LINE.search(line):       # timecodes
+        m = time_search(line) if "-->" in line else None
+        if m:                            # timecodes
+            if lines or start is not None:
+                yield first, Cue(index, start, end, lines)
+                index = None
+                lines = []
+                first = offset
+            start, end = m.groups()
             continue
-        # supprime les balises simples <i>...</i>, <font ...>, etc.
-        line = re.sub(r"<[^>]+>", "", line)
-        lines.append(line)
-    return lines
+        lines.append(tags_sub("", line) if "<" in line else line)
+
+    if lines or start is not None or index is not None:
+        yield first, Cue(index, start, end, lines)
+
+
+def iter_cues(source) -> Iterator[Cue]:
+    """
+    Parcourt un .srt (chemin ou octets) bloc par bloc, sans charger tout le fichier.
+    Les numéros de blocs et timecodes sont extraits, les balises retirées du texte.
+    """
+    with _open_text(source) as f:
+        for _, cue in _parse_cues(zip(repeat(0), _iter_lines(f))):
+            yield cue
+
+
+_SINGLE_BYTE = {"cp1252", "latin-1"}
+
+
+def _raw_codec(data: bytes, enc: str) -> tuple[str, int, str]:
+    """
+    Encodage deviné -> (codec sans BOM, taille du BOM, gestionnaire d'erreurs réversible :
+    une ligne décodée puis réencodée redonne exactement ses octets d'origine).
+    """
+    if enc == "utf-8-sig":
+        return "utf-8", len(codecs.BOM_UTF8), "surrogateescape"
+    if enc in ("utf-16", "utf-32"):
+        bom = 2 if enc == "utf-16" else 4
+        little = data[:bom] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF32_LE)
+        return f"{enc}-{'le' if little else 'be'}", bom, "surrogatepass"
+    if enc.startswith("utf-16"):
+        return enc, 0, "surrogatepass"
+    return enc, 0, "surrogateescape"
+
+
+def iter_cue_offsets(data: bytes) -> tuple[str | None, Iterator[tuple[int, Cue]]]:
+    """
+    Comme iter_cues (mêmes blocs, même texte), avec l'offset en octets du début de chaque
+    bloc dans `data` : un bloc peut ensuite être relu seul (cf. read_cue).
+    Renvoie (codec pour relire un bloc, itérateur de (offset, bloc)) ; codec None si
+    les octets ne se décodent pas de façon réversible (offsets inconnus, tous à 0).
+    """
+    codec, bom, errors = _raw_codec(data, sniff_encoding(data[:SNIFF_BYTES]))
+    try:
+        text = data[bom:].decode(codec, errors=errors)
+    except UnicodeError:
+        return None, ((0, cue) for cue in iter_cues(data))
+    single = codec in _SINGLE_BYTE
+
+    def lines() -> Iterator[tuple[int, str]]:
+        offset = bom
+        for line in text.splitlines(keepends=True):
+            yield offset, line
+            if single or (codec == "utf-8" and line.isascii()):
+                offset += len(line)
+            else:
+                offset += len(line.encode(codec, errors=errors))
+
+    return codec, _parse_cues(lines())
+
+
+def read_cue(data: bytes, codec: str) -> Cue | None:
+    """Relit un seul bloc (octets [offset du bloc, offset du suivant[ de la source)."""
+    text = data.decode(codec, errors="replace")
+    return next((cue for _, cue in _parse_cues(enumerate(text.splitlines()))), None)
+
+
+def srt_to_lines(file_path) -> list[str]:
+    """
+    Retourne les lignes utiles (sans les numéros de blocs, ni timecodes, ni balises <i> ...>).
+    Accepte un chemin ou le contenu brut (octets) du fichier.
+    """
+    return [line for cue in iter_cues(file_path) for line in cue.lines]
+
 
-def srt_to_text(file_path: str) -> str:
+def srt_to_text(file_path) -> str:
     """Texte concaténé sur une seule ligne (pratique pour les étapes suivantes)."""
     return " ".join(srt_to_lines(file_path))
@@ -0,0 +1,165 @@
+# app/services/suggest.py
+"""
+Autocomplétion de la barre de recherche : mots du vocabulaire indexé et noms de séries
+commençant par un préfixe, classés par DF (nb d'épisodes contenant le mot) / nb d'épisodes.
+
+Tableaux triés en mémoire (bisect : le préfixe délimite une plage contiguë). Pour les
+préfixes courts dont la plage dépasse SCAN_MAX entrées, le top est précalculé à la
+construction : une requête ne trie jamais plus de SCAN_MAX entrées.
+Les noms de séries sont aussi indexés à partir de chacun de leurs mots ("dead" -> The Walking Dead).
+Reconstruit en tâche de fond quand la génération de l'index change.
+"""
+from __future__ import annotations
+from bisect import bisect_left
+
+from app.core.db import get_connection
+from app.services.index_state import GenerationalIndex, read_generation
+from app.services.normalize import fold
+
+SUGGEST_LIMIT = 8      # suggestions de mots par défaut
+SUGGEST_MAX = 20       # limite max acceptée (= taille des tops précalculés)
+SCAN_MAX = 256         # plage max triée à la volée
+_END = "\U0010ffff"    # borne haute d'une plage de préfixe
+
+
+class _PrefixTable:
+    def __init__(self, entries: list[tuple[str, str, int]]):
+        """entries = (clé normalisée, libellé affiché, score)."""
+        entries.sort()
+        self.keys = [k for k, _, _ in entries]
+        self.labels = [label for _, label, _ in entries]
+        self.scores = [score for _, _, score in entries]
+        self.hot: dict[str, list[int]] = {}
+        self._precompute()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, prefix: str, lo: int = 0, hi: int | None = None) -> tuple[int, int]:
+        hi = len(self.keys) if hi is None else hi
+        lo = bisect_left(self.keys, prefix, lo, hi)
+        return lo, bisect_left(self.keys, prefix + _END, lo, hi)
+
+    def _best(self, lo: int, hi: int, k: int) -> list[int]:
+        """Rangs des k meilleures entrées de la plage (un seul par libellé)."""
+        out, seen = [], set()
+        for i in sorted(range(lo, hi), key=lambda i: (-self.scores[i], self.keys[i])):
+            if self.labels[i] not in seen:
+                seen.add(self.labels[i])
+                out.append(i)
+                if len(out) == k:
+                    break
+        return out
+
+    def _precompute(self) -> None:
+        """Top SUGGEST_MAX de chaque préfixe dont la plage dépasse SCAN_MAX (niveau par niveau)."""
+        keys = self.keys
+        level = sorted({k[:1] for k in keys if k})
+        bounds = {p: (0, len(keys)) for p in level}
+        while level:
+            nxt = []
+            for p in level:
+                lo, hi = self._range(p, *bounds[p])
+                if hi - lo <= SCAN_MAX:
+                    continue
+                self.hot[p] = self._best(lo, hi, SUGGEST_MAX)
+                # préfixes enfants : un saut (bisect) par lettre suivante distincte
+                i, n = lo, len(p) + 1
+                while i < hi:
+                    if len(keys[i]) < n:
+                        i += 1
+                        continue
+                    child = keys[i][:n]
+                    j = bisect_left(keys, child + _END, i, hi)
+                    bounds[child] = (i, j)
+                    nxt.append(child)
+                    i = j
+            level = nxt
+
+    def top(self, prefix: str, k: int) -> list[tuple[str, int]]:
+        if prefix in self.hot:
+            idx = self.hot[prefix][:k]
+        else:
+            lo, hi = self._range(prefix)
+            idx = self._best(lo, hi, k)
+        return [(self.labels[i], self.scores[i]) for i in idx]
+
+
+class SuggestIndex:
+    def __init__(self, generation: int, words: list[tuple[str, int]], shows: list[tuple[str, int]]):
+        """words = (mot, df) ; shows = (nom de série, nb d'épisodes)."""
+        self.generation = generation
+        self.words = _PrefixTable([(w, w, df) for w, df in words])
+        show_entries = []
+        for name, n in shows:
+            parts = fold(name).split()
+            show_entries += [(" ".join(parts[i:]), name, n) for i in range(len(parts))]
+        self.shows = _PrefixTable(show_entries)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "words": len(self.words),
+            "show_keys": len(self.shows),
+            "hot_prefixes": len(self.words.hot) + len(self.shows.hot),
+        }
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT, shows: int = 3) -> dict:
+        """
+        Séries dont le nom (ou un de ses mots) commence par le préfixe complet,
+        mots du vocabulaire qui complètent le dernier mot tapé.
+        """
+        text = fold(prefix)
+        if not text:
+            return {"shows": [], "tokens": []}
+        last = text.split()[-1]
+        limit = min(limit, SUGGEST_MAX)
+        return {
+            "shows": [{"name": s, "episodes": n} for s, n in self.shows.top(text, min(shows, SUGGEST_MAX))],
+            "tokens": [{"text": w, "df": df} for w, df in self.words.top(last, limit)],
+        }
+
+
+def build_index() -> SuggestIndex:
+    with get_connection() as conn, conn.cursor() as cur:
+        gen = read_generation(cur)
+        cur.execute(
+            """
+            SELECT k.text, d.df
+            FROM token_df d
+            JOIN tokens k ON k.id = d.token_id
+            WHERE d.df > 0;
+            """
+        )
+        words = [(r["text"], r["df"]) for r in cur.fetchall()]
+        cur.execute(
+            """
+            SELECT show_name, COUNT(*) AS n
+            FROM episodes
+            WHERE show_name IS NOT NULL
+            GROUP BY show_name;
+            """
+        )
+        shows = [(r["show_name"], r["n"]) for r in cur.fetchall()]
+    conn.close()
+    return SuggestIndex(gen, words, shows)
+
+
+# ---------- Index courant (un par process) ----------
+
+_index = GenerationalIndex("suggest-index", build_index)
+
+
+def get_index() -> SuggestIndex | None:
+    """Index courant (une génération de retard possible) ; None tant que le premier n'est pas prêt."""
+    return _index.get()
+
+
+def start() -> None:
+    """Au démarrage de l'API : construction de l'index en tâche de fond."""
+    _index.refresh_async()
+
+
+def status() -> dict:
+    return _index.status()
@@ -0,0 +1,86 @@
+# app/services/tokens.py
+"""
+Dictionnaire des tokens : tokens(id, text).
+Les tables de comptage, token_df et show_token_counts ne stockent que des id entiers.
+
+- indexation : token_ids() crée les tokens inconnus (transaction courte, validée tout de
+  suite : les writers parallèles ne s'attendent jamais les uns les autres)
+- lecture (/search, /user/recommend) : lookup_ids() traduit les mots de la requête une fois
+- cache texte -> id propre au process ; un id n'est jamais réattribué tant que la table
+  tokens n'est pas vidée (clear_cache() après init-db)
+"""
+from __future__ import annotations
+import threading
+from collections import Counter
+from typing import Iterable
+
+from app.core.db import get_connection
+
+_ids: dict[str, int] = {}
+_lock = threading.Lock()
+_conn = None   # connexion dédiée (autocommit) à la création des tokens
+
+
+def clear_cache() -> None:
+    _ids.clear()
+
+
+def cache_size() -> int:
+    return len(_ids)
+
+
+def _dict_connection():
+    global _conn
+    if _conn is None or _conn.closed:
+        _conn = get_connection()
+        _conn.autocommit = True
+    return _conn
+
+
+def token_ids(words: Iterable[str]) -> dict[str, int]:
+    """Id de chaque mot (créé si besoin dans `tokens`)."""
+    global _conn
+    words = set(words)
+    if any(w not in _ids for w in words):
+        with _lock:
+            missing = sorted(w for w in words if w not in _ids)   # ordre fixe : pas d'interblocage
+            if missing:
+                try:
+                    with _dict_connection().cursor() as cur:
+                        cur.execute(
+                            """
+                            INSERT INTO tokens (text)
+                            SELECT UNNEST(%s::text[])
+                            ON CONFLICT (text) DO NOTHING;
+                            SELECT id, text FROM tokens WHERE text = ANY(%s);
+                            """,
+                            (missing, missing),
+                        )
+                        _ids.update((r["text"], r["id"]) for r in cur.fetchall())
+                except Exception:
+                    if _conn is not None:
+                        _conn.close()
+                    _conn = None
+                    raise
+    return {w: _ids[w] for w in words}
+
+
+def lookup_ids(cur, words: Iterable[str]) -> dict[str, int]:
+    """Id des mots déjà connus (lecture seule) ; les mots absents de l'index sont omis."""
+    words = set(words)
+    missing = [w for w in words if w not in _ids]
+    if missing:
+        cur.execute("SELECT id, text FROM tokens WHERE text = ANY(%s);", (missing,))
+        _ids.update((r["text"], r["id"]) for r in cur.fetchall())
+    return {w: _ids[w] for w in words if w in _ids}
+
+
+def counts_to_ids(
+    c_uni: Counter, c_bi: Counter, positions: dict[str, bytes] | None = None
+) -> tuple[Counter, Counter, dict[int, bytes]]:
+    """Compteurs (et positions) texte (count_tokens) -> clés par id, prêts pour write_counts()."""
+    ids = token_ids(c_uni)
+    uni = Counter({ids[tok]: f for tok, f in c_uni.items()})
+    bi = Counter({(ids[t1], ids[t2]): f for (t1, t2), f in c_bi.items()})
+    pos = {ids[tok]: data for tok, data in (positions or {}).items()}
+    return uni, bi, pos
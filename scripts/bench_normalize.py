@@ -0,0 +1,58 @@
+# scripts/bench_normalize.py
+"""
+Micro-benchmark du tokenizer : version de référence vs chemin rapide (tokens/s).
+Vérifie au passage que la sortie est strictement identique.
+
+    python -m scripts.bench_normalize [dossier_srt] [--files 200] [--repeat 3]
+"""
+import argparse
+import pathlib
+import time
+
+from app.services.subtitles import srt_to_lines
+from app.services.normalize import _normalize_line_slow, normalize_lines, normalize_cache_info
+
+
+def _bench(fn, corpus: list[list[str]], repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    n_tokens = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n_tokens = 0
+        for lines in corpus:
+            for toks in fn(lines):
+                n_tokens += len(toks)
+        best = min(best, time.perf_counter() - t0)
+    return best, n_tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("root", nargs="?", default="data/sous-titres")
+    parser.add_argument("--files", type=int, default=200, help="nb max de fichiers chargés")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = sorted(pathlib.Path(args.root).rglob("*.srt"))[: args.files]
+    if not files:
+        print(f"[ERR] aucun .srt sous {args.root}")
+        return
+    corpus = [srt_to_lines(str(f)) for f in files]
+    n_lines = sum(len(c) for c in corpus)
+
+    # contrôle d'identité avant de chronométrer
+    for lines in corpus:
+        if normalize_lines(lines) != [_normalize_line_slow(l) for l in lines]:
+            raise SystemExit("[ERR] sortie différente de la version de référence")
+
+    slow_s, n_tok = _bench(lambda lines: [_normalize_line_slow(l) for l in lines], corpus, args.repeat)
+    fast_s, _ = _bench(normalize_lines, corpus, args.repeat)
+
+    print(f"{len(files)} fichiers, {n_lines} lignes, {n_tok} tokens")
+    print(f"avant : {slow_s:.3f} s  ({n_tok / slow_s:,.0f} tokens/s)")
+    print(f"après : {fast_s:.3f} s  ({n_tok / fast_s:,.0f} tokens/s)  x{slow_s / fast_s:.1f}")
+    print(f"cache : {normalize_cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
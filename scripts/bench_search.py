@@ -0,0 +1,89 @@
+# scripts/bench_search.py
+"""
+Benchmark du top-k OR sur des requêtes contenant des mots fréquents :
+requête SQL actuelle (_query_or) vs index en mémoire exhaustif vs index en mémoire
+avec élagage MaxScore. Vérifie que l'élagage renvoie exactement les mêmes candidats.
+
+    python -m scripts.bench_search [--snapshot /tmp/bench.snapshot] [--queries 30] [--repeat 3] [--pool 100]
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from app.api.search import CANDIDATE_POOL, _query_or
+from app.core.db import get_connection
+from app.services.search_engine import build_snapshot, load_snapshot
+from app.services.tokens import lookup_ids
+
+
+def _frequent_queries(engine, n: int, seed: int = 0) -> list[list[str]]:
+    """
+    Requêtes typiques "mot fréquent + mot discriminant" : un des 20 mots de plus fort DF,
+    avec un ou deux mots de la moitié la moins fréquente du vocabulaire (ou un 2e mot fréquent).
+    """
+    a = engine.a
+    df = sorted(
+        ((a["uni_len"][k], a["uni_key"][k]) for k in range(len(a["uni_key"]))), reverse=True
+    )
+    by_id = {a["vocab_id"][i]: engine.vocab[i].decode() for i in range(len(engine.vocab))}
+    words = [by_id[tid] for _, tid in df if tid in by_id]
+    frequent, rare = words[:20], words[len(words) // 2:]
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        kind = rng.randrange(3)
+        if kind == 0:
+            queries.append([rng.choice(frequent), rng.choice(rare)])
+        elif kind == 1:
+            queries.append(rng.sample(frequent, 2) + [rng.choice(rare)])
+        else:
+            queries.append([rng.choice(frequent), rng.choice(rare), rng.choice(rare)])
+    return queries
+
+
+def _timed(fn, queries, repeat: int) -> tuple[float, list]:
+    best, out = float("inf"), []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(q) for q in queries]
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0 / len(queries), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", default="/tmp/bench_search.snapshot")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pool", type=int, default=CANDIDATE_POOL, help="taille du top-k")
+    args = parser.parse_args()
+
+    path = Path(args.snapshot)
+    build_snapshot(path)
+    engine = load_snapshot(path)
+    queries = _frequent_queries(engine, args.queries)
+
+    with get_connection() as conn, conn.cursor() as cur:
+        def sql(q):
+            ids = lookup_ids(cur, q)
+            return _query_or(cur, [ids.get(t) for t in q], args.pool)
+
+        def key(rows):
+            return [(r["id"], r["matched_terms"], round(float(r["tfidf"]), 9)) for r in rows]
+
+        ms_sql, res_sql = _timed(sql, queries, args.repeat)
+        ms_scan, res_scan = _timed(lambda q: engine.candidates(q, True, args.pool, pruning=False)[1], queries, args.repeat)
+        ms_wand, res_wand = _timed(lambda q: engine.candidates(q, True, args.pool)[1], queries, args.repeat)
+
+    same = sum(key(a) == key(b) for a, b in zip(res_scan, res_wand))
+    same_sql = sum(key(a) == key(b) for a, b in zip(res_sql, res_wand))
+    print(f"{len(queries)} requêtes OR (pool={args.pool}), {engine.stats['episodes']} épisodes")
+    print(f"  SQL _query_or          : {ms_sql:8.2f} ms/requête")
+    print(f"  mémoire, exhaustif     : {ms_scan:8.2f} ms/requête")
+    print(f"  mémoire, MaxScore      : {ms_wand:8.2f} ms/requête")
+    print(f"  identiques (exhaustif) : {same}/{len(queries)}   (SQL) : {same_sql}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 # scripts/extract_archives.py
+# Plus nécessaire pour l'indexation : bulk_index lit directement les .srt dans les .zip/.7z
+# (cf. app/services/sources.py). Conservé pour extraire à la main si besoin.
 from pathlib import Path
 import zipfile
 import subprocess
@@ -0,0 +1,15 @@
+# scripts/precompute_recommendations.py
+from app.api.recommend import precompute_recommendations
+
+
+def main():
+    s = precompute_recommendations()
+    print(
+        f"[DONE] {s['users']} utilisateurs ({s['users_with_results']} avec recommandations, {s['rows']} lignes) "
+        f"en {s['elapsed_s']} s ({s['users_per_sec']} utilisateurs/s ; lecture {s['read_s']} s, "
+        f"calcul {s['compute_s']} s, écriture {s['write_s']} s)"
+    )
+
+
+if __name__ == "__main__":
+    main()